@@ -0,0 +1,236 @@
+"""
+Benchmark of the media database hot queries, with and without the indexes.
+
+Builds a database of --files torrent files, then times the DAO queries on a
+copy with every index of the models and on a copy without the indexes added
+for them. Run with:
+
+    python benchmarks/media_db.py --files 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from rd_syncrr.logging import logger
+from rd_syncrr.services.media_db.dao import MediaDAO
+from rd_syncrr.services.media_db.meta import meta
+from rd_syncrr.services.media_db.models import load_all_models
+
+# indexes of the media database index plan
+PLAN_INDEXES = (
+    "ix_rd_torrents_files_torrent_id",
+    "ix_rd_torrents_files_symlink_id",
+    "ix_rd_torrents_files_radarr_id",
+    "ix_rd_torrents_files_sonarr_id",
+    "ix_rd_torrents_files_unlinked_media",
+    "ix_local_symlinks_destination",
+    "ix_radarr_movies_fileId",
+    "ix_sonarr_series_episodefileId",
+)
+FILES_PER_TORRENT = 4
+SAMPLE = 500
+# read queries are timed on their best run
+REPEAT = 3
+
+_Query = Callable[[MediaDAO], Awaitable[Any]]
+
+
+def _build(path: str, files: int) -> None:
+    """
+    Create and fill a media database.
+
+    A fifth of the files have no symlink, the others are split between
+    Radarr movies, Sonarr episodes and files without media info.
+    """
+    load_all_models()
+    engine = create_engine(f"sqlite:///{path}")
+    meta.create_all(engine)
+    engine.dispose()
+    now = "2024-01-01 00:00:00"
+    torrents = files // FILES_PER_TORRENT
+    with sqlite3.connect(path) as connection:
+        connection.executemany(
+            (
+                "INSERT INTO rd_torrents (id, hash, filename, added, seq)"
+                " VALUES (?, ?, ?, ?, 0)"
+            ),
+            ((f"T{n}", f"{n:040x}", f"torrent {n}", now) for n in range(torrents)),
+        )
+        connection.executemany(
+            (
+                "INSERT INTO local_symlinks (id, added, target, target_filename,"
+                " destination, destination_filename) VALUES (?, ?, ?, ?, ?, ?)"
+            ),
+            (
+                (
+                    f"S{n}",
+                    now,
+                    f"/rd/torrent {n // FILES_PER_TORRENT}/{n}.mkv",
+                    f"{n}.mkv",
+                    f"/lib/{n % 997}/{n}.mkv",
+                    f"{n}.mkv",
+                )
+                for n in range(files)
+                if n % 5
+            ),
+        )
+        connection.executemany(
+            (
+                "INSERT INTO radarr_movies (id, added, mediaType, movieId, title, path,"
+                " fileId) VALUES (?, ?, 'movie', ?, 'movie', ?, ?)"
+            ),
+            (
+                (f"M{n}", now, n, f"/lib/{n % 997}/{n}.mkv", n)
+                for n in range(files)
+                if n % 5 and n % 3 == 0
+            ),
+        )
+        connection.executemany(
+            (
+                "INSERT INTO sonarr_series (id, added, mediaType, serieId, serieTitle,"
+                " seasonNumber, episodeNumber, tvdbId, path, episodefileId)"
+                " VALUES (?, ?, 'episode', 1, 'serie', 1, 1, '1', ?, ?)"
+            ),
+            (
+                (f"E{n}", now, f"/lib/{n % 997}/{n}.mkv", n)
+                for n in range(files)
+                if n % 5 and n % 3 == 1
+            ),
+        )
+        connection.executemany(
+            (
+                "INSERT INTO rd_torrents_files (id, path, bytes, added, seq,"
+                " torrent_id, symlink_id, radarr_id, sonarr_id) VALUES (?, ?, 1, ?, 0,"
+                " ?, ?, ?, ?)"
+            ),
+            (
+                (
+                    f"F{n:08d}",
+                    f"/{n}.mkv",
+                    now,
+                    f"T{n // FILES_PER_TORRENT}",
+                    f"S{n}" if n % 5 else None,
+                    f"M{n}" if n % 5 and n % 3 == 0 and n % 2 else None,
+                    f"E{n}" if n % 5 and n % 3 == 1 and n % 2 else None,
+                )
+                for n in range(files)
+            ),
+        )
+        connection.execute("ANALYZE")
+
+
+def _queries(files: int) -> dict[str, tuple[_Query, bool]]:
+    """Get the DAO queries to time and whether they write, writes come last."""
+    rng = random.Random(42)
+    numbers = [rng.randrange(files) for _ in range(SAMPLE)]
+    torrents = [f"T{n // FILES_PER_TORRENT}" for n in numbers]
+
+    async def files_of_torrents(dao: MediaDAO) -> None:
+        for torrent_id in torrents:
+            await dao.get_files_from_torrent_id(torrent_id)
+
+    return {
+        "get_files_unlinked_media": (
+            lambda dao: dao.get_files_unlinked_media(),
+            False,
+        ),
+        f"get_files_from_torrent_id x{SAMPLE}": (files_of_torrents, False),
+        "get_torrents_with_media(500)": (
+            lambda dao: dao.get_torrents_with_media(limit=500),
+            False,
+        ),
+        "get_symlink_destination_filename_dict": (
+            lambda dao: dao.get_symlink_destination_filename_dict(),
+            False,
+        ),
+        f"get_symlink_targets_by_destination({SAMPLE})": (
+            lambda dao: dao.get_symlink_targets_by_destination(
+                f"/lib/{n % 997}/{n}.mkv" for n in numbers
+            ),
+            False,
+        ),
+        "get_radarr_movies_file_id": (
+            lambda dao: dao.get_radarr_movies_file_id(),
+            False,
+        ),
+        "get_sonarr_episodes_file_id": (
+            lambda dao: dao.get_sonarr_episodes_file_id(),
+            False,
+        ),
+        "link_files_to_media": (lambda dao: dao.link_files_to_media(), True),
+        f"delete_radarr_movies_by_file_id({SAMPLE})": (
+            lambda dao: dao.delete_radarr_movies_by_file_id(numbers),
+            True,
+        ),
+        f"delete_torrents_by_hash({SAMPLE})": (
+            lambda dao: dao.delete_torrents_by_hash(
+                f"{int(torrent_id[1:]):040x}" for torrent_id in torrents
+            ),
+            True,
+        ),
+    }
+
+
+async def _run(
+    path: str,
+    queries: dict[str, tuple[_Query, bool]],
+) -> dict[str, float]:
+    """Time the queries on a database, in seconds."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    timings: dict[str, float] = {}
+    async with MediaDAO(session=session_factory()) as dao:
+        for name, (query, writes) in queries.items():
+            for _ in range(1 if writes else REPEAT):
+                start = time.perf_counter()
+                await query(dao)
+                elapsed = time.perf_counter() - start
+                timings[name] = min(timings.get(name, elapsed), elapsed)
+                await dao.session.commit()
+                dao.session.expunge_all()
+    await engine.dispose()
+    return timings
+
+
+def main() -> None:
+    """Build the database and print the timings with and without the plan."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=100_000)
+    args = parser.parse_args()
+    logger.disable("rd_syncrr")
+    queries = _queries(args.files)
+    with tempfile.TemporaryDirectory() as directory:
+        indexed = os.path.join(directory, "indexed.db")
+        bare = os.path.join(directory, "bare.db")
+        start = time.perf_counter()
+        _build(indexed, args.files)
+        print(f"Built {args.files} files in {time.perf_counter() - start:.1f}s")
+        shutil.copy(indexed, bare)
+        with sqlite3.connect(bare) as connection:
+            for index in PLAN_INDEXES:
+                connection.execute(f'DROP INDEX "{index}"')
+            connection.execute("ANALYZE")
+        without = asyncio.run(_run(bare, queries))
+        with_plan = asyncio.run(_run(indexed, queries))
+    print(f"{'query':<45}{'without':>10}{'with':>10}{'speedup':>10}")
+    for name, seconds in without.items():
+        print(
+            (
+                f"{name:<45}{seconds * 1000:>8.1f}ms{with_plan[name] * 1000:>8.1f}ms"
+                f"{seconds / max(with_plan[name], 1e-9):>9.1f}x"
+            ),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,11 @@ from rd_syncrr.tasks import (
     process_symlink,
     process_torrents,
     process_unlinked_media_info,
+    prune_torrent_changes,
+    sync_latest_torrents,
 )
+from rd_syncrr.utils.circuit_breaker import CircuitBreaker
+from rd_syncrr.utils.rdapi import circuit_breaker
 
 
 def init_scheduler() -> AsyncIOScheduler:
@@ -40,12 +44,32 @@ def init_scheduler() -> AsyncIOScheduler:
     return scheduler
 
 
+def _rd_available() -> bool:
+    """Check that the circuit breaker lets the calls to RD through.
+
+    A half open circuit lets the job through, its first call is the probe.
+
+    Returns:
+        False when the RD calls are paused, the RD tasks are then skipped.
+    """
+    if circuit_breaker.state != CircuitBreaker.OPEN:
+        return True
+    logger.warning(
+        (
+            f"Real-Debrid is unavailable (circuit {circuit_breaker.state}), RD"
+            f" tasks skipped, calls resume in {circuit_breaker.retry_after():.0f}s"
+        ),
+    )
+    return False
+
+
 async def database_update_job() -> None:
     """Initialize database update job."""
     async with await MediaDAO.create() as dao:
         logger.info("Updating database...")
         logger.info("XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX")
-        await process_torrents(dao)
+        if _rd_available():
+            await process_torrents(dao)
         logger.info("----------------------------------------------------------")
         await process_mediainfo(dao)
         logger.info("----------------------------------------------------------")
@@ -54,11 +78,21 @@ async def database_update_job() -> None:
         await process_unlinked_media_info(dao)
         logger.info("----------------------------------------------------------")
         await process_jsonfile(dao)
+        await prune_torrent_changes(dao)
         await dao.close()
         logger.info("XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX")
         logger.info("Database updated.")
 
 
+async def sync_job() -> None:
+    """Initialize sync job with other instance."""
+    async with await MediaDAO.create() as dao:
+        logger.info("Syncing torrents from other instance...")
+        if _rd_available():
+            await sync_latest_torrents(dao)
+        await dao.close()
+
+
 async def _trigger_database_update_job(
     scheduler: AsyncIOScheduler,
     jobs: List[Job],
@@ -79,6 +113,28 @@ async def _trigger_database_update_job(
     )
 
 
+async def _trigger_sync_job(
+    scheduler: AsyncIOScheduler,
+    jobs: List[Job],
+) -> None:
+    """Trigger the sync job when another instance is configured.
+
+    Args:
+        scheduler: The scheduler object to add the jobs to.
+    """
+    if not settings.syncrr_host:
+        return
+    for job in jobs:
+        if job.name == "sync_job":
+            return
+    scheduler.add_job(
+        sync_job,
+        "interval",
+        minutes=settings.sched_sync_interval,
+        name="sync_job",
+    )
+
+
 async def init_jobs(scheduler: AsyncIOScheduler) -> None:
     """Initialize the jobs and add them to the scheduler.
 
@@ -89,6 +145,7 @@ async def init_jobs(scheduler: AsyncIOScheduler) -> None:
         jobs = scheduler.get_jobs(jobstore="default")
 
         await _trigger_database_update_job(scheduler, jobs)
+        await _trigger_sync_job(scheduler, jobs)
     except Exception as e:
         logger.error(f"An error occurred while initializing the jobs: {e!s}")
         return
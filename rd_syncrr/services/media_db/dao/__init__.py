@@ -1,5 +1,17 @@
 """Data Access Object for Media Database Models."""
 
-from rd_syncrr.services.media_db.dao.media_dao import MediaDAO
+from rd_syncrr.services.media_db.dao.media_dao import (
+    BulkDeleteResult,
+    BulkInsertResult,
+    MediaChanges,
+    MediaDAO,
+    MediaLinkResult,
+)
 
-__all__ = ["MediaDAO"]
+__all__ = [
+    "MediaDAO",
+    "BulkInsertResult",
+    "BulkDeleteResult",
+    "MediaChanges",
+    "MediaLinkResult",
+]
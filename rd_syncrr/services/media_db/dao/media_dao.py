@@ -1,27 +1,105 @@
 import os
-from asyncio import current_task
-from collections.abc import Sequence
-from typing import Any, List, Optional  # noqa: UP035
+from collections.abc import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Mapping,
+    Sequence,
+)
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Optional, TypeVar, cast
 
 from fastapi import Depends
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import (
-    AsyncSession,
-    async_scoped_session,
-    async_sessionmaker,
-    create_async_engine,
+from sqlalchemy import (
+    ColumnElement,
+    CursorResult,
+    Executable,
+    Select,
+    delete,
+    exists,
+    func,
+    insert,
+    or_,
+    select,
+    tuple_,
+    update,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute, aliased, selectinload
 
 from rd_syncrr.logging import logger
+from rd_syncrr.services.media_db.base import Base
 from rd_syncrr.services.media_db.dependencies import get_db_session
+from rd_syncrr.services.media_db.engine import get_session_factory
 from rd_syncrr.services.media_db.models.media_model import (
+    MediaChangeModel,
     RadarrMovieModel,
     SonarrEpisodeModel,
+    StateModel,
+    SymlinkDirectoryModel,
     SymlinkModel,
     TorrentFileModel,
+    TorrentFilePathModel,
     TorrentModel,
 )
 from rd_syncrr.settings import settings
+from rd_syncrr.utils.torrent_paths import torrent_file_path
+
+_Row = TypeVar("_Row")
+# change sequence up to which the change journal was compacted
+CHANGES_FLOOR_STATE = "media_changes_floor"
+# torrents query, keeps the row type of the query it is given
+_TorrentsQuery = TypeVar("_TorrentsQuery", bound="Select[Any]")
+
+
+@dataclass
+class BulkInsertResult:
+    """Outcome of a bulk insert."""
+
+    inserted: int = 0
+    failed: list[tuple[Any, str]] = field(default_factory=list)
+
+
+@dataclass
+class BulkDeleteResult:
+    """Outcome of a bulk delete."""
+
+    deleted: int = 0
+    # torrent files deleted with their torrent or unlinked from their media
+    files: int = 0
+    symlinks: int = 0
+    failed: list[tuple[Any, str]] = field(default_factory=list)
+
+
+@dataclass
+class MediaLinkResult:
+    """Outcome of linking torrent files to their media info."""
+
+    radarr: int = 0
+    sonarr: int = 0
+    # files with a symlink but no media info at its destination
+    unlinked: int = 0
+    failed: list[tuple[Any, str]] = field(default_factory=list)
+
+    @property
+    def linked(self) -> int:
+        """Number of files linked to Radarr or Sonarr media info."""
+        return self.radarr + self.sonarr
+
+
+@dataclass
+class MediaChanges:
+    """Torrent hashes changed between two change sequences."""
+
+    since: int
+    seq: int
+    added: list[str] = field(default_factory=list)
+    updated: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
 
 
 class MediaDAO:
@@ -32,24 +110,8 @@ class MediaDAO:
 
     @classmethod
     async def create(cls) -> "MediaDAO":
-        """Create a new instance of MediaDAO with an async session."""
-        if settings.environment == "dev":
-            db_path = "rd_syncrr_media_dev.db"
-        else:
-            db_path = os.path.join(settings.media_db_location, "rd_syncrr_media.db")
-
-        db_path = f"sqlite+aiosqlite:///{db_path}"
-
-        engine = create_async_engine(db_path)
-        async_session = async_scoped_session(
-            async_sessionmaker(
-                bind=engine,
-                class_=AsyncSession,
-                expire_on_commit=False,
-            ),
-            scopefunc=current_task,
-        )
-        session = async_session()
+        """Create a new instance of MediaDAO on the shared writer engine."""
+        session = get_session_factory()()
         return cls(session=session)
 
     async def close(self) -> None:
@@ -77,7 +139,8 @@ class MediaDAO:
         :param filename: filename of torrent. nullable=False
         """
         try:
-            torrent_model = TorrentModel(hash=hash, id=id, filename=filename)
+            seq = await self._record_changes("added", [hash])
+            torrent_model = TorrentModel(hash=hash, id=id, filename=filename, seq=seq)
             self.session.add(torrent_model)
             await self.session.commit()
         except Exception as e:
@@ -151,39 +214,373 @@ class MediaDAO:
         try:
             torrent_model = await self.session.get(TorrentModel, torrent_id)
             if torrent_model:
-                torrent_file = TorrentFileModel(**file_data, torrent=torrent_model)
+                seq = await self._touch_torrents([torrent_id])
+                torrent_file = TorrentFileModel(
+                    **file_data,
+                    torrent=torrent_model,
+                    seq=seq,
+                )
                 self.session.add(torrent_file)
                 await self.session.commit()
         except Exception as e:
             logger.error(f"An error occurred while adding file to torrent: {e!s}")
             await self.session.rollback()
 
+    async def _record_changes(self, op: str, hashes: Iterable[str]) -> int:
+        """
+        Append torrent changes to the journal, in the current transaction.
+        :param op: added, updated or removed.
+        :param hashes: hashes of the changed torrents.
+        :return: sequence of the last change, 0 when nothing was recorded.
+        """
+        rows = [{"hash": torrent_hash, "op": op} for torrent_hash in hashes]
+        if not rows:
+            return 0
+        seqs = await self.session.scalars(
+            insert(MediaChangeModel).returning(MediaChangeModel.seq),
+            rows,
+        )
+        return max(seqs.all())
+
+    async def _touch_torrents(self, torrent_ids: Iterable[str]) -> int:
+        """
+        Record an update of torrents and stamp them with its sequence.
+        :param torrent_ids: IDs of the updated torrents.
+        :return: sequence of the change, 0 when no torrent was found.
+        """
+        torrent_ids = set(torrent_ids)
+        hashes = await self.session.scalars(
+            select(TorrentModel.hash).where(TorrentModel.id.in_(torrent_ids)),
+        )
+        seq = await self._record_changes("updated", hashes.all())
+        if seq:
+            await self.session.execute(
+                update(TorrentModel)
+                .where(TorrentModel.id.in_(torrent_ids))
+                .values(seq=seq),
+            )
+        return seq
+
+    async def _bulk_write(
+        self,
+        rows: Sequence[_Row],
+        write: Callable[[Sequence[_Row]], Awaitable[None]],
+        result: BulkInsertResult,
+    ) -> None:
+        """
+        Write rows in a single transaction, isolating the failing ones.
+        When a row is rejected the transaction is rolled back and both halves
+        of the batch are retried, so only the failing rows are left out. Any
+        other error, such as a locked database, fails the whole batch at once.
+        :param rows: rows to write.
+        :param write: coroutine executing the statements for a chunk of rows.
+        :param result: result collecting inserted and failed rows.
+        """
+        if not rows:
+            return
+        try:
+            await write(rows)
+            await self.session.commit()
+            result.inserted += len(rows)
+        except Exception as e:
+            await self.session.rollback()
+            if not isinstance(e, (IntegrityError, DataError)):
+                logger.error(f"An error occurred during bulk insert: {e!s}")
+                result.failed.extend((row, str(e)) for row in rows)
+                return
+            if len(rows) == 1:
+                logger.error(f"An error occurred during bulk insert: {e!s}")
+                result.failed.append((rows[0], str(e)))
+                return
+            middle = len(rows) // 2
+            await self._bulk_write(rows[:middle], write, result)
+            await self._bulk_write(rows[middle:], write, result)
+
+    async def _bulk_insert(
+        self,
+        model: type[Base],
+        rows: Iterable[dict[str, Any]],
+    ) -> BulkInsertResult:
+        """
+        Insert rows of a model with an executemany insert.
+        :param model: model of the rows.
+        :param rows: data of the rows.
+        :return: bulk insert result.
+        """
+        result = BulkInsertResult()
+
+        async def write(chunk: Sequence[dict[str, Any]]) -> None:
+            await self.session.execute(insert(model), list(chunk))
+
+        await self._bulk_write(list(rows), write, result)
+        return result
+
+    async def bulk_create_torrent_models(
+        self,
+        torrents: Iterable[dict[str, Any]],
+    ) -> BulkInsertResult:
+        """
+        Add torrents in a single transaction.
+        :param torrents: data of the torrents, with hash, id and filename.
+        :return: bulk insert result.
+        """
+        result = BulkInsertResult()
+
+        async def write(chunk: Sequence[dict[str, Any]]) -> None:
+            seq = await self._record_changes(
+                "added",
+                (torrent_data["hash"] for torrent_data in chunk),
+            )
+            await self.session.execute(
+                insert(TorrentModel),
+                [{**torrent_data, "seq": seq} for torrent_data in chunk],
+            )
+
+        await self._bulk_write(list(torrents), write, result)
+        return result
+
+    async def bulk_create_file_models(
+        self,
+        files: Iterable[dict[str, Any]],
+    ) -> BulkInsertResult:
+        """
+        Add torrent files in a single transaction.
+        Files of a torrent missing from the database are reported as failed.
+        :param files: data of the torrent files, with torrent_id, path and bytes.
+        :return: bulk insert result.
+        """
+        files = list(files)
+        torrent_ids = {file_data["torrent_id"] for file_data in files}
+        result = await self.session.execute(
+            select(TorrentModel.id).where(TorrentModel.id.in_(torrent_ids)),
+        )
+        known_ids = set(result.scalars().all())
+        bulk_result = BulkInsertResult()
+
+        async def write(chunk: Sequence[dict[str, Any]]) -> None:
+            seq = await self._touch_torrents(
+                file_data["torrent_id"] for file_data in chunk
+            )
+            await self.session.execute(
+                insert(TorrentFileModel),
+                [{**file_data, "seq": seq} for file_data in chunk],
+            )
+
+        await self._bulk_write(
+            [file_data for file_data in files if file_data["torrent_id"] in known_ids],
+            write,
+            bulk_result,
+        )
+        bulk_result.failed.extend(
+            (file_data, "Torrent not found")
+            for file_data in files
+            if file_data["torrent_id"] not in known_ids
+        )
+        return bulk_result
+
+    async def bulk_create_symlink_models(
+        self,
+        symlinks: Iterable[tuple[dict[str, Any], Optional[str]]],
+    ) -> BulkInsertResult:
+        """
+        Add symlinks in a single transaction and link them to their torrent file.
+        :param symlinks: pairs of symlink data and torrent file ID or None.
+        :return: bulk insert result.
+        """
+        result = BulkInsertResult()
+
+        async def write(chunk: Sequence[tuple[dict[str, Any], Optional[str]]]) -> None:
+            symlink_ids = await self.session.scalars(
+                insert(SymlinkModel).returning(
+                    SymlinkModel.id,
+                    sort_by_parameter_order=True,
+                ),
+                [symlink_data for symlink_data, _ in chunk],
+            )
+            links = [
+                {"id": file_id, "symlink_id": symlink_id}
+                for (_, file_id), symlink_id in zip(chunk, symlink_ids.all())
+                if file_id is not None
+            ]
+            if links:
+                await self.session.execute(update(TorrentFileModel), links)
+
+        await self._bulk_write(list(symlinks), write, result)
+        return result
+
+    async def bulk_create_radarr_movie_models(
+        self,
+        movies: Iterable[dict[str, Any]],
+    ) -> BulkInsertResult:
+        """
+        Add movies in a single transaction.
+        :param movies: data of the movies.
+        :return: bulk insert result.
+        """
+        return await self._bulk_insert(RadarrMovieModel, movies)
+
+    async def bulk_create_sonarr_episode_models(
+        self,
+        episodes: Iterable[dict[str, Any]],
+    ) -> BulkInsertResult:
+        """
+        Add episodes in a single transaction.
+        :param episodes: data of the episodes.
+        :return: bulk insert result.
+        """
+        return await self._bulk_insert(SonarrEpisodeModel, episodes)
+
+    async def create_torrents_with_files(
+        self,
+        torrents: Iterable[tuple[dict[str, Any], Sequence[dict[str, Any]]]],
+    ) -> BulkInsertResult:
+        """
+        Add torrents with their files in a single transaction.
+        A torrent failing to insert is reported with all its files.
+        :param torrents: pairs of torrent data and the data of its files.
+        :return: bulk insert result, counting torrents.
+        """
+        result = BulkInsertResult()
+
+        async def write(
+            chunk: Sequence[tuple[dict[str, Any], Sequence[dict[str, Any]]]],
+        ) -> None:
+            seq = await self._record_changes(
+                "added",
+                (torrent_data["hash"] for torrent_data, _ in chunk),
+            )
+            await self.session.execute(
+                insert(TorrentModel),
+                [{**torrent_data, "seq": seq} for torrent_data, _ in chunk],
+            )
+            files = [
+                {**file_data, "torrent_id": torrent_data["id"], "seq": seq}
+                for torrent_data, files_data in chunk
+                for file_data in files_data
+            ]
+            if files:
+                await self.session.execute(insert(TorrentFileModel), files)
+
+        await self._bulk_write(list(torrents), write, result)
+        return result
+
+    @staticmethod
+    def _paginate_torrents(
+        query: _TorrentsQuery,
+        limit: Optional[int],
+        offset: Optional[int],
+        after: Optional[tuple[datetime, str]],
+    ) -> _TorrentsQuery:
+        """
+        Order torrents newest first and select a page.
+        :param query: torrents query.
+        :param limit: The limit of results to return.
+        :param offset: The offset of results to return, prefer after.
+        :param after: (added, id) of the last torrent of the previous page.
+        :return: paginated query.
+        """
+        if after is not None:
+            query = query.where(tuple_(TorrentModel.added, TorrentModel.id) < after)
+        return (
+            query.order_by(TorrentModel.added.desc(), TorrentModel.id.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+
     async def get_all_torrents(
         self,
         limit: Optional[int] = 50,
         offset: Optional[int] = 0,
+        after: Optional[tuple[datetime, str]] = None,
     ) -> Sequence[TorrentModel]:
         """
-        Get all torrents from the database.
+        Get all torrents from the database, newest first.
         :param limit: The limit of results to return.
         :param offset: The offset of results to return.
+        :param after: (added, id) of the last torrent of the previous page.
         :return: List of torrent models.
         """
-        query = select(TorrentModel).offset(offset).limit(limit)
+        query = self._paginate_torrents(select(TorrentModel), limit, offset, after)
         result = await self.session.execute(query)
         return result.scalars().all()
 
-    async def get_all_torrents_hashes(self) -> Optional[list[str]]:
+    async def get_torrents_with_media(
+        self,
+        limit: Optional[int] = 50,
+        offset: Optional[int] = 0,
+        after: Optional[tuple[datetime, str]] = None,
+    ) -> Sequence[TorrentModel]:
         """
-        Get a list of all torrent hashes.
-        :return: List of torrent hashes or None if the database is empty.
+        Get torrents with their files and the files Radarr/Sonarr info loaded.
+        The page is loaded in a constant number of queries, whatever its size.
+        :param limit: The limit of results to return.
+        :param offset: The offset of results to return.
+        :param after: (added, id) of the last torrent of the previous page.
+        :return: List of torrent models, newest first.
         """
-        query = select(TorrentModel.hash)
+        files = selectinload(TorrentModel.files)
+        query = select(TorrentModel).options(
+            files.selectinload(TorrentFileModel.radarr_info),
+            files.selectinload(TorrentFileModel.sonarr_info),
+        )
+        query = self._paginate_torrents(query, limit, offset, after)
         result = await self.session.execute(query)
-        rows = result.all()
-        if not rows:
-            return None
-        return [row[0] for row in rows]
+        return result.scalars().all()
+
+    async def get_torrents_with_media_by_hash(
+        self,
+        hashes: Iterable[str],
+    ) -> Sequence[TorrentModel]:
+        """
+        Get torrents by hash with their files and the files Radarr/Sonarr info loaded.
+        :param hashes: torrent hashes.
+        :return: List of torrent models, newest first.
+        """
+        files = selectinload(TorrentModel.files)
+        query = (
+            select(TorrentModel)
+            .options(
+                files.selectinload(TorrentFileModel.radarr_info),
+                files.selectinload(TorrentFileModel.sonarr_info),
+            )
+            .where(TorrentModel.hash.in_(list(hashes)))
+            .order_by(TorrentModel.added.desc(), TorrentModel.id.desc())
+        )
+        result = await self.session.execute(query)
+        return result.scalars().all()
+
+    async def stream_torrents_with_media(
+        self,
+        batch_size: int = 500,
+    ) -> AsyncIterator[TorrentModel]:
+        """
+        Stream all torrents, newest first, with their files and media info loaded.
+        Rows are fetched from a server side cursor batch_size torrents at a time,
+        so memory does not grow with the number of torrents.
+        :param batch_size: number of torrents loaded per batch.
+        :return: async iterator of torrent models.
+        """
+        files = selectinload(TorrentModel.files)
+        query = (
+            select(TorrentModel)
+            .options(
+                files.selectinload(TorrentFileModel.radarr_info),
+                files.selectinload(TorrentFileModel.sonarr_info),
+            )
+            .order_by(TorrentModel.added.desc(), TorrentModel.id.desc())
+            .execution_options(yield_per=batch_size)
+        )
+        result = await self.session.stream_scalars(query)
+        async for torrent in result:
+            yield torrent
+
+    async def get_all_torrents_hashes(self) -> frozenset[str]:
+        """
+        Get the set of all torrent hashes.
+        :return: Set of torrent hashes, empty if the database is empty.
+        """
+        result = await self.session.scalars(select(TorrentModel.hash))
+        return frozenset(result.all())
 
     async def get_torrent(
         self,
@@ -253,18 +650,80 @@ class MediaDAO:
         result = await self.session.execute(query)
         return result.scalars().all()
 
-    async def get_torrent_files_filename_dict(self) -> Optional[dict[str, str]]:
+    async def index_torrent_file_paths(self) -> int:
         """
-        Get a dictionary of all torrent files with filename.
-        :return: Dictionary of torrent files.
+        Index the torrent files not indexed yet by their path under the mount.
+        Index entries of deleted torrent files are removed.
+        :return: number of indexed torrent files.
         """
-        result = await self.session.execute(
-            select(TorrentFileModel.id, TorrentFileModel.path),
+        try:
+            await self.session.execute(
+                delete(TorrentFilePathModel)
+                .where(
+                    TorrentFilePathModel.file_id.not_in(select(TorrentFileModel.id)),
+                )
+                .execution_options(synchronize_session=False),
+            )
+            while True:
+                result = await self.session.execute(
+                    select(
+                        TorrentFileModel.id,
+                        TorrentModel.filename,
+                        TorrentFileModel.path,
+                        TorrentFileModel.bytes,
+                    )
+                    .join(TorrentModel, TorrentFileModel.torrent_id == TorrentModel.id)
+                    .outerjoin(
+                        TorrentFilePathModel,
+                        TorrentFilePathModel.file_id == TorrentFileModel.id,
+                    )
+                    .where(TorrentFilePathModel.file_id.is_(None))
+                    .limit(max(settings.media_db_batch_size, 1)),
+                )
+                rows = result.all()
+                if not rows:
+                    break
+                await self.session.execute(
+                    insert(TorrentFilePathModel),
+                    [
+                        {
+                            "file_id": file_id,
+                            "path": torrent_file_path(torrent_filename, path),
+                            "bytes": size,
+                        }
+                        for file_id, torrent_filename, path, size in rows
+                    ],
+                )
+            await self.session.commit()
+        except Exception as e:
+            logger.error(f"An error occurred while indexing torrent files: {e!s}")
+            await self.session.rollback()
+        count = await self.session.scalar(
+            select(func.count()).select_from(TorrentFilePathModel),
         )
-        rows = result.all()
-        if not rows:
-            return None
-        return {os.path.basename(filename): file_id for file_id, filename in rows}
+        return count or 0
+
+    async def get_torrent_files_by_path(
+        self,
+        paths: Iterable[str],
+    ) -> dict[str, list[tuple[str, int]]]:
+        """
+        Get the torrent files at some paths under the mount.
+        :param paths: normalized paths, torrent filename and path in the torrent.
+        :return: ID and size of the torrent files by path, for the paths found.
+        """
+        files: dict[str, list[tuple[str, int]]] = {}
+        for chunk in self._chunks(set(paths)):
+            result = await self.session.execute(
+                select(
+                    TorrentFilePathModel.path,
+                    TorrentFilePathModel.file_id,
+                    TorrentFilePathModel.bytes,
+                ).where(TorrentFilePathModel.path.in_(chunk)),
+            )
+            for path, file_id, size in result.all():
+                files.setdefault(path, []).append((file_id, size))
+        return files
 
     async def get_all_torrents_files(self) -> Sequence[TorrentFileModel]:
         """
@@ -335,29 +794,170 @@ class MediaDAO:
             return None
         return {target_filename: symlink_id for symlink_id, target_filename in rows}
 
-    async def get_sonarr_episodes_file_id(self) -> Optional[List[str]]:
+    async def get_symlink_targets_by_destination(
+        self,
+        destinations: Iterable[str],
+    ) -> dict[str, str]:
         """
-        Get a list of all Sonarr episodes file ID.
-        :return: List of Sonarr episodes file ID.
+        Get the targets of the symlinks at some destinations.
+        :param destinations: destination paths of the symlinks.
+        :return: targets by destination of the symlinks found.
         """
-        query = select(SonarrEpisodeModel.episodefileId)
-        result = await self.session.execute(query)
-        rows = result.all()
-        if not rows:
-            return None
-        return [row[0] for row in rows]
+        targets: dict[str, str] = {}
+        for chunk in self._chunks(destinations):
+            result = await self.session.execute(
+                select(SymlinkModel.destination, SymlinkModel.target).where(
+                    SymlinkModel.destination.in_(chunk),
+                ),
+            )
+            targets.update(result.tuples().all())
+        return targets
 
-    async def get_radarr_movies_file_id(self) -> Optional[List[str]]:
+    async def get_sonarr_episodes_file_id(self) -> frozenset[int]:
         """
-        Get a list of all Radarr movies file ID.
-        :return: List of Radarr movies file ID.
+        Get the set of all Sonarr episodes file ID.
+        :return: Set of Sonarr episodes file ID, empty if there is none.
         """
-        query = select(RadarrMovieModel.fileId)
-        result = await self.session.execute(query)
-        rows = result.all()
-        if not rows:
-            return None
-        return [row[0] for row in rows]
+        result = await self.session.scalars(select(SonarrEpisodeModel.episodefileId))
+        return frozenset(result.all())
+
+    async def get_radarr_movies_file_id(self) -> frozenset[int]:
+        """
+        Get the set of all Radarr movies file ID.
+        :return: Set of Radarr movies file ID, empty if there is none.
+        """
+        result = await self.session.scalars(select(RadarrMovieModel.fileId))
+        return frozenset(result.all())
+
+    async def _get_media_file_paths(
+        self,
+        file_id_column: InstrumentedAttribute[int],
+        path_column: InstrumentedAttribute[str],
+        owner_column: InstrumentedAttribute[int],
+        owner_ids: Optional[Iterable[int]],
+    ) -> dict[int, str]:
+        """
+        Get the paths of Radarr/Sonarr media files by Arr file ID.
+        :param file_id_column: column of the Arr file ID.
+        :param path_column: path column of the same model.
+        :param owner_column: column of the Radarr movie or Sonarr series ID.
+        :param owner_ids: Radarr movie or Sonarr series IDs, None for all.
+        :return: path by Arr file ID.
+        """
+        query = select(file_id_column, path_column)
+        if owner_ids is None:
+            result = await self.session.execute(query)
+            return dict(result.tuples().all())
+        paths: dict[int, str] = {}
+        for chunk in self._chunks(owner_ids):
+            result = await self.session.execute(query.where(owner_column.in_(chunk)))
+            paths.update(result.tuples().all())
+        return paths
+
+    async def get_radarr_movies_file_paths(
+        self,
+        movie_ids: Optional[Iterable[int]] = None,
+    ) -> dict[int, str]:
+        """
+        Get the paths of Radarr movies files by Radarr file ID.
+        :param movie_ids: Radarr movie IDs, None for all movies.
+        :return: path by Radarr file ID.
+        """
+        return await self._get_media_file_paths(
+            RadarrMovieModel.fileId,
+            RadarrMovieModel.path,
+            RadarrMovieModel.movieId,
+            movie_ids,
+        )
+
+    async def get_sonarr_episodes_file_paths(
+        self,
+        serie_ids: Optional[Iterable[int]] = None,
+    ) -> dict[int, str]:
+        """
+        Get the paths of Sonarr episodes files by Sonarr file ID.
+        :param serie_ids: Sonarr series IDs, None for all series.
+        :return: path by Sonarr file ID.
+        """
+        return await self._get_media_file_paths(
+            SonarrEpisodeModel.episodefileId,
+            SonarrEpisodeModel.path,
+            SonarrEpisodeModel.serieId,
+            serie_ids,
+        )
+
+    async def _update_media_paths(
+        self,
+        model: type[RadarrMovieModel] | type[SonarrEpisodeModel],
+        id_column: InstrumentedAttribute[str],
+        file_id_column: InstrumentedAttribute[int],
+        paths: Mapping[int, tuple[str, Optional[str]]],
+    ) -> int:
+        """
+        Update the paths of renamed Radarr/Sonarr media files.
+        Each chunk is updated in its own transaction, a failing chunk is logged.
+        :param model: Radarr or Sonarr model.
+        :param id_column: ID column of the model.
+        :param file_id_column: column of the Arr file ID.
+        :param paths: path and relative path by Arr file ID.
+        :return: number of media info updated.
+        """
+        updated = 0
+        for chunk in self._chunks(paths):
+            try:
+                rows = await self.session.execute(
+                    select(id_column, file_id_column).where(
+                        file_id_column.in_(chunk),
+                    ),
+                )
+                values = [
+                    {
+                        "id": media_id,
+                        "path": paths[file_id][0],
+                        "relativePath": paths[file_id][1],
+                    }
+                    for media_id, file_id in rows.tuples().all()
+                ]
+                if values:
+                    await self.session.execute(update(model), values)
+                await self.session.commit()
+                updated += len(values)
+            except Exception as e:
+                logger.error(f"An error occurred while updating media paths: {e!s}")
+                await self.session.rollback()
+        return updated
+
+    async def update_radarr_movies_paths(
+        self,
+        paths: Mapping[int, tuple[str, Optional[str]]],
+    ) -> int:
+        """
+        Update the paths of renamed Radarr movies files.
+        :param paths: path and relative path by Radarr file ID.
+        :return: number of movies info updated.
+        """
+        return await self._update_media_paths(
+            RadarrMovieModel,
+            RadarrMovieModel.id,
+            RadarrMovieModel.fileId,
+            paths,
+        )
+
+    async def update_sonarr_episodes_paths(
+        self,
+        paths: Mapping[int, tuple[str, Optional[str]]],
+    ) -> int:
+        """
+        Update the paths of renamed Sonarr episodes files.
+        :param paths: path and relative path by Sonarr file ID.
+        :return: number of episodes info updated.
+        """
+        return await self._update_media_paths(
+            SonarrEpisodeModel,
+            SonarrEpisodeModel.id,
+            SonarrEpisodeModel.episodefileId,
+            paths,
+        )
 
     async def get_radarr_info_by_id(
         self,
@@ -416,6 +1016,10 @@ class MediaDAO:
             torrent_file = await self.session.get(TorrentFileModel, file_id)
             if radarr_movie and torrent_file:
                 torrent_file.radarr_info = radarr_movie
+                if torrent_file.torrent_id:
+                    torrent_file.seq = await self._touch_torrents(
+                        [torrent_file.torrent_id],
+                    )
                 await self.session.commit()
         except Exception as e:
             logger.error(f"An error occurred while linking torrent to Radarr: {e!s}")
@@ -432,7 +1036,496 @@ class MediaDAO:
             torrent_file = await self.session.get(TorrentFileModel, file_id)
             if sonarr_episode and torrent_file:
                 torrent_file.sonarr_info = sonarr_episode
+                if torrent_file.torrent_id:
+                    torrent_file.seq = await self._touch_torrents(
+                        [torrent_file.torrent_id],
+                    )
                 await self.session.commit()
         except Exception as e:
             logger.error(f"An error occurred while linking torrent to Sonarr: {e!s}")
             await self.session.rollback()
+
+    async def _get_paths_ids(
+        self,
+        path_column: InstrumentedAttribute[str],
+        id_column: InstrumentedAttribute[str],
+        paths: Iterable[str],
+    ) -> dict[str, str]:
+        """
+        Get the IDs of Radarr movies or Sonarr episodes by path.
+        :param path_column: path column of the Radarr or Sonarr model.
+        :param id_column: ID column of the same model.
+        :param paths: paths to look up.
+        :return: ID by path, for the paths found.
+        """
+        result = await self.session.execute(
+            select(path_column, id_column).where(path_column.in_(paths)),
+        )
+        ids: dict[str, str] = {}
+        for path, media_id in result.tuples().all():
+            ids.setdefault(path, media_id)
+        return ids
+
+    async def _link_files_chunk(
+        self,
+        files: Sequence[tuple[str, Optional[str], str]],
+        result: MediaLinkResult,
+    ) -> None:
+        """
+        Link a chunk of torrent files to the media info at their symlink destination.
+        :param files: ID, torrent ID and symlink destination of the files.
+        :param result: media link result to update.
+        """
+        destinations = [destination for _, _, destination in files]
+        radarr_ids = await self._get_paths_ids(
+            RadarrMovieModel.path,
+            RadarrMovieModel.id,
+            destinations,
+        )
+        sonarr_ids = await self._get_paths_ids(
+            SonarrEpisodeModel.path,
+            SonarrEpisodeModel.id,
+            [path for path in destinations if path not in radarr_ids],
+        )
+        radarr_links: list[dict[str, Any]] = []
+        sonarr_links: list[dict[str, Any]] = []
+        torrent_ids: set[str] = set()
+        for file_id, torrent_id, destination in files:
+            if destination in radarr_ids:
+                radarr_links.append(
+                    {"id": file_id, "radarr_id": radarr_ids[destination]},
+                )
+            elif destination in sonarr_ids:
+                sonarr_links.append(
+                    {"id": file_id, "sonarr_id": sonarr_ids[destination]},
+                )
+            else:
+                continue
+            logger.debug(f"Found media path for torrent file: {destination}")
+            if torrent_id:
+                torrent_ids.add(torrent_id)
+        seq = await self._touch_torrents(torrent_ids)
+        for links in (radarr_links, sonarr_links):
+            if links:
+                await self.session.execute(
+                    update(TorrentFileModel),
+                    [{**link, "seq": seq} for link in links],
+                )
+        await self.session.commit()
+        result.radarr += len(radarr_links)
+        result.sonarr += len(sonarr_links)
+        result.unlinked += len(files) - len(radarr_links) - len(sonarr_links)
+
+    async def link_files_to_media(self) -> MediaLinkResult:
+        """
+        Link the torrent files with a symlink to the Radarr or Sonarr media info
+        whose path is the symlink destination.
+        Files are read in chunks, each chunk costs one lookup per Arr and one bulk
+        update in its own transaction. A failing chunk is reported as failed.
+        :return: media link result.
+        """
+        result = MediaLinkResult()
+        after = ""
+        while True:
+            rows = await self.session.execute(
+                select(
+                    TorrentFileModel.id,
+                    TorrentFileModel.torrent_id,
+                    SymlinkModel.destination,
+                )
+                .join(SymlinkModel, TorrentFileModel.symlink_id == SymlinkModel.id)
+                .where(
+                    TorrentFileModel.radarr_id.is_(None),
+                    TorrentFileModel.sonarr_id.is_(None),
+                    TorrentFileModel.symlink_id.is_not(None),
+                    TorrentFileModel.id > after,
+                )
+                .order_by(TorrentFileModel.id)
+                .limit(max(settings.media_db_batch_size, 1)),
+            )
+            files = rows.tuples().all()
+            if not files:
+                return result
+            after = files[-1][0]
+            try:
+                await self._link_files_chunk(files, result)
+            except Exception as e:
+                logger.error(f"An error occurred while linking media info: {e!s}")
+                await self.session.rollback()
+                result.failed.extend((file_id, str(e)) for file_id, _, _ in files)
+
+    @staticmethod
+    def _chunks(keys: Iterable[_Row]) -> Iterable[list[_Row]]:
+        """
+        Split keys in chunks of media_db_batch_size.
+        :param keys: keys to split.
+        :return: iterable of chunks.
+        """
+        keys = list(keys)
+        size = max(settings.media_db_batch_size, 1)
+        return (keys[start : start + size] for start in range(0, len(keys), size))
+
+    async def _execute_dml(self, statement: Executable) -> CursorResult[Any]:
+        """
+        Execute an update or a delete.
+        :param statement: update or delete statement.
+        :return: cursor result, with the count of the matched rows.
+        """
+        return cast(CursorResult[Any], await self.session.execute(statement))
+
+    async def delete_torrents_by_hash(self, hashes: Iterable[str]) -> BulkDeleteResult:
+        """
+        Delete torrents with their files and the symlinks of their files.
+        Removals are recorded in the change journal. Each chunk of torrents is
+        deleted in its own transaction, a failing chunk is reported as failed.
+        :param hashes: hashes of the torrents to delete.
+        :return: bulk delete result.
+        """
+        result = BulkDeleteResult()
+        for chunk in self._chunks(hashes):
+            try:
+                torrent_ids = (
+                    select(TorrentModel.id)
+                    .where(TorrentModel.hash.in_(chunk))
+                    .scalar_subquery()
+                )
+                symlinks_result = await self.session.scalars(
+                    select(TorrentFileModel.symlink_id).where(
+                        TorrentFileModel.torrent_id.in_(torrent_ids),
+                        TorrentFileModel.symlink_id.is_not(None),
+                    ),
+                )
+                symlink_ids = symlinks_result.all()
+                await self.session.execute(
+                    delete(TorrentFilePathModel)
+                    .where(
+                        TorrentFilePathModel.file_id.in_(
+                            select(TorrentFileModel.id).where(
+                                TorrentFileModel.torrent_id.in_(torrent_ids),
+                            ),
+                        ),
+                    )
+                    .execution_options(synchronize_session=False),
+                )
+                files = await self._execute_dml(
+                    delete(TorrentFileModel)
+                    .where(TorrentFileModel.torrent_id.in_(torrent_ids))
+                    .execution_options(synchronize_session=False),
+                )
+                symlinks = await self._execute_dml(
+                    delete(SymlinkModel)
+                    .where(SymlinkModel.id.in_(symlink_ids))
+                    .execution_options(synchronize_session=False),
+                )
+                torrents = await self.session.scalars(
+                    delete(TorrentModel)
+                    .where(TorrentModel.hash.in_(chunk))
+                    .returning(TorrentModel.hash)
+                    .execution_options(synchronize_session=False),
+                )
+                deleted = torrents.all()
+                await self._record_changes("removed", deleted)
+                await self.session.commit()
+            except Exception as e:
+                logger.error(f"An error occurred while deleting torrents: {e!s}")
+                await self.session.rollback()
+                result.failed.extend((torrent_hash, str(e)) for torrent_hash in chunk)
+                continue
+            result.deleted += len(deleted)
+            result.files += files.rowcount
+            result.symlinks += symlinks.rowcount
+        return result
+
+    async def _delete_media(
+        self,
+        model: type[RadarrMovieModel] | type[SonarrEpisodeModel],
+        id_column: InstrumentedAttribute[str],
+        file_id_column: InstrumentedAttribute[int],
+        link_column: InstrumentedAttribute[Optional[str]],
+        file_ids: Iterable[int],
+    ) -> BulkDeleteResult:
+        """
+        Delete Radarr/Sonarr media info and unlink it from the torrent files.
+        The torrents of the unlinked files are recorded as updated.
+        :param model: Radarr or Sonarr model.
+        :param id_column: ID column of the model.
+        :param file_id_column: column of the Arr file ID.
+        :param link_column: column of the torrent files linking to the model.
+        :param file_ids: Arr file IDs of the media to delete.
+        :return: bulk delete result.
+        """
+        result = BulkDeleteResult()
+        for chunk in self._chunks(file_ids):
+            try:
+                media_ids = (
+                    select(id_column).where(file_id_column.in_(chunk)).scalar_subquery()
+                )
+                torrent_ids = await self.session.scalars(
+                    select(TorrentFileModel.torrent_id).where(
+                        link_column.in_(media_ids),
+                        TorrentFileModel.torrent_id.is_not(None),
+                    ),
+                )
+                await self._touch_torrents(filter(None, torrent_ids.all()))
+                files = await self._execute_dml(
+                    update(TorrentFileModel)
+                    .where(link_column.in_(media_ids))
+                    .values({link_column.key: None})
+                    .execution_options(synchronize_session=False),
+                )
+                media = await self._execute_dml(
+                    delete(model)
+                    .where(file_id_column.in_(chunk))
+                    .execution_options(synchronize_session=False),
+                )
+                await self.session.commit()
+            except Exception as e:
+                logger.error(f"An error occurred while deleting media info: {e!s}")
+                await self.session.rollback()
+                result.failed.extend((file_id, str(e)) for file_id in chunk)
+                continue
+            result.deleted += media.rowcount
+            result.files += files.rowcount
+        return result
+
+    async def delete_radarr_movies_by_file_id(
+        self,
+        file_ids: Iterable[int],
+    ) -> BulkDeleteResult:
+        """
+        Delete Radarr movies info and unlink it from the torrent files.
+        :param file_ids: Radarr file IDs of the movies.
+        :return: bulk delete result.
+        """
+        return await self._delete_media(
+            RadarrMovieModel,
+            RadarrMovieModel.id,
+            RadarrMovieModel.fileId,
+            TorrentFileModel.radarr_id,
+            file_ids,
+        )
+
+    async def delete_sonarr_episodes_by_file_id(
+        self,
+        file_ids: Iterable[int],
+    ) -> BulkDeleteResult:
+        """
+        Delete Sonarr episodes info and unlink it from the torrent files.
+        :param file_ids: Sonarr episode file IDs of the episodes.
+        :return: bulk delete result.
+        """
+        return await self._delete_media(
+            SonarrEpisodeModel,
+            SonarrEpisodeModel.id,
+            SonarrEpisodeModel.episodefileId,
+            TorrentFileModel.sonarr_id,
+            file_ids,
+        )
+
+    async def delete_symlinks_by_destination(
+        self,
+        destinations: Iterable[str],
+        directories: Iterable[str] = (),
+    ) -> BulkDeleteResult:
+        """
+        Delete symlinks and unlink them from their torrent file.
+        Each chunk of symlinks is deleted in its own transaction, a failing chunk
+        is reported as failed.
+        :param destinations: destination paths of the symlinks.
+        :param directories: directories whose symlinks are all deleted.
+        :return: bulk delete result.
+        """
+        conditions: list[tuple[list[str], ColumnElement[bool]]] = [
+            (chunk, SymlinkModel.destination.in_(chunk))
+            for chunk in self._chunks(destinations)
+        ]
+        conditions.extend(
+            (
+                [directory],
+                SymlinkModel.destination.startswith(
+                    f"{directory.rstrip(os.sep)}{os.sep}",
+                    autoescape=True,
+                ),
+            )
+            for directory in directories
+        )
+        result = BulkDeleteResult()
+        for paths, condition in conditions:
+            try:
+                symlink_ids = select(SymlinkModel.id).where(condition).scalar_subquery()
+                files = await self._execute_dml(
+                    update(TorrentFileModel)
+                    .where(TorrentFileModel.symlink_id.in_(symlink_ids))
+                    .values(symlink_id=None)
+                    .execution_options(synchronize_session=False),
+                )
+                symlinks = await self._execute_dml(
+                    delete(SymlinkModel)
+                    .where(condition)
+                    .execution_options(synchronize_session=False),
+                )
+                await self.session.commit()
+            except Exception as e:
+                logger.error(f"An error occurred while deleting symlinks: {e!s}")
+                await self.session.rollback()
+                result.failed.extend((path, str(e)) for path in paths)
+                continue
+            result.deleted += symlinks.rowcount
+            result.files += files.rowcount
+            result.symlinks += symlinks.rowcount
+        return result
+
+    async def get_change_seq(self) -> int:
+        """
+        Get the sequence of the last recorded torrent change.
+        :return: change sequence, 0 when nothing was ever recorded.
+        """
+        seq = await self.session.scalar(select(func.max(MediaChangeModel.seq)))
+        return seq or 0
+
+    async def get_changes_since(
+        self,
+        seq: int,
+        limit: Optional[int] = None,
+    ) -> MediaChanges:
+        """
+        Get the torrent hashes changed after a change sequence.
+        A hash is reported once, removed when its last change is a removal,
+        added when it was added after seq and updated otherwise.
+        :param seq: change sequence to start after.
+        :param limit: maximum number of journal entries read, the returned
+            sequence is then the one to continue from.
+        :return: changed torrent hashes.
+        """
+        result = await self.session.execute(
+            select(MediaChangeModel.seq, MediaChangeModel.hash, MediaChangeModel.op)
+            .where(MediaChangeModel.seq > seq)
+            .order_by(MediaChangeModel.seq)
+            .limit(limit),
+        )
+        changes = MediaChanges(since=seq, seq=seq)
+        last_op: dict[str, str] = {}
+        added: set[str] = set()
+        for change_seq, torrent_hash, op in result.all():
+            changes.seq = change_seq
+            last_op[torrent_hash] = op
+            if op == "added":
+                added.add(torrent_hash)
+        for torrent_hash, op in last_op.items():
+            if op == "removed":
+                changes.removed.append(torrent_hash)
+            elif torrent_hash in added:
+                changes.added.append(torrent_hash)
+            else:
+                changes.updated.append(torrent_hash)
+        return changes
+
+    async def get_changes_floor(self) -> int:
+        """
+        Get the change sequence up to which the change journal was compacted.
+        Reading the changes after a lower sequence, other than 0, misses the
+        removals compacted away, such a reader needs a full resync from 0.
+        :return: compacted sequence, 0 when the journal was never compacted.
+        """
+        return int(await self.get_state(CHANGES_FLOOR_STATE) or 0)
+
+    async def prune_changes(self, floor: int) -> int:
+        """
+        Compact the change journal up to a change sequence.
+        Up to floor only the last change of the torrents still in the database
+        is kept, reading the changes from 0 still lists all of them.
+        :param floor: change sequence to compact up to.
+        :return: number of journal entries deleted.
+        """
+        if floor <= await self.get_changes_floor():
+            return 0
+        later = aliased(MediaChangeModel)
+        try:
+            result = await self._execute_dml(
+                delete(MediaChangeModel)
+                .where(
+                    MediaChangeModel.seq <= floor,
+                    or_(
+                        MediaChangeModel.op == "removed",
+                        exists().where(
+                            later.hash == MediaChangeModel.hash,
+                            later.seq > MediaChangeModel.seq,
+                        ),
+                    ),
+                )
+                .execution_options(synchronize_session=False),
+            )
+            await self.session.merge(
+                StateModel(key=CHANGES_FLOOR_STATE, value=str(floor)),
+            )
+            await self.session.commit()
+        except Exception as e:
+            logger.error(f"An error occurred while pruning torrent changes: {e!s}")
+            await self.session.rollback()
+            return 0
+        return result.rowcount
+
+    async def get_symlink_directories(self) -> Sequence[SymlinkDirectoryModel]:
+        """
+        Get the directories of the symlink library as of the last scan.
+        :return: List of symlink directory models.
+        """
+        result = await self.session.scalars(select(SymlinkDirectoryModel))
+        return result.all()
+
+    async def save_symlink_directories(
+        self,
+        directories: Iterable[dict[str, Any]],
+        removed: Iterable[str],
+    ) -> None:
+        """
+        Upsert the scanned directories of the symlink library.
+        :param directories: path, mtime_ns, inode and subdirs of the directories.
+        :param removed: paths of the directories gone since the last scan.
+        """
+        try:
+            for chunk in self._chunks(directories):
+                statement = sqlite_insert(SymlinkDirectoryModel)
+                await self.session.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[SymlinkDirectoryModel.path],
+                        set_={
+                            "mtime_ns": statement.excluded.mtime_ns,
+                            "inode": statement.excluded.inode,
+                            "subdirs": statement.excluded.subdirs,
+                        },
+                    ),
+                    chunk,
+                )
+            for paths in self._chunks(removed):
+                await self.session.execute(
+                    delete(SymlinkDirectoryModel)
+                    .where(SymlinkDirectoryModel.path.in_(paths))
+                    .execution_options(synchronize_session=False),
+                )
+            await self.session.commit()
+        except Exception as e:
+            logger.error(f"An error occurred while saving symlink directories: {e!s}")
+            await self.session.rollback()
+
+    async def get_state(self, key: str) -> Optional[str]:
+        """
+        Get a value persisted between runs.
+        :param key: key of the value.
+        :return: the value or None if not set.
+        """
+        state = await self.session.get(StateModel, key)
+        return state.value if state else None
+
+    async def set_state(self, key: str, value: str) -> None:
+        """
+        Persist a value between runs.
+        :param key: key of the value.
+        :param value: the value.
+        """
+        try:
+            await self.session.merge(StateModel(key=key, value=value))
+            await self.session.commit()
+        except Exception as e:
+            logger.error(f"An error occurred while saving state {key}: {e!s}")
+            await self.session.rollback()
@@ -0,0 +1,114 @@
+"""Shared engines of the media database."""
+import os
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from rd_syncrr.settings import settings
+
+# engines and session factories of the running application, by read only flag
+_engines: dict[bool, AsyncEngine] = {}
+_session_factories: dict[bool, async_sessionmaker] = {}  # type: ignore[type-arg]
+
+
+def media_db_url() -> str:
+    """
+    Get the URL of the media database.
+
+    :return: database URL.
+    """
+    if settings.environment == "dev":
+        db_path = "rd_syncrr_media_dev.db"
+    else:
+        db_path = os.path.join(settings.media_db_location, "rd_syncrr_media.db")
+    return f"sqlite+aiosqlite:///{db_path}"
+
+
+def _set_pragmas(readonly: bool) -> Any:
+    """
+    Get a listener setting the SQLite pragmas of new connections.
+
+    WAL lets the readers work while a write transaction is open, and a busy
+    connection waits busy_timeout for the lock instead of failing with
+    "database is locked".
+
+    :param readonly: connections of the reader engine.
+    :return: connect event listener.
+    """
+
+    def listener(dbapi_connection: Any, _: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.media_db_busy_timeout)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.media_db_cache_size)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.media_db_mmap_size)}")
+        if readonly:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    return listener
+
+
+def create_media_engine(readonly: bool = False) -> AsyncEngine:
+    """
+    Create an engine of the media database with its pragmas set.
+
+    The writer engine keeps a single connection, the tasks writing to the
+    database take turns on it, with media_db_writer_overflow extra connections
+    for jobs running at the same time, SQLite then serializes their writes.
+    The reader engine keeps a pool of media_db_readers read only connections.
+    The queue pool is set explicitly, older SQLAlchemy releases default to
+    NullPool for aiosqlite files.
+
+    :param readonly: create the reader engine.
+    :return: async engine.
+    """
+    engine = create_async_engine(
+        media_db_url(),
+        echo=settings.media_db_echo,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=max(settings.media_db_readers, 1) if readonly else 1,
+        max_overflow=0 if readonly else max(settings.media_db_writer_overflow, 0),
+    )
+    event.listen(engine.sync_engine, "connect", _set_pragmas(readonly))
+    return engine
+
+
+def get_media_engine(readonly: bool = False) -> AsyncEngine:
+    """
+    Get the shared writer or reader engine of the media database.
+
+    :param readonly: get the reader engine.
+    :return: async engine.
+    """
+    if readonly not in _engines:
+        _engines[readonly] = create_media_engine(readonly)
+    return _engines[readonly]
+
+
+def get_session_factory(
+    readonly: bool = False,
+) -> async_sessionmaker:  # type: ignore[type-arg]
+    """
+    Get the session factory of the shared writer or reader engine.
+
+    :param readonly: get the sessions of the reader engine.
+    :return: session factory.
+    """
+    if readonly not in _session_factories:
+        _session_factories[readonly] = async_sessionmaker(
+            get_media_engine(readonly),
+            expire_on_commit=False,
+        )
+    return _session_factories[readonly]
+
+
+async def dispose_media_engines() -> None:
+    """Close the connections of the shared engines."""
+    for engine in _engines.values():
+        await engine.dispose()
+    _engines.clear()
+    _session_factories.clear()
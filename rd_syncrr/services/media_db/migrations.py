@@ -0,0 +1,39 @@
+"""Schema upgrades for existing media databases."""
+from sqlalchemy import Connection, inspect
+from sqlalchemy.schema import CreateColumn
+
+from rd_syncrr.services.media_db.meta import meta
+
+
+def _add_missing_columns(connection: Connection) -> None:
+    """
+    Add the model columns missing from existing tables.
+
+    SQLite can only add a NOT NULL column with a default, so such columns must
+    declare a server_default.
+
+    :param connection: connection to the media database.
+    """
+    inspector = inspect(connection)
+    for table in meta.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+
+def upgrade_schema(connection: Connection) -> None:
+    """
+    Bring an existing database up to date with the models.
+
+    `create_all` only creates missing tables, columns and indexes added to an
+    existing table are created here. Every step must be idempotent.
+
+    :param connection: connection to the media database.
+    """
+    _add_missing_columns(connection)
+    for table in meta.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
@@ -3,7 +3,7 @@ from datetime import datetime
 from typing import List  # noqa: UP035
 
 import shortuuid
-from sqlalchemy import JSON, DateTime, ForeignKey, Integer
+from sqlalchemy import JSON, BigInteger, DateTime, ForeignKey, Index, Integer, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql.sqltypes import Optional, String
 
@@ -14,6 +14,10 @@ class TorrentModel(Base):
     """Model for torrent"""
 
     __tablename__ = "rd_torrents"
+    __table_args__ = (
+        # keyset pagination, newest first
+        Index("ix_rd_torrents_added_id", "added", "id"),
+    )
 
     id: Mapped[str] = mapped_column(primary_key=True, nullable=False)  # noqa: A003
     hash: Mapped[str] = mapped_column(  # noqa: A003
@@ -27,6 +31,14 @@ class TorrentModel(Base):
         default=datetime.utcnow,
         nullable=False,
     )
+    # MediaChangeModel.seq of the last change of the torrent or its files
+    seq: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        index=True,
+    )
 
     files: Mapped[Optional[list["TorrentFileModel"]]] = relationship(
         "TorrentFileModel",
@@ -65,7 +77,7 @@ class RadarrMovieModel(Base):
     originalFilePath: Mapped[str] = mapped_column(String, nullable=True)
     relativePath: Mapped[str] = mapped_column(String, nullable=True)
     path: Mapped[str] = mapped_column(String, nullable=False, index=True)
-    fileId: Mapped[int] = mapped_column(Integer, nullable=True)
+    fileId: Mapped[int] = mapped_column(Integer, nullable=True, index=True)
 
     torrent_file: Mapped[Optional["TorrentFileModel"]] = relationship(
         "TorrentFileModel",
@@ -107,7 +119,7 @@ class SonarrEpisodeModel(Base):
     languages: Mapped[List[str]] = mapped_column(JSON, nullable=True)
     relativePath: Mapped[str] = mapped_column(String, nullable=True)
     path: Mapped[str] = mapped_column(String, nullable=False, index=True)
-    episodefileId: Mapped[int] = mapped_column(Integer, nullable=True)
+    episodefileId: Mapped[int] = mapped_column(Integer, nullable=True, index=True)
     episodeId: Mapped[int] = mapped_column(Integer, nullable=True)
 
     torrent_file: Mapped[Optional["TorrentFileModel"]] = relationship(
@@ -121,6 +133,10 @@ class SymlinkModel(Base):
     """Model for symlink"""
 
     __tablename__ = "local_symlinks"
+    __table_args__ = (
+        # symlinks by destination, covering their target
+        Index("ix_local_symlinks_destination", "destination", "target"),
+    )
 
     id: Mapped[str] = mapped_column(  # noqa: A003
         String(length=12),
@@ -149,6 +165,28 @@ class TorrentFileModel(Base):
     """Model files in torrent."""
 
     __tablename__ = "rd_torrents_files"
+    __table_args__ = (
+        # most files have no symlink or media info yet, the lookups by link only
+        # need the linked ones, and a NULL lookup never picks these indexes
+        *(
+            Index(
+                f"ix_rd_torrents_files_{column}",
+                column,
+                sqlite_where=text(f"{column} IS NOT NULL"),
+            )
+            for column in ("symlink_id", "radarr_id", "sonarr_id")
+        ),
+        # files with a symlink but no media info, in id order for keyset reads
+        Index(
+            "ix_rd_torrents_files_unlinked_media",
+            "id",
+            "symlink_id",
+            "torrent_id",
+            sqlite_where=text(
+                "radarr_id IS NULL AND sonarr_id IS NULL AND symlink_id IS NOT NULL",
+            ),
+        ),
+    )
 
     id: Mapped[str] = mapped_column(  # noqa: A003
         String(length=32),
@@ -163,9 +201,16 @@ class TorrentFileModel(Base):
         default=datetime.utcnow,
         nullable=False,
     )
+    seq: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+    )
     torrent_id: Mapped[Optional[str]] = mapped_column(
         String,
         ForeignKey("rd_torrents.id"),
+        index=True,
     )
     symlink_id: Mapped[Optional[str]] = mapped_column(
         String,
@@ -203,3 +248,65 @@ class TorrentFileModel(Base):
         uselist=False,
         foreign_keys="TorrentFileModel.sonarr_id",
     )
+
+
+class TorrentFilePathModel(Base):
+    """Index of the torrent files by their path under the Real-Debrid mount."""
+
+    __tablename__ = "rd_torrents_files_paths"
+
+    file_id: Mapped[str] = mapped_column(
+        String(length=32),
+        ForeignKey("rd_torrents_files.id"),
+        primary_key=True,
+    )
+    # torrent filename and path of the file in the torrent, normalized
+    path: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    bytes: Mapped[int] = mapped_column(Integer, nullable=False)  # noqa: A003
+
+
+class MediaChangeModel(Base):
+    """Journal of torrent changes, ordered by a monotonic sequence."""
+
+    __tablename__ = "media_changes"
+
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    hash: Mapped[str] = mapped_column(  # noqa: A003
+        String(length=40),
+        nullable=False,
+        index=True,
+    )
+    # added, updated or removed
+    op: Mapped[str] = mapped_column(String(length=10), nullable=False)
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=datetime.utcnow,
+        nullable=False,
+    )
+
+
+class SymlinkDirectoryModel(Base):
+    """Directories of the symlink library as of the last scan."""
+
+    __tablename__ = "symlink_directories"
+
+    path: Mapped[str] = mapped_column(String, primary_key=True)
+    mtime_ns: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    inode: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # names of the sub directories
+    subdirs: Mapped[List[str]] = mapped_column(JSON, nullable=False)
+
+
+class StateModel(Base):
+    """Key value store for the state of the tasks between runs."""
+
+    __tablename__ = "syncrr_state"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    value: Mapped[str] = mapped_column(String, nullable=False)
+    updated: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        nullable=False,
+    )
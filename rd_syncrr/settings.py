@@ -41,6 +41,14 @@ class Settings(BaseSettings):
     config_path: str = "/config"
     media_path: str = "/media"
     symlink_path: str = "/symlinks"
+    # library folders scanned for symlinks at the same time
+    symlink_scan_workers: int = 4
+    # keep the symlinks in sync with inotify events, between the scans
+    symlink_watch: bool = False
+    # seconds events are collected before being written to the database
+    symlink_watch_delay: float = 2.0
+    # changed paths waiting to be written, past that the library is scanned
+    symlink_watch_max_pending: int = 10000
     downloads_path: str = "/downloads"
 
     # file
@@ -48,8 +56,29 @@ class Settings(BaseSettings):
 
     # Real-Debrid
     rd_token: str | None = None
-    rd_sleep: int = 100
-    rd_long_sleep: int = 500
+    # requests per minute and burst size, Real-Debrid allows 250 per minute
+    rd_rate_limit: int = 250
+    rd_rate_burst: int = 10
+    # torrents fetched from RD at the same time
+    rd_concurrency: int = 8
+    # probe the RD listing head to skip or shorten the torrents listing
+    rd_torrents_probe: bool = True
+    # cache of the torrent files by hash, kept out of the media database,
+    # empty to disable
+    rd_manifest_cache: str = os.path.join(config_path, "rd_manifests.db")
+    # retries of the idempotent RD calls, with jittered exponential backoff
+    rd_max_retries: int = 4
+    rd_backoff_base: float = 1.0
+    rd_backoff_max: float = 60.0
+    # failures in a row pausing every RD call, and the pause in seconds
+    rd_circuit_failures: int = 5
+    rd_circuit_recovery: float = 120.0
+
+    # Shared HTTP client
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry: float = 30.0
+    http_timeout: float = 30.0
 
     # Security
     security_secret: str | None = None
@@ -60,12 +89,30 @@ class Settings(BaseSettings):
     # Database media
     media_db_location: str = os.path.join(config_path, "/database/")
     media_db_echo: bool = False
+    media_db_batch_size: int = 200
+    # largest share of the stored rows a sync may delete, more is taken as a
+    # partial listing from the source and nothing is deleted
+    media_db_max_removed_ratio: float = 0.5
+    # milliseconds a connection waits for a lock held by another one
+    media_db_busy_timeout: int = 5000
+    # page cache of each connection, in KiB
+    media_db_cache_size: int = 65536
+    # bytes of the database file memory mapped by each connection
+    media_db_mmap_size: int = 268435456
+    # read only connections of the API
+    media_db_readers: int = 4
+    # writer connections opened for jobs writing at the same time
+    media_db_writer_overflow: int = 4
+    # change journal entries kept whole, older ones are compacted to the last
+    # change of each torrent, 0 keeps them all
+    media_db_changes_retention: int = 100000
 
     # rd_syncrr_api module
     syncrr_api_key: str | None = None
+    # API base URL of the other instance, the /sync routes are relative to it
     syncrr_host: str | None = None
-    syncrr_sleep: int = 100
-    syncrr_long_sleep: int = 500
+    syncrr_rate_limit: int = 600
+    syncrr_rate_burst: int = 20
 
     # radarr module
     radarr_host: str = "http://radarr:7878"
@@ -74,6 +121,8 @@ class Settings(BaseSettings):
     # sonarr module
     sonarr_host: str = "http://sonarr:8989"
     sonarr_api_key: str | None = None
+    # series fetched from Sonarr at the same time
+    sonarr_concurrency: int = 4
 
     # logger
     log_level: LogLevel = LogLevel.INFO
@@ -82,6 +131,10 @@ class Settings(BaseSettings):
     # scheduler
     sched_db_update_interval: int = 15
     sched_sync_interval: int = 30
+    # full Radarr/Sonarr catalog pull, history is read in between
+    sched_arr_full_sync_interval: int = 1440
+    # full symlink library scan, only changed directories are listed in between
+    sched_symlink_full_scan_interval: int = 1440
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -1,8 +1,13 @@
 """Tasks for the services app."""
-from rd_syncrr.tasks.data_process import process_jsonfile, process_torrents_data
+from rd_syncrr.tasks.data_process import (
+    process_jsonfile,
+    process_torrent_changes,
+    process_torrents_data,
+    prune_torrent_changes,
+)
 from rd_syncrr.tasks.infolink_process import process_unlinked_media_info
 from rd_syncrr.tasks.mediainfo_process import process_mediainfo
-from rd_syncrr.tasks.symlink_process import process_symlink
+from rd_syncrr.tasks.symlink_process import process_symlink, watch_symlink
 from rd_syncrr.tasks.sync_instance import sync_all_torrents, sync_latest_torrents
 from rd_syncrr.tasks.torrents_action import (
     add_cached_torrent_to_rd,
@@ -15,8 +20,11 @@ __all__ = [
     "process_unlinked_media_info",
     "process_mediainfo",
     "process_symlink",
+    "watch_symlink",
     "process_jsonfile",
     "process_torrents_data",
+    "process_torrent_changes",
+    "prune_torrent_changes",
     "sync_all_torrents",
     "sync_latest_torrents",
     "check_hash_availability",
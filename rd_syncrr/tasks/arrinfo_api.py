@@ -1,12 +1,51 @@
 """Add media info to database from radarr/sonarr."""
 
-from typing import Any, Dict, List  # noqa: UP035
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Union  # noqa: UP035
 
 from rd_syncrr.logging import logger
 from rd_syncrr.settings import settings
 from rd_syncrr.utils.pyarr import RadarrAPI, SonarrAPI
+from rd_syncrr.utils.pyarr.exceptions import PyarrResourceNotFound
 from rd_syncrr.utils.pyarr.types import JsonArray, JsonObject
 
+# history events changing the files known by Radarr/Sonarr
+RADARR_FILE_EVENTS = frozenset(
+    {
+        "downloadFolderImported",
+        "movieFolderImported",
+        "movieFileDeleted",
+        "movieFileRenamed",
+    },
+)
+SONARR_FILE_EVENTS = frozenset(
+    {
+        "downloadFolderImported",
+        "seriesFolderImported",
+        "episodeFileDeleted",
+        "episodeFileRenamed",
+    },
+)
+
+
+class ArrPull(NamedTuple):
+    """Media info pulled from an Arr and the ids that could not be fetched."""
+
+    items: JsonArray
+    # movies or series ids whose fetch failed, their changes were not pulled
+    failed: Set[int]
+    # movies or series ids pulled, None for the whole catalog
+    ids: Optional[Set[int]] = None
+
+
+def _as_array(response: Union[JsonArray, JsonObject[Any]]) -> JsonArray:
+    """Get an Arr response as a list, single items are returned as dicts."""
+    if isinstance(response, dict):
+        return [response]
+    return response
+
 
 class ArrInfo:
     def __init__(self) -> None:
@@ -73,11 +112,45 @@ class ArrInfo:
             "episodefileId": episode_file.get("id"),
         }
 
-    def get_radarr_info(self) -> JsonArray:
+    def _get_by_ids(
+        self,
+        get: Callable[[int], Union[JsonArray, JsonObject[Any]]],
+        ids: Iterable[int],
+        failed: Set[int],
+    ) -> JsonArray:
+        """Get movies or series one id at a time.
+
+        History reports deletes of movies and series that may be gone, those
+        are skipped, the ids of the other failed fetches are added to failed.
+
+        Args:
+            get (Callable): Arr API getter of an item by id.
+            ids (Iterable[int]): Ids of the items.
+            failed (Set[int]): Ids whose fetch failed, updated in place.
+        """
+        items: JsonArray = []
+        for _id in ids:
+            try:
+                items.extend(_as_array(get(_id)))
+            except PyarrResourceNotFound:
+                logger.debug(f"Item {_id} not found, deleted from the Arr")
+            except Exception as e:
+                logger.error(f"Failed to get item {_id}: {e}")
+                failed.add(_id)
+        return items
+
+    def get_radarr_info(self, movie_ids: Optional[Iterable[int]] = None) -> ArrPull:
         """Get all general radarr movies info.
 
         This function will filter out movies that have no file.
 
+        Args:
+            movie_ids (Optional[Iterable[int]]): Only get these movies. Defaults to
+                all movies.
+
+        Returns the movies, the ids of the movies that could not be fetched and
+        the ids of the movies pulled.
+
         This fonction return a list of dictionsnaries with the following format:
 
         [
@@ -102,10 +175,13 @@ class ArrInfo:
         ]
         """
         data: JsonArray = []
+        failed: Set[int] = set()
+        ids = None if movie_ids is None else set(movie_ids)
         try:
-            radarr_movies = self.radarr.get_movie()
-            if isinstance(radarr_movies, dict):
-                radarr_movies = [radarr_movies]
+            if ids is None:
+                radarr_movies = _as_array(self.radarr.get_movie())
+            else:
+                radarr_movies = self._get_by_ids(self.radarr.get_movie, ids, failed)
             for movie in radarr_movies:
                 if movie.get("hasFile") is False:
                     logger.debug(f"Movie has no file: {movie}")
@@ -118,18 +194,34 @@ class ArrInfo:
                 data.append(movie_data)
         except Exception as e:
             logger.error(f"Failed to get radarr movies: {e}")
-        return data
+            failed.update(ids or ())
+        return ArrPull(data, failed, ids)
 
-    def _get_sonarr_series_info(self) -> JsonArray:
+    def _get_sonarr_series_info(
+        self,
+        series_ids: Optional[Iterable[int]],
+        failed: Set[int],
+    ) -> JsonArray:
         """Get all general sonarr series info.
 
         This function will filter out series that have no episode files.
+
+        Args:
+            series_ids (Optional[Iterable[int]]): Only get these series, None for
+                all series.
+            failed (Set[int]): Ids of the series whose fetch failed, updated in
+                place.
         """
         data: List[Dict[str, Any]] = []
         try:
-            sonarr_series = self.sonarr.get_series()
-            if isinstance(sonarr_series, dict):
-                sonarr_series = [sonarr_series]
+            if series_ids is None:
+                sonarr_series = _as_array(self.sonarr.get_series())
+            else:
+                sonarr_series = self._get_by_ids(
+                    self.sonarr.get_series,
+                    series_ids,
+                    failed,
+                )
             for serie in sonarr_series:
                 stats = serie.get("statistics", {})
                 if stats == {}:
@@ -237,19 +329,19 @@ class ArrInfo:
         episodes_info: JsonArray,
     ) -> None:
         """Update episodes files with missing episodes info."""
+        # first episode of each file, multi episode files share their file id
+        episodes_by_file_id: Dict[int, JsonObject[Any]] = {}
+        for info in episodes_info:
+            episode_file_id = info.get("episodeFileId")
+            if episode_file_id:
+                episodes_by_file_id.setdefault(episode_file_id, info)
+
         for episode_file in episodes_files:
             episode_file_id = episode_file.get("id")
             if episode_file_id is None:
                 logger.debug(f"Episode file id not found: {episode_file}")
                 continue
-            matching_episode_info = next(
-                (
-                    info
-                    for info in episodes_info
-                    if info.get("episodeFileId") == episode_file_id
-                ),
-                None,
-            )
+            matching_episode_info = episodes_by_file_id.get(episode_file_id)
             if matching_episode_info is None:
                 logger.debug(
                     f"No matching episode info found for id: {episode_file_id}",
@@ -257,26 +349,70 @@ class ArrInfo:
                 continue
             self._update_episode_file_dict(episode_file, matching_episode_info)
 
-    def _get_updated_sonarr_info(self) -> JsonArray:
-        """Get all sonarr series info by episode with updated episode info."""
-        sonarr_series = self._get_sonarr_series_info()
-        for serie in sonarr_series:
-            series_id = serie.get("id")
-            if series_id is None:
-                logger.debug(f"Series id not found: {serie}")
-                continue
-            episodes_files = self._get_sonarr_episodes_files_info(series_id)
-            episodes_info = self._get_sonarr_episodes_info(series_id)
-            if episodes_info == [{}] or episodes_files == [{}]:
-                logger.debug(f"Episodes info not found: {serie}")
-                continue
-            self._update_episodes_files(episodes_files, episodes_info)
-            serie.update({"episodesFiles": episodes_files})
+    def _get_updated_serie_episodes_files(
+        self,
+        serie: JsonObject[Any],
+    ) -> Optional[int]:
+        """Get the episodes files of a serie with updated episode info.
+
+        Args:
+            serie (JsonObject): Sonarr serie info, updated in place.
+
+        Returns:
+            Optional[int]: The series id when its episodes could not be fetched.
+        """
+        series_id = serie.get("id")
+        if series_id is None:
+            logger.debug(f"Series id not found: {serie}")
+            return None
+        episodes_files = self._get_sonarr_episodes_files_info(series_id)
+        episodes_info = self._get_sonarr_episodes_info(series_id)
+        if episodes_info == [{}] or episodes_files == [{}]:
+            logger.debug(f"Episodes info not found: {serie}")
+            return series_id
+        self._update_episodes_files(episodes_files, episodes_info)
+        serie.update({"episodesFiles": episodes_files})
+        return None
+
+    def _get_updated_sonarr_info(
+        self,
+        series_ids: Optional[Iterable[int]],
+        failed: Set[int],
+    ) -> JsonArray:
+        """Get all sonarr series info by episode with updated episode info.
+
+        The series are fetched from Sonarr concurrently, at most
+        sonarr_concurrency series at a time.
+
+        Args:
+            series_ids (Optional[Iterable[int]]): Only get these series, None for
+                all series.
+            failed (Set[int]): Ids of the series whose fetch or episodes fetch
+                failed, updated in place.
+        """
+        sonarr_series = self._get_sonarr_series_info(series_ids, failed)
+        with ThreadPoolExecutor(
+            max_workers=max(settings.sonarr_concurrency, 1),
+            thread_name_prefix="sonarr",
+        ) as executor:
+            for series_id in executor.map(
+                self._get_updated_serie_episodes_files,
+                sonarr_series,
+            ):
+                if series_id is not None:
+                    failed.add(series_id)
         return sonarr_series
 
-    def get_sonarr_info(self) -> JsonArray:
+    def get_sonarr_info(self, series_ids: Optional[Iterable[int]] = None) -> ArrPull:
         """Get all sonarr series info by episode with updated episode info.
 
+        Args:
+            series_ids (Optional[Iterable[int]]): Only get these series. Defaults
+                to all series.
+
+        Returns the episodes, the ids of the series that could not be fetched and
+        the ids of the series pulled.
+
         This fonction return a list of dictionsnaries with the following format:
 
         [
@@ -303,13 +439,48 @@ class ArrInfo:
             },
         ]
         """
+        failed: Set[int] = set()
+        ids = None if series_ids is None else set(series_ids)
         try:
-            sonarr_series = self._get_updated_sonarr_info()
+            sonarr_series = self._get_updated_sonarr_info(ids, failed)
             data = self._create_sonarr_data(sonarr_series)
         except Exception as e:
             logger.error(f"Failed to get sonarr series: {e}")
-            return []  # Return an empty list in case of error
-        return data
+            failed.update(ids or ())
+            return ArrPull([], failed, ids)  # Return an empty list in case of error
+        return ArrPull(data, failed, ids)
+
+    def get_radarr_changed_movies(self, since: datetime) -> Set[int]:
+        """Get the ids of the movies whose files changed since a date.
+
+        Imports, deletes and renames are read from the Radarr history, errors
+        are raised so the caller does not skip the changes.
+
+        Args:
+            since (datetime): Date to look for changes after.
+        """
+        history = self.radarr.get_history_since(since)
+        return {
+            record["movieId"]
+            for record in history
+            if record.get("eventType") in RADARR_FILE_EVENTS and record.get("movieId")
+        }
+
+    def get_sonarr_changed_series(self, since: datetime) -> Set[int]:
+        """Get the ids of the series whose episodes files changed since a date.
+
+        Imports, deletes and renames are read from the Sonarr history, errors
+        are raised so the caller does not skip the changes.
+
+        Args:
+            since (datetime): Date to look for changes after.
+        """
+        history = self.sonarr.get_history_since(since)
+        return {
+            record["seriesId"]
+            for record in history
+            if record.get("eventType") in SONARR_FILE_EVENTS and record.get("seriesId")
+        }
 
 
 if __name__ == "__main__":
@@ -2,47 +2,118 @@
 
 import json
 import os
-from typing import Any, Dict, List, Sequence  # noqa: UP035
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, TextIO  # noqa: UP035
 
 from rd_syncrr.logging import logger
-from rd_syncrr.services.media_db.dao.media_dao import MediaDAO
-from rd_syncrr.services.media_db.models.media_model import TorrentFileModel
+from rd_syncrr.services.media_db.dao.media_dao import MediaChanges, MediaDAO
+from rd_syncrr.services.media_db.models.media_model import (
+    TorrentFileModel,
+    TorrentModel,
+)
 from rd_syncrr.settings import settings
 
+# change sequence of the last JSON export
+EXPORT_SEQ_STATE = "export_seq"
+
+
+@contextmanager
+def _atomic_open(path: str) -> Iterator[TextIO]:
+    """Open a temporary file that atomically replaces path when closed.
+
+    The file is written next to the target and renamed over it only when the
+    block exits without error, so readers never see a half written file.
+
+    Args:
+        path: The file path to replace.
+    """
+    fd, temp_file = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)),
+        prefix=f".{os.path.basename(path)}.",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_file, 0o644)
+        os.replace(temp_file, path)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
 
 async def _list_torrents_to_json(
-    data: list[dict[str, Any]],
+    dao: MediaDAO,
     all_torrents_file: str = "all_torrents.json",
-) -> None:
-    """List torrents to JSON file.
+) -> int:
+    """Stream all torrents from the database to the JSON file.
+
+    The torrents are written newest first as compact JSON.
 
     Args:
-        data: The list of torrents to manage.
+        dao: The database DAO for torrents.
         all_torrents_file: The file path to store all torrents.
+
+    Returns:
+        The number of torrents written, the file is left untouched when 0.
     """
+    torrents = dao.stream_torrents_with_media()
     try:
-        data.sort(key=lambda x: x["added"], reverse=True)
-
-        if not os.path.exists(all_torrents_file):
-            with open(all_torrents_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4, ensure_ascii=False, default=str)
-                logger.info(f"All torrents file created: {all_torrents_file}")
-        else:
-            with open(all_torrents_file, "r+", encoding="utf-8") as f:
-                f.seek(0)
-                f.truncate()
-                json.dump(data, f, indent=4, ensure_ascii=False, default=str)
-                logger.info(f"All torrents file updated: {all_torrents_file}")
+        torrent = await torrents.__anext__()
+    except StopAsyncIteration:
+        return 0
 
-    except Exception as e:
-        logger.error(f"An error occurred during JSON file creation: {e!s}")
+    count = 0
+    with _atomic_open(all_torrents_file) as f:
+        f.write("[")
+        while True:
+            if count:
+                f.write(",")
+            json.dump(
+                _torrent_info(torrent),
+                f,
+                ensure_ascii=False,
+                default=str,
+                separators=(",", ":"),
+            )
+            count += 1
+            try:
+                torrent = await torrents.__anext__()
+            except StopAsyncIteration:
+                break
+        f.write("]")
+    return count
 
 
-async def _fetch_files_info(
+async def _write_delta_json(
     dao: MediaDAO,
-    files: Sequence[TorrentFileModel],
-) -> list[dict[str, Any]] | None:
-    """Fetch files info from database."""
+    delta_file: str,
+    since: int,
+) -> MediaChanges:
+    """Write the torrents changed since a change sequence to the delta file.
+
+    Args:
+        dao: The database DAO for torrents.
+        delta_file: The file path to store the delta.
+        since: The change sequence of the previous export.
+
+    Returns:
+        The changes written.
+    """
+    changes = await dao.get_changes_since(since)
+    with _atomic_open(delta_file) as f:
+        json.dump(asdict(changes), f, ensure_ascii=False, separators=(",", ":"))
+    return changes
+
+
+def _files_info(files: Sequence[TorrentFileModel] | None) -> list[dict[str, Any]]:
+    """Build files info from torrent files loaded with their media info."""
 
     if not files:
         return []
@@ -51,40 +122,38 @@ async def _fetch_files_info(
 
     for file in files:
         info_data = None
-        if file.radarr_id:
-            info_radarr = await dao.get_radarr_info_by_id(id=file.radarr_id)
-            if info_radarr:
-                info_data = {
-                    "mediaType": info_radarr.mediaType,
-                    "title": info_radarr.title,
-                    "year": info_radarr.year,
-                    "releaseGroup": info_radarr.releaseGroup,
-                    "tmdbId": info_radarr.tmdbId,
-                    "imdbId": info_radarr.imdbId,
-                    "genres": info_radarr.genres,
-                    "quality": info_radarr.quality,
-                    "resolution": info_radarr.resolution,
-                    "languages": info_radarr.languages,
-                }
-        elif file.sonarr_id:
-            info_sonarr = await dao.get_sonarr_info_by_id(id=file.sonarr_id)
-            if info_sonarr:
-                info_data = {
-                    "mediaType": info_sonarr.mediaType,
-                    "serieTitle": info_sonarr.serieTitle,
-                    "year": info_sonarr.year,
-                    "seasonNumber": info_sonarr.seasonNumber,
-                    "episodeTitle": info_sonarr.episodeTitle,
-                    "episodeNumber": info_sonarr.episodeNumber,
-                    "releaseGroup": info_sonarr.releaseGroup,
-                    "tvdbId": info_sonarr.tvdbId,
-                    "imdbId": info_sonarr.imdbId,
-                    "tvMazeId": info_sonarr.tvMazeId,
-                    "genres": info_sonarr.genres,
-                    "quality": info_sonarr.quality,
-                    "resolution": info_sonarr.resolution,
-                    "languages": info_sonarr.languages,
-                }
+        info_radarr = file.radarr_info
+        info_sonarr = file.sonarr_info
+        if info_radarr:
+            info_data = {
+                "mediaType": info_radarr.mediaType,
+                "title": info_radarr.title,
+                "year": info_radarr.year,
+                "releaseGroup": info_radarr.releaseGroup,
+                "tmdbId": info_radarr.tmdbId,
+                "imdbId": info_radarr.imdbId,
+                "genres": info_radarr.genres,
+                "quality": info_radarr.quality,
+                "resolution": info_radarr.resolution,
+                "languages": info_radarr.languages,
+            }
+        elif info_sonarr:
+            info_data = {
+                "mediaType": info_sonarr.mediaType,
+                "serieTitle": info_sonarr.serieTitle,
+                "year": info_sonarr.year,
+                "seasonNumber": info_sonarr.seasonNumber,
+                "episodeTitle": info_sonarr.episodeTitle,
+                "episodeNumber": info_sonarr.episodeNumber,
+                "releaseGroup": info_sonarr.releaseGroup,
+                "tvdbId": info_sonarr.tvdbId,
+                "imdbId": info_sonarr.imdbId,
+                "tvMazeId": info_sonarr.tvMazeId,
+                "genres": info_sonarr.genres,
+                "quality": info_sonarr.quality,
+                "resolution": info_sonarr.resolution,
+                "languages": info_sonarr.languages,
+            }
 
         file_data = {
             "path": file.path,
@@ -97,41 +166,15 @@ async def _fetch_files_info(
     return data
 
 
-async def _get_all_torrents_from_db(dao: MediaDAO) -> list[dict[str, Any]] | None:
-    """Get all torrents from database.
-
-    Args:
-        dao: The database DAO for torrents.
-
-    Returns:
-        A list of dictionaries representing the torrents.
-    """
-    limit = 1000
-    offset = 0
-    all_torrents = []
-
-    while True:
-        torrents = await dao.get_all_torrents(limit=limit, offset=offset)
-        for item in torrents:
-            files = await dao.get_files_from_torrent_id(torrent_id=item.id)
-            files_data = await _fetch_files_info(dao, files)
-            data = {
-                "torrent": item.filename,
-                "id": item.id,
-                "hash": item.hash,
-                "added": item.added,
-                "files": files_data,
-            }
-            all_torrents.append(data)
-        if len(all_torrents) < (offset + limit):
-            break
-        else:
-            offset += limit
-    if all_torrents:
-        logger.info(f"Torrents found in database: {len(all_torrents)}")
-        return all_torrents
-    else:
-        return None
+def _torrent_info(torrent: TorrentModel) -> dict[str, Any]:
+    """Build torrent info from a torrent loaded with its files and media info."""
+    return {
+        "torrent": torrent.filename,
+        "id": torrent.id,
+        "hash": torrent.hash,
+        "added": torrent.added,
+        "files": _files_info(torrent.files),
+    }
 
 
 async def process_jsonfile(dao: MediaDAO) -> None:
@@ -145,45 +188,114 @@ async def process_jsonfile(dao: MediaDAO) -> None:
     else:
         all_torrents_file = settings.all_torrents_file
 
+    delta_file = os.path.splitext(all_torrents_file)[0] + ".delta.json"
+
     try:
-        data: list[dict[str, Any]] | None = await _get_all_torrents_from_db(dao)
-        if not data:
+        seq = await dao.get_change_seq()
+        last_seq = await dao.get_state(EXPORT_SEQ_STATE)
+        if (
+            last_seq is not None
+            and int(last_seq) == seq
+            and os.path.exists(all_torrents_file)
+        ):
+            logger.info("No torrent changes since last export skip json update.")
+            return
+        count = await _list_torrents_to_json(dao, all_torrents_file=all_torrents_file)
+        if not count:
             logger.error("No torrents found in database skip json update.")
             return
-        await _list_torrents_to_json(
-            data=data,
-            all_torrents_file=all_torrents_file,
+        logger.info(f"Torrents found in database: {count}")
+        logger.info(f"All torrents file updated: {all_torrents_file}")
+        changes = await _write_delta_json(dao, delta_file, int(last_seq or 0))
+        logger.info(
+            (
+                f"Torrents delta file updated: {len(changes.added)} added,"
+                f" {len(changes.updated)} updated, {len(changes.removed)} removed"
+            ),
         )
+        await dao.set_state(EXPORT_SEQ_STATE, str(max(seq, changes.seq)))
     except Exception as e:
         logger.error(f"An error occurred during JSON file processing: {e!s}")
 
 
+async def prune_torrent_changes(dao: MediaDAO) -> None:
+    """Compact the torrent change journal older than its retention.
+
+    The last media_db_changes_retention changes are kept whole, and none after
+    the last JSON export. Older changes are compacted to the last change of
+    each torrent, the removals are dropped: a reader of the changes after a
+    compacted sequence needs a full resync from 0.
+
+    Args:
+        dao: The database DAO for torrents.
+    """
+    if settings.media_db_changes_retention <= 0:
+        return
+    try:
+        floor = await dao.get_change_seq() - settings.media_db_changes_retention
+        export_seq = int(await dao.get_state(EXPORT_SEQ_STATE) or 0)
+        pruned = await dao.prune_changes(min(floor, export_seq))
+        if pruned:
+            logger.info(f"Torrent changes compacted: {pruned} removed")
+    except Exception as e:
+        logger.error(f"An error occurred during torrent changes pruning: {e!s}")
+
+
 async def process_torrents_data(
     dao: MediaDAO,
     limit: int = 50,
     offset: int = 0,
+    after: Optional[tuple[datetime, str]] = None,
 ) -> List[Dict[str, Any]]:
-    """Get torrents info from database.
+    """Get torrents info from database, newest first.
 
     Args:
         dao: The database DAO for torrents.
         limit: The limit of torrents to fetch.
         offset: The offset of torrents to fetch.
+        after: The (added, id) of the last torrent of the previous page.
     """
     torrents_data: List[Dict[str, Any]] = []
     try:
-        torrents = await dao.get_all_torrents(limit=limit, offset=offset)
-        for item in torrents:
-            files = await dao.get_files_from_torrent_id(torrent_id=item.id)
-            files_data = await _fetch_files_info(dao, files)
-            data = {
-                "torrent": item.filename,
-                "id": item.id,
-                "hash": item.hash,
-                "added": item.added,
-                "files": files_data,
-            }
-            torrents_data.append(data)
+        torrents = await dao.get_torrents_with_media(
+            limit=limit,
+            offset=offset,
+            after=after,
+        )
+        torrents_data = [_torrent_info(item) for item in torrents]
     except Exception as e:
         logger.error(f"An error occurred during torrents info fetching: {e!s}")
     return torrents_data
+
+
+async def process_torrent_changes(
+    dao: MediaDAO,
+    since: int = 0,
+    limit: int = 1000,
+) -> Dict[str, Any]:
+    """Get the torrents changed since a change sequence.
+
+    Args:
+        dao: The database DAO for torrents.
+        since: The change sequence the caller already has.
+        limit: The maximum number of changes to read.
+
+    Returns:
+        The changed torrents info, the removed hashes, the change sequence to
+        continue from, the latest change sequence and the sequence up to which
+        the changes were compacted.
+    """
+    head = await dao.get_change_seq()
+    floor = await dao.get_changes_floor()
+    changes = await dao.get_changes_since(since, limit=limit)
+    torrents = await dao.get_torrents_with_media_by_hash(
+        changes.added + changes.updated,
+    )
+    return {
+        "since": changes.since,
+        "seq": changes.seq,
+        "head": head,
+        "floor": floor,
+        "torrents": [_torrent_info(item) for item in torrents],
+        "removed": changes.removed,
+    }
@@ -1,14 +1,88 @@
 """Process media information and update the database."""
 
-from typing import Any, Dict, List  # noqa: UP035
+import asyncio
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+from typing import Any, Dict, List, Optional  # noqa: UP035
 
 from rd_syncrr.logging import logger
 from rd_syncrr.services.media_db.dao.media_dao import MediaDAO
-from rd_syncrr.settings import settings  # noqa: F401
-from rd_syncrr.tasks.arrinfo_api import ArrInfo
+from rd_syncrr.settings import settings
+from rd_syncrr.tasks.arrinfo_api import ArrInfo, ArrPull
+from rd_syncrr.utils.set_diff import diff_by_key, is_mass_removal
 
 arrinfo = ArrInfo()
 
+# date of the last history read and of the last full pull, per Arr
+ARR_HISTORY_STATE = "{arr}_history_since"
+ARR_FULL_SYNC_STATE = "{arr}_full_sync"
+
+
+async def _get_arr_sync_since(dao: MediaDAO, arr: str) -> Optional[datetime]:
+    """
+    Get the date to read the Arr history from.
+
+    Args:
+        dao (MediaDAO): The media DAO.
+        arr (str): radarr or sonarr.
+
+    Returns:
+        Optional[datetime]: The date, None when a full pull is due.
+    """
+    since = await dao.get_state(ARR_HISTORY_STATE.format(arr=arr))
+    full_sync = await dao.get_state(ARR_FULL_SYNC_STATE.format(arr=arr))
+    if since is None or full_sync is None:
+        return None
+    interval = timedelta(minutes=settings.sched_arr_full_sync_interval)
+    if datetime.now(timezone.utc) - datetime.fromisoformat(full_sync) >= interval:
+        return None
+    return datetime.fromisoformat(since)
+
+
+async def _set_arr_synced(
+    dao: MediaDAO,
+    arr: str,
+    started: datetime,
+    full: bool,
+) -> None:
+    """
+    Save the date an Arr sync started, the next one reads history from there.
+
+    Args:
+        dao (MediaDAO): The media DAO.
+        arr (str): radarr or sonarr.
+        started (datetime): When the sync started.
+        full (bool): Whether the whole catalog was pulled.
+    """
+    await dao.set_state(ARR_HISTORY_STATE.format(arr=arr), started.isoformat())
+    if full:
+        await dao.set_state(ARR_FULL_SYNC_STATE.format(arr=arr), started.isoformat())
+
+
+def _renamed_paths(
+    items: List[Dict[str, Any]],
+    in_db_paths: Dict[int, str],
+    file_id_key: str,
+) -> Dict[int, tuple[str, Optional[str]]]:
+    """
+    Get the Arr files known in database whose path changed.
+
+    Args:
+        items (List[Dict[str, Any]]): The media info pulled from the Arr.
+        in_db_paths (Dict[int, str]): Path by Arr file ID in database.
+        file_id_key (str): Key of the Arr file ID in the media info.
+
+    Returns:
+        Dict[int, tuple[str, Optional[str]]]: The new path and relative path by
+            Arr file ID.
+    """
+    return {
+        item[file_id_key]: (item["path"], item.get("relativePath"))
+        for item in items
+        if item[file_id_key] in in_db_paths
+        and in_db_paths[item[file_id_key]] != item["path"]
+    }
+
 
 async def _add_sonarr_episodes_to_db(
     dao: MediaDAO,
@@ -22,43 +96,117 @@ async def _add_sonarr_episodes_to_db(
         new_episode (List[Dict[str, Any]]): The new episodes to add.
     """
     try:
-        for episode in new_episodes:
-            await dao.create_sonarr_episode_model(episode)
-            logger.info(
+        result = await dao.bulk_create_sonarr_episode_models(new_episodes)
+        for episode, error in result.failed:
+            logger.error(
                 (
-                    f"Episode info added to database: {episode['serieTitle']} Episode"
-                    f" {episode['episodeNumber']} Saison {episode['seasonNumber']}"
+                    f"Episode info not added to database: {episode['serieTitle']}"
+                    f" Episode {episode['episodeNumber']} Saison"
+                    f" {episode['seasonNumber']} - {error}"
                 ),
             )
+        logger.info(f"Episodes info added to database: {result.inserted}")
     except Exception as e:
         logger.error(
             f"An error occurred while adding new episodes to the database: {e!s}",
         )
 
 
-async def _get_sonarr_new_episodes(dao: MediaDAO) -> List[Dict[str, Any]] | None:
+async def _get_sonarr_episodes(since: Optional[datetime]) -> ArrPull:
+    """
+    Get the episodes from Sonarr, only of the series changed since a date.
+
+    Args:
+        since (Optional[datetime]): Date of the last sync, None for all series.
+
+    Returns:
+        ArrPull: The episodes and the ids of the series that failed.
+    """
+    if since is None:
+        return await asyncio.to_thread(arrinfo.get_sonarr_info)
+    series_ids = await asyncio.to_thread(arrinfo.get_sonarr_changed_series, since)
+    logger.info(f"Series changed in Sonarr history: {len(series_ids)}")
+    if not series_ids:
+        return ArrPull([], set(), set())
+    return await asyncio.to_thread(arrinfo.get_sonarr_info, series_ids)
+
+
+async def _remove_deleted_episodes(
+    dao: MediaDAO,
+    removed: frozenset[int],
+    in_db_episodes: frozenset[int],
+    full: bool,
+) -> None:
+    """
+    Remove the episodes info of the files deleted from Sonarr from the database.
+
+    Args:
+        dao (MediaDAO): The media DAO.
+        removed (frozenset[int]): Sonarr file IDs no longer in Sonarr.
+        in_db_episodes (frozenset[int]): Sonarr file IDs in database.
+        full (bool): Whether the whole catalog was pulled, a mass removal is then
+            taken as a partial catalog. A pull of some series only removes the
+            files of these series.
+    """
+    ratio = settings.media_db_max_removed_ratio
+    if full and is_mass_removal(removed, in_db_episodes, ratio):
+        logger.warning(
+            (
+                f"{len(removed)} of {len(in_db_episodes)} episodes files missing in"
+                " Sonarr, skipping removal from database"
+            ),
+        )
+        return
+    result = await dao.delete_sonarr_episodes_by_file_id(removed)
+    logger.info(
+        (
+            f"Episodes info removed from database: {result.deleted}"
+            f" ({result.files} files unlinked, {len(result.failed)} failed)"
+        ),
+    )
+
+
+async def _get_sonarr_new_episodes(
+    dao: MediaDAO,
+    pull: ArrPull,
+) -> List[Dict[str, Any]] | None:
     """
-    Get new episodes from Sonarr.
+    Get new episodes from Sonarr, update the database with the pulled series.
+
+    The files of the pulled series gone from Sonarr are removed from the
+    database and the renamed ones are moved to their new path. The series that
+    failed are left untouched, a whole catalog with failures removes nothing.
+
+    Args:
+        dao (MediaDAO): The media DAO.
+        pull (ArrPull): The episodes pulled from Sonarr.
 
     Returns:
         List[Dict[str, Any]]: The new episodes.
     """
     try:
-        sonarr_episodes = arrinfo.get_sonarr_info()
-        in_db_episodes = await dao.get_sonarr_episodes_file_id()
-        if not in_db_episodes:
-            return sonarr_episodes
-        new_episodes: List[Dict[str, Any]] = []
-        for episode in sonarr_episodes:
-            if episode["episodefileId"] not in in_db_episodes:
-                new_episodes.append(episode)
-        if not new_episodes:
+        scope = None if pull.ids is None else pull.ids - pull.failed
+        in_db_paths = await dao.get_sonarr_episodes_file_paths(scope)
+        in_db_episodes = frozenset(in_db_paths)
+        diff = diff_by_key(pull.items, in_db_episodes, itemgetter("episodefileId"))
+        if diff.removed and (scope is not None or not pull.failed):
+            await _remove_deleted_episodes(
+                dao,
+                diff.removed,
+                in_db_episodes,
+                full=scope is None,
+            )
+        renamed = _renamed_paths(pull.items, in_db_paths, "episodefileId")
+        if renamed:
+            updated = await dao.update_sonarr_episodes_paths(renamed)
+            logger.info(f"Episodes info of renamed files updated: {updated}")
+        if not diff.added:
             logger.debug("No new episodes found.")
             return None
     except Exception as e:
         logger.error(f"An error occurred while getting new episodes: {e!s}")
         return None
-    return new_episodes
+    return diff.added
 
 
 async def _add_radarr_movies_to_db(
@@ -73,55 +221,178 @@ async def _add_radarr_movies_to_db(
         new_movies (List[Dict[str, Any]]): The new movies to add.
     """
     try:
-        for movie in new_movies:
-            await dao.create_radarr_movie_model(movie)
-            logger.info(f"Movie info added to database: {movie['title']}")
+        result = await dao.bulk_create_radarr_movie_models(new_movies)
+        for movie, error in result.failed:
+            logger.error(
+                f"Movie info not added to database: {movie['title']} - {error}"
+            )
+        logger.info(f"Movies info added to database: {result.inserted}")
     except Exception as e:
         logger.error(
             f"An error occurred while adding new movies to the database: {e!s}",
         )
 
 
-async def _get_radarr_new_movies(dao: MediaDAO) -> List[Dict[str, Any]] | None:
+async def _get_radarr_movies(since: Optional[datetime]) -> ArrPull:
+    """
+    Get the movies from Radarr, only the ones changed since a date.
+
+    Args:
+        since (Optional[datetime]): Date of the last sync, None for all movies.
+
+    Returns:
+        ArrPull: The movies and the ids of the movies that failed.
+    """
+    if since is None:
+        return await asyncio.to_thread(arrinfo.get_radarr_info)
+    movie_ids = await asyncio.to_thread(arrinfo.get_radarr_changed_movies, since)
+    logger.info(f"Movies changed in Radarr history: {len(movie_ids)}")
+    if not movie_ids:
+        return ArrPull([], set(), set())
+    return await asyncio.to_thread(arrinfo.get_radarr_info, movie_ids)
+
+
+async def _remove_deleted_movies(
+    dao: MediaDAO,
+    removed: frozenset[int],
+    in_db_movies: frozenset[int],
+    full: bool,
+) -> None:
+    """
+    Remove the movies info of the files deleted from Radarr from the database.
+
+    Args:
+        dao (MediaDAO): The media DAO.
+        removed (frozenset[int]): Radarr file IDs no longer in Radarr.
+        in_db_movies (frozenset[int]): Radarr file IDs in database.
+        full (bool): Whether the whole catalog was pulled, a mass removal is then
+            taken as a partial catalog. A pull of some movies only removes the
+            files of these movies.
+    """
+    ratio = settings.media_db_max_removed_ratio
+    if full and is_mass_removal(removed, in_db_movies, ratio):
+        logger.warning(
+            (
+                f"{len(removed)} of {len(in_db_movies)} movies files missing in"
+                " Radarr, skipping removal from database"
+            ),
+        )
+        return
+    result = await dao.delete_radarr_movies_by_file_id(removed)
+    logger.info(
+        (
+            f"Movies info removed from database: {result.deleted}"
+            f" ({result.files} files unlinked, {len(result.failed)} failed)"
+        ),
+    )
+
+
+async def _get_radarr_new_movies(
+    dao: MediaDAO,
+    pull: ArrPull,
+) -> List[Dict[str, Any]] | None:
     """
-    Get new movies from Radarr.
+    Get new movies from Radarr, update the database with the pulled movies.
+
+    The files of the pulled movies gone from Radarr are removed from the
+    database and the renamed ones are moved to their new path. The movies that
+    failed are left untouched, a whole catalog with failures removes nothing.
+
+    Args:
+        dao (MediaDAO): The media DAO.
+        pull (ArrPull): The movies pulled from Radarr.
 
     Returns:
         List[Dict[str, Any]]: The new movies.
     """
     try:
-        radarr_movies = arrinfo.get_radarr_info()
-        in_db_movies = await dao.get_radarr_movies_file_id()
-        if not in_db_movies:
-            return radarr_movies
-        new_movies: List[Dict[str, Any]] = []
-        for movie in radarr_movies:
-            if movie["fileId"] not in in_db_movies:
-                new_movies.append(movie)
-        if not new_movies:
+        scope = None if pull.ids is None else pull.ids - pull.failed
+        in_db_paths = await dao.get_radarr_movies_file_paths(scope)
+        in_db_movies = frozenset(in_db_paths)
+        diff = diff_by_key(pull.items, in_db_movies, itemgetter("fileId"))
+        if diff.removed and (scope is not None or not pull.failed):
+            await _remove_deleted_movies(
+                dao,
+                diff.removed,
+                in_db_movies,
+                full=scope is None,
+            )
+        renamed = _renamed_paths(pull.items, in_db_paths, "fileId")
+        if renamed:
+            updated = await dao.update_radarr_movies_paths(renamed)
+            logger.info(f"Movies info of renamed files updated: {updated}")
+        if not diff.added:
             logger.debug("No new movies found.")
             return None
     except Exception as e:
         logger.error(f"An error occurred while getting new movies: {e!s}")
         return None
-    return new_movies
+    return diff.added
+
+
+async def _process_sonarr(dao: MediaDAO) -> None:
+    """Add the new Sonarr episodes to the database."""
+    started = datetime.now(timezone.utc)
+    since = await _get_arr_sync_since(dao, "sonarr")
+    if since is None:
+        logger.info("Pulling all series from Sonarr...")
+    try:
+        pull = await _get_sonarr_episodes(since)
+    except Exception as e:
+        logger.error(f"An error occurred while reading Sonarr history: {e!s}")
+        return
+    sonarr_episodes, failed = pull.items, pull.failed
+    # the episodes of the failed series are missing, they are not removed
+    new_episode = await _get_sonarr_new_episodes(dao, pull)
+    if new_episode:
+        await _add_sonarr_episodes_to_db(dao, new_episode)
+    else:
+        logger.info("No new episodes found in Sonarr skiping the update")
+    if failed:
+        # the changes of the failed series are read again next run
+        logger.warning(f"{len(failed)} series could not be fetched from Sonarr")
+    # an empty full pull is most likely Sonarr being down, try again next run
+    elif since is not None or sonarr_episodes:
+        await _set_arr_synced(dao, "sonarr", started, full=since is None)
+
+
+async def _process_radarr(dao: MediaDAO) -> None:
+    """Add the new Radarr movies to the database."""
+    started = datetime.now(timezone.utc)
+    since = await _get_arr_sync_since(dao, "radarr")
+    if since is None:
+        logger.info("Pulling all movies from Radarr...")
+    try:
+        pull = await _get_radarr_movies(since)
+    except Exception as e:
+        logger.error(f"An error occurred while reading Radarr history: {e!s}")
+        return
+    radarr_movies, failed = pull.items, pull.failed
+    new_movies = await _get_radarr_new_movies(dao, pull)
+    if new_movies:
+        await _add_radarr_movies_to_db(dao, new_movies)
+    else:
+        logger.info("No new movies found in Radarr skiping the update")
+    if failed:
+        # the changes of the failed movies are read again next run
+        logger.warning(f"{len(failed)} movies could not be fetched from Radarr")
+    # an empty full pull is most likely Radarr being down, try again next run
+    elif since is not None or radarr_movies:
+        await _set_arr_synced(dao, "radarr", started, full=since is None)
 
 
 async def process_mediainfo(dao: MediaDAO) -> None:
-    """Process media information and update the database."""
+    """Process media information and update the database.
+
+    The whole Radarr/Sonarr catalogs are pulled every
+    sched_arr_full_sync_interval minutes, in between only the movies and
+    series with imports, deletes or renames in the Arr history are fetched.
+    """
 
     try:
         logger.info("Updating media info...")
-        new_episode = await _get_sonarr_new_episodes(dao)
-        if new_episode:
-            await _add_sonarr_episodes_to_db(dao, new_episode)
-        else:
-            logger.info("No new episodes found in Sonarr skiping the update")
-        new_movies = await _get_radarr_new_movies(dao)
-        if new_movies:
-            await _add_radarr_movies_to_db(dao, new_movies)
-        else:
-            logger.info("No new movies found in Radarr skiping the update")
+        await _process_sonarr(dao)
+        await _process_radarr(dao)
         logger.info("Media info updated.")
     except Exception as e:
         logger.error(
@@ -1,128 +1,299 @@
 """Symlink process task module."""
 
+import asyncio
 import os
-from typing import Any
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
 
 from rd_syncrr.logging import logger
 from rd_syncrr.services.media_db.dao.media_dao import MediaDAO
 from rd_syncrr.settings import settings
+from rd_syncrr.utils.link_scanner import (
+    DirectoryIndex,
+    DirectoryState,
+    SymlinkInfo,
+    read_symlink,
+    scan_symlinks,
+)
+from rd_syncrr.utils.link_watcher import LinkChanges, LinkWatcher
+from rd_syncrr.utils.torrent_paths import target_path_candidates
 
+# date of the last full scan of the symlink library
+SYMLINK_FULL_SCAN_STATE = "symlink_full_scan"
 
-async def _scan_link_directory(path: str) -> list[dict[str, str]] | None:
+# the scan and the watcher do not write symlinks at the same time
+_symlink_lock: Optional[asyncio.Lock] = None
+
+
+def _get_symlink_lock() -> asyncio.Lock:
     """
-    Scan the given directory for symbolic links.
+    Get the lock of the symlinks writers, created in the running event loop.
+
+    Returns:
+        asyncio.Lock: The symlinks lock.
+    """
+    global _symlink_lock
+    if _symlink_lock is None:
+        _symlink_lock = asyncio.Lock()
+    return _symlink_lock
+
+
+async def _load_directory_index(dao: MediaDAO) -> DirectoryIndex:
+    """
+    Load the directories of the previous scan.
+
+    Every directory is listed again when the last full scan is older than
+    sched_symlink_full_scan_interval.
 
     Args:
-        path (str): The directory to scan.
+        dao (MediaDAO): The data access object.
 
     Returns:
-        list[dict[str, Any]] | None: A list of symbolic links information
-        or None if no symbolic links found.
+        DirectoryIndex: The directory index.
     """
-    symlink_info_list = []
-    for root, _, files in os.walk(path):
-        for file in files:
-            if os.path.islink(os.path.join(root, file)):
-                symlink_info = await _get_symlink_info(os.path.join(root, file))
-                if symlink_info is not None:
-                    symlink_info_list.append(symlink_info)
-    if not symlink_info_list:
-        logger.info("No symbolic links found in your library.")
-        return None
-    logger.debug(f"Symlink list: {symlink_info_list}")
-    return symlink_info_list
+    last_full_scan = await dao.get_state(SYMLINK_FULL_SCAN_STATE)
+    interval = timedelta(minutes=settings.sched_symlink_full_scan_interval)
+    full = (
+        last_full_scan is None
+        or datetime.now(timezone.utc) - datetime.fromisoformat(last_full_scan)
+        >= interval
+    )
+    entries = {
+        directory.path: DirectoryState(
+            mtime_ns=directory.mtime_ns,
+            inode=directory.inode,
+            subdirs=tuple(directory.subdirs),
+        )
+        for directory in await dao.get_symlink_directories()
+    }
+    return DirectoryIndex(entries, full=full)
 
 
-async def _get_symlink_info(link_path: str) -> dict[str, Any] | None:
+async def _save_directory_index(
+    dao: MediaDAO,
+    index: DirectoryIndex,
+    started: datetime,
+) -> None:
     """
-    Get the information of a symbolic link.
+    Save the directories listed by the scan.
 
     Args:
-        link_path (str): The path of the symbolic link.
+        dao (MediaDAO): The data access object.
+        index (DirectoryIndex): The directory index updated by the scan.
+        started (datetime): When the scan started.
+    """
+    await dao.save_symlink_directories(
+        ({"path": path, **asdict(state)} for path, state in index.updates.items()),
+        index.removed,
+    )
+    if index.full:
+        await dao.set_state(SYMLINK_FULL_SCAN_STATE, started.isoformat())
+    logger.info(
+        (
+            f"Symlink directories listed: {len(index.updates)},"
+            f" unchanged: {index.unchanged}, removed: {len(index.removed)}"
+        ),
+    )
+
+
+async def _pick_torrent_file(target: str, files: list[tuple[str, int]]) -> str:
+    """
+    Pick the torrent file of a target among files sharing its path.
+
+    Args:
+        target (str): The symbolic link target.
+        files (list[tuple[str, int]]): The ID and size of the torrent files.
 
     Returns:
-        dict[str, Any] | None: The information of the symbolic link
-          or None if an error occurred.
+        str: The ID of the torrent file with the size of the target, or of the
+            first one when the size cannot be told.
     """
-    try:
-        target = os.readlink(link_path)
-        target_path = os.path.abspath(os.path.join(os.path.dirname(link_path), target))
-        return {
-            "target": target_path,
-            "target_filename": os.path.basename(target_path),
-            "destination": link_path,
-            "destination_filename": os.path.basename(link_path),
-        }
-    except OSError as e:
-        logger.error(f"Error reading symlink: {link_path} - {e!s}")
-        return None
+    if len(files) > 1:
+        try:
+            size = (await asyncio.to_thread(os.stat, target)).st_size
+        except OSError:
+            return files[0][0]
+        for file_id, file_size in files:
+            if file_size == size:
+                return file_id
+    return files[0][0]
 
 
-async def _update_symlink_db(
+async def _match_torrent_files(
     dao: MediaDAO,
-    symlink_info_list: list[dict[str, str]],
-) -> None:
+    symlink_info_list: list[SymlinkInfo],
+) -> list[tuple[SymlinkInfo, str]]:
     """
-    Update the symbolic links in the database.
+    Match symbolic links with the torrent files they point to.
+
+    A target is matched on its full path under the Real-Debrid mount, the
+    longest trailing part of the target found in the torrent files path index
+    wins. Symbolic links without a torrent file are skipped.
 
     Args:
         dao (MediaDAO): The data access object.
-        symlink_info_list (list[dict[str, Any]]): The list of symbolic links information.
+        symlink_info_list (list[SymlinkInfo]): The symbolic links information.
+
+    Returns:
+        list[tuple[SymlinkInfo, str]]: The symbolic links with the ID of their
+            torrent file.
     """
-    torrent_files_dict = await dao.get_torrent_files_filename_dict()
-    if not torrent_files_dict:
-        logger.info(
-            "No torrent files found in your database. Skipping the symlink update.",
-        )
-        return
-    for symlink_info in symlink_info_list:
-        if symlink_info["target_filename"] not in torrent_files_dict:
+    candidates = [
+        target_path_candidates(symlink_info["target"])
+        for symlink_info in symlink_info_list
+    ]
+    files = await dao.get_torrent_files_by_path(
+        path for paths in candidates for path in paths
+    )
+    matches: list[tuple[SymlinkInfo, str]] = []
+    for symlink_info, paths in zip(symlink_info_list, candidates):
+        path = next((path for path in paths if path in files), None)
+        if path is None:
             logger.info(
                 (
-                    f"File {symlink_info['target_filename']} not found in Torrent Files"
+                    f"File {symlink_info['target']} not found in Torrent Files"
                     " Data. Skipping the symlink update."
                 ),
             )
             continue
-        try:
-            file_id: str = torrent_files_dict[symlink_info["target_filename"]]
-            await dao.create_symlink_model(symlink_info, file_id=file_id)
-            logger.info(
+        file_id = await _pick_torrent_file(symlink_info["target"], files[path])
+        matches.append((symlink_info, file_id))
+    return matches
+
+
+async def _update_symlink_db(
+    dao: MediaDAO,
+    symlink_info_list: list[SymlinkInfo],
+) -> tuple[int, list[SymlinkInfo]]:
+    """
+    Update the symbolic links in the database.
+
+    Args:
+        dao (MediaDAO): The data access object.
+        symlink_info_list (list[dict[str, Any]]): The list of symbolic links information.
+
+    Returns:
+        tuple[int, list[SymlinkInfo]]: The number of symbolic links added and
+            the symbolic links not added, unmatched or failed.
+    """
+    new_symlinks: list[tuple[dict[str, Any], Optional[str]]] = list(
+        await _match_torrent_files(dao, symlink_info_list),
+    )
+    try:
+        result = await dao.bulk_create_symlink_models(new_symlinks)
+        for (symlink_info, _), error in result.failed:
+            logger.error(
                 (
-                    f"Added symlink: {symlink_info['target']} ->"
-                    f" {symlink_info['destination']} map with rd_file_id  : {file_id}"
+                    f"Symlink not added: {symlink_info['target']} ->"
+                    f" {symlink_info['destination']} - {error}"
                 ),
             )
-        except Exception as e:
-            logger.error(f"An error occurred while creating symlink model: {e!s}")
+        logger.debug(f"Added {result.inserted} symlinks mapped with their rd_file.")
+    except Exception as e:
+        logger.error(f"An error occurred while creating symlink models: {e!s}")
+        return 0, symlink_info_list
+    added = {symlink_info["destination"] for symlink_info, _ in new_symlinks}
+    added -= {symlink_info["destination"] for (symlink_info, _), _ in result.failed}
+    missed = [
+        symlink_info
+        for symlink_info in symlink_info_list
+        if symlink_info["destination"] not in added
+    ]
+    return result.inserted, missed
 
 
-async def process_symlink(dao: MediaDAO) -> None:
+async def _get_new_symlinks(
+    dao: MediaDAO,
+    symlink_info_list: list[SymlinkInfo],
+) -> tuple[list[SymlinkInfo], list[SymlinkInfo]]:
     """
-    Process the symbolic links.
+    Get the scanned symbolic links missing from the database.
+
+    The links are looked up by their full destination path. A link in the
+    database with another target is deleted, to be added again.
+
+    Args:
+        dao (MediaDAO): The data access object.
+        symlink_info_list (list[SymlinkInfo]): The scanned symbolic links.
+
+    Returns:
+        tuple[list[SymlinkInfo], list[SymlinkInfo]]: The symbolic links to add
+            and the ones whose old link could not be deleted.
+    """
+    known = await dao.get_symlink_targets_by_destination(
+        symlink_info["destination"] for symlink_info in symlink_info_list
+    )
+    new_symlinks = [
+        symlink_info
+        for symlink_info in symlink_info_list
+        if known.get(symlink_info["destination"]) != symlink_info["target"]
+    ]
+    retargeted = [
+        symlink_info["destination"]
+        for symlink_info in new_symlinks
+        if symlink_info["destination"] in known
+    ]
+    if not retargeted:
+        return new_symlinks, []
+    result = await dao.delete_symlinks_by_destination(retargeted)
+    failed = {path for path, _ in result.failed}
+    for path, error in result.failed:
+        logger.error(f"Symlink could not be removed from database: {path} - {error}")
+    return (
+        [link for link in new_symlinks if link["destination"] not in failed],
+        [link for link in new_symlinks if link["destination"] in failed],
+    )
+
+
+async def _scan_symlink_library(dao: MediaDAO) -> None:
+    """
+    Scan the library for new symbolic links.
+
+    The library is scanned in parallel and the symbolic links are written to
+    the database batch by batch, as they are found. Only the directories
+    changed since the previous scan are listed, except for the periodic full
+    scan.
     """
-    symlink_info_list = await _scan_link_directory(settings.symlink_path)
-    if not symlink_info_list:
-        return
     try:
         logger.info("Start symbolic links database Update.")
-        old_symlinks = await dao.get_symlink_destination_filename_dict()
-        if old_symlinks:
-            symlink_info_list = [
-                symlink_info
-                for symlink_info in symlink_info_list
-                if symlink_info["destination_filename"] not in old_symlinks
-            ]
-            if not symlink_info_list:
-                logger.info("All symbolic links are already in the database.")
-                return
-        await _update_symlink_db(dao, symlink_info_list)
-        logger.info(
-            (
-                f"Successfully processed {len(symlink_info_list)} new symbolic"
-                " links from your library."
-            ),
-        )
+        started = datetime.now(timezone.utc)
+        if not await dao.index_torrent_file_paths():
+            logger.info(
+                "No torrent files found in your database. Skipping the symlink update.",
+            )
+            return
+        index = await _load_directory_index(dao)
+        if index.full:
+            logger.info("Full scan of the symlink library.")
+        found = new = added = 0
+        # directories of the symlinks not added, listed again next scan
+        retry_dirs: set[str] = set()
+        async for symlink_info_list in scan_symlinks(
+            settings.symlink_path,
+            index=index,
+        ):
+            found += len(symlink_info_list)
+            symlink_info_list, missed = await _get_new_symlinks(dao, symlink_info_list)
+            if symlink_info_list:
+                new += len(symlink_info_list)
+                inserted, not_added = await _update_symlink_db(dao, symlink_info_list)
+                added += inserted
+                missed += not_added
+            retry_dirs.update(os.path.dirname(link["destination"]) for link in missed)
+        index.forget(retry_dirs)
+        await _save_directory_index(dao, index, started)
+        if not found:
+            logger.info("No new symbolic links found in your library.")
+        elif not new:
+            logger.info("All symbolic links are already in the database.")
+        else:
+            logger.info(
+                (
+                    f"Successfully processed {new} new symbolic links from your"
+                    f" library, {added} mapped with their rd_file."
+                ),
+            )
         logger.info("End symbolic links database Update.")
     except Exception as e:
         logger.error(
@@ -130,6 +301,86 @@ async def process_symlink(dao: MediaDAO) -> None:
         )
 
 
-# if __name__ == "__main__":
-#     directory_to_scan = "/path/to/your/directory"
-#     asyncio.run(main(directory_to_scan))
+async def process_symlink(dao: MediaDAO) -> None:
+    """
+    Process the symbolic links.
+
+    This function is called by the scheduler, and by the watcher when events
+    were lost.
+
+    Args:
+        dao (MediaDAO): The data access object.
+    """
+    async with _get_symlink_lock():
+        await _scan_symlink_library(dao)
+
+
+async def _apply_link_changes(dao: MediaDAO, changes: LinkChanges) -> None:
+    """
+    Write the symbolic links changed in the library to the database.
+
+    Symbolic links removed, or pointing to a new target, are deleted. New ones
+    are added through create_symlink_model, linked to their torrent file.
+
+    Args:
+        dao (MediaDAO): The data access object.
+        changes (LinkChanges): The changes reported by the watcher.
+    """
+    symlinks: dict[str, SymlinkInfo] = {}
+    for path in changes.created:
+        if os.path.islink(path) and not os.path.isdir(path):
+            symlink_info = read_symlink(path)
+            if symlink_info is not None:
+                symlinks[path] = symlink_info
+    targets = await dao.get_symlink_targets_by_destination(symlinks)
+    for path, target in targets.items():
+        if symlinks[path]["target"] == target:
+            del symlinks[path]
+    result = await dao.delete_symlinks_by_destination(
+        [*changes.removed, *(path for path in symlinks if path in targets)],
+        changes.removed_dirs,
+    )
+    for path, error in result.failed:
+        logger.error(f"Symlink could not be removed from database: {path} - {error}")
+    if result.deleted:
+        logger.info(f"Symlinks removed from database: {result.deleted}")
+    if not symlinks:
+        return
+    await dao.index_torrent_file_paths()
+    for symlink_info, file_id in await _match_torrent_files(
+        dao,
+        list(symlinks.values()),
+    ):
+        await dao.create_symlink_model(dict(symlink_info), file_id)
+        logger.info(f"Symlink added to database: {symlink_info['destination']}")
+
+
+async def watch_symlink() -> None:
+    """
+    Keep the symbolic links of the database in sync with the library.
+
+    The library is watched with inotify and the changes are written every
+    symlink_watch_delay seconds, so new links show up in seconds instead of at
+    the next scan. When events were lost the library is scanned instead.
+    Each batch of changes is written with its own DAO session. Runs until
+    cancelled.
+    """
+    watcher = LinkWatcher(settings.symlink_path, settings.symlink_watch_max_pending)
+    try:
+        await watcher.start()
+    except OSError as e:
+        logger.error(f"Symlink watcher not started: {e!s}")
+        return
+    try:
+        async for changes in watcher.changes(settings.symlink_watch_delay):
+            try:
+                async with await MediaDAO.create() as dao:
+                    if changes.overflow:
+                        await process_symlink(dao)
+                        continue
+                    async with _get_symlink_lock():
+                        await _apply_link_changes(dao, changes)
+            except Exception as e:
+                logger.error(f"An error occurred while watching symlinks: {e!s}")
+    finally:
+        watcher.close()
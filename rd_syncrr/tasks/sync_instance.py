@@ -5,12 +5,25 @@ import os
 from typing import Any
 
 from rd_syncrr.logging import logger
-from rd_syncrr.utils.rdapi import RD
+from rd_syncrr.services.media_db.dao.media_dao import MediaDAO
+from rd_syncrr.settings import settings
+from rd_syncrr.tasks.torrents_process import (
+    get_not_downloaded_hashes,
+    save_not_downloaded_hashes,
+)
+from rd_syncrr.utils.rdapi import AsyncRD, RDAPIError
 from rd_syncrr.utils.syncrrapi import RDSyncrrApi
 
-rd_client = RD()
+rd_client = AsyncRD()
 syncrr_api = RDSyncrrApi()
 
+# change sequence of the other instance already synced, per instance host
+SYNC_WATERMARK_STATE = "sync_watermark:{host}"
+# RD error codes about the account or RD itself rather than the torrent added
+ACCOUNT_ERROR_CODES = frozenset(
+    (-1, 5, 8, 9, 10, 11, 12, 13, 14, 15, 21, 22, 23, 25, 34, 36),
+)
+
 
 def _get_all_synced_torrents() -> list[dict[str, Any]]:
     """Get all synced torrents from other instance."""
@@ -22,14 +35,29 @@ def _get_all_synced_torrents() -> list[dict[str, Any]]:
     return synced_torrents
 
 
-def _get_latest_synced_torrents() -> list[dict[str, Any]]:
-    """Get latest synced torrents from other instance."""
+def _get_synced_changes(since: int) -> dict[str, Any]:
+    """Get the torrents changed since a change sequence from other instance."""
     try:
-        synced_torrents = syncrr_api.torrents.latest().json()
+        changes = syncrr_api.torrents.changes(since=since).json()
     except Exception as e:
-        logger.error(f"An error occurred while getting latest synced torrents: {e!s}")
+        logger.error(f"An error occurred while getting synced changes: {e!s}")
         raise
-    return synced_torrents
+    return changes
+
+
+def _is_refused_torrent(error: Exception) -> bool:
+    """Check whether RD refused a torrent itself, such as an infringing one.
+
+    Adding such torrent again fails the same way, an unavailable RD, an open
+    circuit or an account error does not tell anything about the torrent.
+    """
+    return (
+        isinstance(error, RDAPIError)
+        and error.status_code is not None
+        and 400 <= error.status_code < 500
+        and error.status_code not in (401, 429)
+        and error.error_code not in ACCOUNT_ERROR_CODES
+    )
 
 
 def _get_all_local_torrents(
@@ -81,15 +109,16 @@ async def sync_all_torrents() -> None:
         None
     """
     local_torrents = _get_all_local_torrents()
-    synced_torrents = _get_all_synced_torrents()
+    synced_torrents = await asyncio.to_thread(_get_all_synced_torrents)
     wanted_torrents = _list_wanted_torrents(synced_torrents, local_torrents)
     if wanted_torrents is None:
         logger.info("No torrents to sync")
     else:
         for torrent in wanted_torrents:
             try:
-                magnet = rd_client.torrents.add_magnet(magnet=torrent["hash"]).json()
-                rd_client.torrents.select_files(id=magnet["id"], files="all")
+                response = await rd_client.torrents.add_magnet(magnet=torrent["hash"])
+                magnet = response.data
+                await rd_client.torrents.select_files(id=magnet["id"], files="all")
                 logger.info(f"Torrent {torrent['name']} added")
                 await asyncio.sleep(1)
             except Exception as e:
@@ -101,37 +130,86 @@ async def sync_all_torrents() -> None:
         logger.info("All torrents successfully synced")
 
 
-async def sync_latest_torrents() -> None:
-    """
-    Download the latest torrents and sync them with the local torrents.
-
-    This function retrieves the latest torrents from the remote server and compares
-      them with the local torrents.
-    It selects the wanted torrents that are not already synced and adds them to the RD account.
-    After syncing the torrents, it updates the list of torrents in a JSON file.
+async def _add_synced_torrents(
+    torrents: list[dict[str, Any]],
+    local_hashes: set[str],
+) -> set[str]:
+    """Add the synced torrents missing from the RD account.
 
-    Raises:
-        Exception: If an error occurs while syncing the torrents.
+    Args:
+        torrents: The torrents of a changes page.
+        local_hashes: The hashes of the torrents on the account, updated.
 
     Returns:
-        None
+        The hashes of the torrents added.
+
+    Raises:
+        Exception: If a torrent could not be added for another reason than RD
+            refusing it.
     """
-    local_torrents = _get_all_local_torrents()
-    synced_torrents = _get_latest_synced_torrents()
-    wanted_torrents = _list_wanted_torrents(synced_torrents, local_torrents)
-    if wanted_torrents is None:
-        logger.info("No torrents to sync")
-    else:
-        for torrent in wanted_torrents:
-            try:
-                magnet = rd_client.torrents.add_magnet(magnet=torrent["hash"]).json()
-                rd_client.torrents.select_files(id=magnet["id"], files="all")
-                logger.info(f"Torrent {torrent['name']} added")
-                await asyncio.sleep(1)
-            except Exception as e:
+    added: set[str] = set()
+    for torrent in torrents:
+        if torrent["hash"] in local_hashes:
+            continue
+        try:
+            response = await rd_client.torrents.add_magnet(magnet=torrent["hash"])
+            magnet = response.data
+            await rd_client.torrents.select_files(id=magnet["id"], files="all")
+        except Exception as e:
+            if not _is_refused_torrent(e):
                 logger.error(f"An error occurred while syncing torrents: {e!s}")
                 raise
+            logger.warning(f"Torrent {torrent['torrent']} refused by RD: {e!s}")
+            continue
+        local_hashes.add(torrent["hash"])
+        added.add(torrent["hash"])
+        logger.info(f"Torrent {torrent['torrent']} added")
+    return added
 
-        await asyncio.sleep(2)
-        # await process_torrents()
-        logger.info("Latest torrents successfully synced")
+
+async def sync_latest_torrents(dao: MediaDAO) -> None:
+    """
+    Download the torrents changed since the last sync and add the missing ones.
+
+    The other instance is asked only for the torrents changed after the change
+    sequence synced last time, page by page. The sequence is saved after each
+    page, so an interrupted sync resumes where it stopped. A torrent refused by
+    RD is skipped, any other error stops the sync before the page is saved.
+    Torrents already on the account, downloaded or not, are not added again.
+
+    Args:
+        dao: The database DAO for torrents.
+
+    Raises:
+        Exception: If an error occurs while syncing the torrents.
+    """
+    watermark_key = SYNC_WATERMARK_STATE.format(host=settings.syncrr_host)
+    since = int(await dao.get_state(watermark_key) or 0)
+    local_hashes: set[str] | None = None
+    added = 0
+    while True:
+        changes = await asyncio.to_thread(_get_synced_changes, since)
+        if changes["head"] < since:
+            logger.warning("Synced instance changes were reset, sync from start")
+            since = 0
+            continue
+        if 0 < since < changes.get("floor", 0):
+            logger.warning("Synced instance compacted its changes, sync from start")
+            since = 0
+            continue
+        if changes["torrents"] and local_hashes is None:
+            local_hashes = set(await dao.get_all_torrents_hashes())
+            local_hashes |= await get_not_downloaded_hashes(dao)
+        if local_hashes is not None:
+            page_added = await _add_synced_torrents(changes["torrents"], local_hashes)
+            if page_added:
+                # not in database until downloaded, kept for the next syncs
+                not_downloaded = await get_not_downloaded_hashes(dao)
+                await save_not_downloaded_hashes(dao, not_downloaded | page_added)
+                added += len(page_added)
+        since = changes["seq"]
+        await dao.set_state(watermark_key, str(since))
+        if since >= changes["head"]:
+            break
+
+    logger.info(f"Latest torrents successfully synced: {added} added")
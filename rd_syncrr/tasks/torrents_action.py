@@ -2,9 +2,9 @@ import asyncio
 from typing import Any, Union
 
 from rd_syncrr.logging import logger
-from rd_syncrr.utils.rdapi import RD
+from rd_syncrr.utils.rdapi import AsyncRD
 
-rdapi = RD()
+rdapi = AsyncRD()
 
 
 async def check_hash_availability(
@@ -16,7 +16,7 @@ async def check_hash_availability(
         hash: The hash of the torrent to check.
     """
 
-    response = rdapi.torrents.instant_availability(hash).json()
+    response = (await rdapi.torrents.instant_availability(hash)).data
 
     if response[hash] == []:
         logger.info(f"Torrent {hash} is not available")
@@ -39,8 +39,8 @@ async def add_cached_torrent_to_rd(hash: str) -> None:  # noqa: A002
         hash: The hash of the torrent to add.
     """
     try:
-        magnet = rdapi.torrents.add_magnet(magnet=hash).json()
-        rdapi.torrents.select_files(id=magnet["id"], files="all")
+        magnet = (await rdapi.torrents.add_magnet(magnet=hash)).data
+        await rdapi.torrents.select_files(id=magnet["id"], files="all")
         logger.info(
             f"Torrent file : id = {magnet['id']} ; hash = {hash} was added to RD",
         )
@@ -1,142 +1,487 @@
 """list_torrents_to_json.py"""
 
-from typing import Any
+import asyncio
+from operator import attrgetter
+from typing import Any, Optional
+
+import ujson
 
 from rd_syncrr.logging import logger
 from rd_syncrr.services.media_db.dao.media_dao import MediaDAO
-from rd_syncrr.utils.rdapi import RD
+from rd_syncrr.settings import settings
+from rd_syncrr.utils.manifest_cache import Manifest, get_manifest_cache
+from rd_syncrr.utils.rdapi import AsyncRD, RDTorrent, RDTorrentFile
+from rd_syncrr.utils.set_diff import diff_by_key, is_mass_removal
+
+rdapi = AsyncRD()
 
-rdapi = RD()
+# torrent and the data of its selected files
+_FetchedTorrent = tuple[RDTorrent, list[dict[str, Any]]]
+# total count and newest torrent of the RD listing seen by the last run, only
+# set when every torrent of that listing was downloaded and in the database
+TORRENTS_HEAD_STATE = "rd_torrents_head"
+# hashes of the RD torrents not downloaded, on the account but not in database
+TORRENTS_NOT_DOWNLOADED_STATE = "rd_torrents_not_downloaded"
+# RD statuses of the torrents that can still end downloaded
+PENDING_STATUSES = frozenset(
+    (
+        "magnet_conversion",
+        "waiting_files_selection",
+        "queued",
+        "downloading",
+        "compressing",
+        "uploading",
+    ),
+)
 
 
-def _get_all_torrents(limit: int = 1000) -> list[dict[str, Any]]:
+async def get_not_downloaded_hashes(dao: MediaDAO) -> set[str]:
+    """Get the hashes of the RD torrents not downloaded, as of the last update.
+
+    Args:
+        dao: The database DAO for torrents.
+
+    Returns:
+        The hashes of the torrents on RD that are not in the database.
+    """
+    value = await dao.get_state(TORRENTS_NOT_DOWNLOADED_STATE)
+    return set(ujson.loads(value)) if value else set()
+
+
+async def save_not_downloaded_hashes(dao: MediaDAO, hashes: set[str]) -> None:
+    """Save the hashes of the RD torrents not downloaded.
+
+    Args:
+        dao: The database DAO for torrents.
+        hashes: The hashes of the torrents on RD that are not in the database.
+    """
+    await dao.set_state(TORRENTS_NOT_DOWNLOADED_STATE, ujson.dumps(sorted(hashes)))
+
+
+async def _get_torrents_page(
+    page: int,
+    limit: int,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> tuple[list[RDTorrent], Optional[int]]:
+    """Get a page of the RD torrents listing.
+
+    Args:
+        page: The page number, from 1.
+        limit: The maximum number of torrents to retrieve per page.
+        semaphore: Bounds the number of pages fetched at the same time.
+
+    Returns:
+        The torrents of the page and the total count of the listing.
+    """
+    if semaphore is None:
+        response = await rdapi.torrents.get(limit=limit, page=page)
+    else:
+        async with semaphore:
+            response = await rdapi.torrents.get(limit=limit, page=page)
+    # RD answers 204 without content past the last torrent
+    return RDTorrent.from_page(response.data), response.total_count
+
+
+async def _get_all_torrents(limit: int = 1000) -> list[RDTorrent]:
     """Get all torrents from RD.
 
+    The first page gives the total count, the other pages are then fetched
+    for up to `settings.rd_concurrency` at once, under the shared RD rate
+    limit. Torrents added meanwhile push the oldest ones to further pages,
+    which are read until a short page, and move the others to the next page,
+    torrents are kept once by id.
+
     Args:
-        limit: The maximum number of torrents to retrieve.
+        limit: The maximum number of torrents to retrieve per page.
 
     Returns:
-        A list of dictionaries representing the torrents.
+        The torrents of RD.
+
+    Raises:
+        Exception: If a page could not be fetched.
     """
-    page = 1
-    counter = limit
+    try:
+        torrents, total = await _get_torrents_page(1, limit)
+        pages = [torrents]
+        if total is not None and total > limit:
+            semaphore = asyncio.Semaphore(settings.rd_concurrency)
+            results = await asyncio.gather(
+                *(
+                    _get_torrents_page(page, limit, semaphore)
+                    for page in range(2, -(-total // limit) + 1)
+                ),
+            )
+            pages.extend(torrents for torrents, _ in results)
+        while len(pages[-1]) == limit:
+            torrents, _ = await _get_torrents_page(len(pages) + 1, limit)
+            pages.append(torrents)
+    except Exception as e:
+        # a partial listing would make the missing torrents look deleted
+        logger.error(f"An error occurred while listing torrents in RD: {e!s}")
+        raise
+
+    seen: set[str] = set()
     all_torrents = []
+    for torrents in pages:
+        for torrent in torrents:
+            if torrent.id not in seen:
+                seen.add(torrent.id)
+                all_torrents.append(torrent)
+    return all_torrents
+
+
+async def _get_torrents_head() -> Optional[str]:
+    """Get the total count and the newest torrent of the RD listing.
+
+    Returns:
+        The listing head as "count:id", None when RD did not send the count.
+    """
+    torrents, total = await _get_torrents_page(1, 1)
+    if total is None:
+        return None
+    return f"{total}:{torrents[0].id if torrents else ''}"
+
 
+async def _get_new_torrents(
+    known: frozenset[str],
+    added: int,
+    limit: int = 1000,
+) -> Optional[list[RDTorrent]]:
+    """Get the torrents added to RD since the last run.
+
+    RD lists the newest torrents first, so the torrents older than one already
+    in database are known too, pages are read until one holds such torrent.
+
+    Args:
+        known: Hashes of all torrents in database.
+        added: Growth of the RD torrents count since the last run.
+        limit: The maximum number of torrents to retrieve per page.
+
+    Returns:
+        The new torrents, None when they do not account for the count growth,
+        torrents were then removed from RD and the whole listing is needed.
+
+    Raises:
+        Exception: If a page could not be fetched.
+    """
+    page = 1
+    new_torrents: list[RDTorrent] = []
     try:
         while True:
-            torrents = rdapi.torrents.get(limit=limit, page=page).json()
-            all_torrents.extend(torrents)
-
-            if len(torrents) < counter:
+            torrents, _ = await _get_torrents_page(page, limit)
+            unknown = [item for item in torrents if item.hash not in known]
+            new_torrents.extend(unknown)
+            if len(new_torrents) > added:
+                return None
+            if len(unknown) < limit:
                 break
-            else:
-                counter += limit
-                page += 1
+            page += 1
     except Exception as e:
-        logger.error(f"An error occurred: {e!s}")
+        logger.error(f"An error occurred while listing new torrents in RD: {e!s}")
+        raise
+
+    return new_torrents if len(new_torrents) == added else None
 
-    return all_torrents
 
+async def _list_torrents(
+    dao: MediaDAO,
+    known: frozenset[str],
+) -> tuple[Optional[str], Optional[list[RDTorrent]], bool]:
+    """List the RD torrents needed to update the database.
 
-def _get_files_info(torrent_id: str) -> list[dict[str, Any]]:
+    The head of the listing is probed first: when the total count and the
+    newest torrent did not change since the last run nothing is listed, else
+    only the new torrents are, unless torrents were also removed.
+
+    Args:
+        dao: The database DAO for torrents.
+        known: Hashes of all torrents in database.
+
+    Returns:
+        The listing head, the torrents, None when the listing did not change,
+        and whether they are the whole listing or only the new torrents.
+    """
+    if not settings.rd_torrents_probe:
+        return None, await _get_all_torrents(), True
+    head = await _get_torrents_head()
+    previous = await dao.get_state(TORRENTS_HEAD_STATE)
+    if head is None or not previous:
+        return head, await _get_all_torrents(), True
+    if head == previous:
+        return head, None, False
+    added = int(head.split(":", 1)[0]) - int(previous.split(":", 1)[0])
+    new_torrents = await _get_new_torrents(known, added)
+    if new_torrents is None:
+        return head, await _get_all_torrents(), True
+    return head, new_torrents, False
+
+
+async def _get_files_info(torrent_id: str) -> list[RDTorrentFile]:
     """Get files info from RD.
 
     Args:
         torrent_id: The torrent ID.
 
     Returns:
-        A list of dictionaries representing the files info.
+        The files of the torrent.
     """
     try:
-        info = rdapi.torrents.info(id=torrent_id).json()
-        files = info["files"]
-        return files  # noqa: TRY300
+        response = await rdapi.torrents.info(id=torrent_id)
+        return RDTorrentFile.from_info(response.data)
     except Exception as e:
         logger.error(f"An error occurred while getting files info in RD: {e!s}")
         raise
 
 
+async def _remove_deleted_torrents(
+    dao: MediaDAO,
+    removed: frozenset[str],
+    torrents_hash: frozenset[str],
+) -> bool:
+    """Remove the torrents deleted from RD from the database.
+
+    Args:
+        dao: The database DAO for torrents.
+        removed: Hashes of the torrents deleted from RD.
+        torrents_hash: Hashes of all torrents in database.
+
+    Returns:
+        Whether every torrent was removed.
+    """
+    if is_mass_removal(removed, torrents_hash, settings.media_db_max_removed_ratio):
+        logger.warning(
+            (
+                f"{len(removed)} of {len(torrents_hash)} torrents missing in RD,"
+                " skipping removal from database"
+            ),
+        )
+        return False
+    result = await dao.delete_torrents_by_hash(removed)
+    for torrent_hash, error in result.failed:
+        logger.error(
+            f"Torrent could not be removed from database: {torrent_hash} - {error}",
+        )
+    logger.info(
+        (
+            f"Torrents deleted from RD removed from database: {result.deleted}"
+            f" ({result.files} files, {result.symlinks} symlinks)"
+        ),
+    )
+    return not result.failed
+
+
 async def _update_torrent_db(dao: MediaDAO) -> None:
     """Update torrent database.
 
+    The listing head is saved when the database ends up holding every torrent
+    of the listing, the next run may then skip the listing or read only its
+    first pages. Torrents still downloading are only seen by a whole listing,
+    the head is cleared while there are some. Torrents in a final status other
+    than downloaded, an error or a dead torrent, do not clear it. The hashes
+    of the torrents not downloaded are saved, the sync with another instance
+    does not add them again.
+
     Args:
         dao: The database DAO for torrents.
     """
     try:
-        data = _get_all_torrents()
-        filtered_data = [item for item in data if item["status"] == "downloaded"]
-        all_torrents = [
-            {"filename": item["filename"], "id": item["id"], "hash": item["hash"]}
-            for item in filtered_data
-        ]
-
         torrents_hash = await dao.get_all_torrents_hashes()
-        if torrents_hash:
-            new_torrents = [
-                item for item in all_torrents if item["hash"] not in torrents_hash
-            ]
-            if new_torrents:
-                await _process_new_torrents(dao, new_torrents)
-                logger.info(f"New torrents added to database: {len(new_torrents)}")
-            else:
-                logger.info("No new torrents found in RD.")
+        head, data, complete = await _list_torrents(dao, torrents_hash)
+        if data is None:
+            logger.info("No change in RD torrents, listing skipped.")
+            return
+        all_torrents = [item for item in data if item.status == "downloaded"]
+        synced = not any(item.status in PENDING_STATUSES for item in data)
+        not_downloaded = {item.hash for item in data if item.status != "downloaded"}
+        if not complete:
+            # torrents pending at the last run clear the head, the others are
+            # final and only leave RD with a whole listing
+            previous = await get_not_downloaded_hashes(dao)
+            not_downloaded |= previous - {item.hash for item in all_torrents}
+        await save_not_downloaded_hashes(dao, not_downloaded)
+
+        diff = diff_by_key(all_torrents, torrents_hash, attrgetter("hash"))
+        # torrents still in RD but not downloaded anymore are kept
+        removed = diff.removed - {item.hash for item in data}
+        if removed and complete:
+            removed_all = await _remove_deleted_torrents(dao, removed, torrents_hash)
+            synced = synced and removed_all
+        if diff.added:
+            await _process_new_torrents(dao, diff.added)
+            logger.info(f"New torrents added to database: {len(diff.added)}")
+            added = {item.hash for item in diff.added}
+            synced = synced and added <= await dao.get_all_torrents_hashes()
         else:
-            await _process_new_torrents(dao, all_torrents)
-            logger.info(f"New torrents added to database: {len(all_torrents)}")
+            logger.info("No new torrents found in RD.")
+        if head is not None:
+            await dao.set_state(TORRENTS_HEAD_STATE, head if synced else "")
     except Exception as e:
         logger.error(f"An error occurred during database update: {e!s}")
 
 
-async def _process_new_torrents(dao: MediaDAO, torrents: list[dict[str, Any]]) -> None:
+async def _process_new_torrents(dao: MediaDAO, torrents: list[RDTorrent]) -> None:
     """Process new torrents and add them to the database.
 
+    Files info is read from the manifest cache, or fetched from RD for up to
+    `settings.rd_concurrency` torrents at once, under the shared RD rate limit,
+    and handed to a single batched writer. The fetched files are cached.
+
     Args:
         dao: The database DAO for torrents.
         torrents: List of new torrents to process.
     """
-    for torrent in torrents:
-        try:
-            await _add_torrent_to_database(dao, torrent)
-            await _add_files_to_torrent(dao, torrent)
-            logger.info(f"Torrent added to database: {torrent['filename']}")
-        except Exception as e:
-            logger.error(f"An error occurred while processing torrent: {e!s}")
+    queue: asyncio.Queue[Optional[_FetchedTorrent]] = asyncio.Queue(
+        maxsize=settings.media_db_batch_size,
+    )
+    semaphore = asyncio.Semaphore(settings.rd_concurrency)
+    manifests = await _read_manifests(torrents)
+    fetched: dict[str, Manifest] = {}
+    writer = asyncio.create_task(_write_torrents(dao, queue))
+    try:
+        await asyncio.gather(
+            *(
+                _fetch_torrent_files(torrent, semaphore, queue, manifests, fetched)
+                for torrent in torrents
+            ),
+        )
+    finally:
+        await queue.put(None)
+        await writer
+        await _cache_manifests(fetched)
+    if manifests:
+        logger.info(f"Torrents files read from the manifest cache: {len(manifests)}")
+
+
+async def _read_manifests(torrents: list[RDTorrent]) -> dict[str, Manifest]:
+    """Read the cached files of torrents.
+
+    Args:
+        torrents: The torrents.
+
+    Returns:
+        The files by lowercase hash, only for the cached torrents.
+    """
+    cache = get_manifest_cache()
+    if cache is None:
+        return {}
+    try:
+        return await asyncio.to_thread(
+            cache.get_many,
+            [torrent.hash for torrent in torrents],
+        )
+    except Exception as e:
+        logger.error(f"An error occurred while reading the manifest cache: {e!s}")
+        return {}
 
 
-async def _add_torrent_to_database(dao: MediaDAO, torrent: dict[str, Any]) -> None:
-    """Add a torrent to the database.
+async def _cache_manifests(manifests: dict[str, Manifest]) -> None:
+    """Cache the files of torrents.
+
+    Args:
+        manifests: The files by hash.
+    """
+    cache = get_manifest_cache()
+    if cache is None or not manifests:
+        return
+    try:
+        await asyncio.to_thread(cache.put_many, manifests)
+    except Exception as e:
+        logger.error(f"An error occurred while writing the manifest cache: {e!s}")
+
+
+async def _fetch_torrent_files(
+    torrent: RDTorrent,
+    semaphore: asyncio.Semaphore,
+    queue: "asyncio.Queue[Optional[_FetchedTorrent]]",
+    manifests: dict[str, Manifest],
+    fetched: dict[str, Manifest],
+) -> None:
+    """Fetch the selected files of a torrent and queue them for the writer.
+
+    Args:
+        torrent: The torrent data.
+        semaphore: Bounds the number of torrents fetched at the same time.
+        queue: The writer queue.
+        manifests: The cached files by lowercase hash, RD is not asked for them.
+        fetched: The files fetched from RD by hash, filled for the cache.
+    """
+    manifest = manifests.get(torrent.hash.lower())
+    if manifest is None:
+        async with semaphore:
+            try:
+                files = await _get_files_info(torrent_id=torrent.id)
+            except Exception as e:
+                logger.error(f"An error occurred while processing torrent: {e!s}")
+                return
+        manifest = [(file.path, file.bytes) for file in files if file.selected]
+        fetched[torrent.hash] = manifest
+    file_data = [{"path": path, "bytes": size} for path, size in manifest]
+    await queue.put((torrent, file_data))
+
+
+async def _write_torrents(
+    dao: MediaDAO,
+    queue: "asyncio.Queue[Optional[_FetchedTorrent]]",
+) -> None:
+    """Write fetched torrents to the database in batches.
+
+    A failing batch is logged and the writer keeps draining the queue, the
+    fetchers would otherwise block on a full queue.
 
     Args:
         dao: The database DAO for torrents.
-        torrent: The torrent data to add.
+        queue: The writer queue, a None item ends the writer.
     """
-    await dao.create_torrent_model(
-        hash=torrent["hash"],
-        id=torrent["id"],
-        filename=torrent["filename"],
-    )
+    batch: list[_FetchedTorrent] = []
+    while True:
+        item = await queue.get()
+        if item is not None:
+            batch.append(item)
+        if batch and (item is None or len(batch) >= settings.media_db_batch_size):
+            try:
+                await _add_torrents_to_database(dao, batch)
+            except Exception as e:
+                logger.error(
+                    (
+                        f"An error occurred while adding {len(batch)} torrents"
+                        f" to database: {e!s}"
+                    ),
+                )
+            batch = []
+        if item is None:
+            return
 
 
-async def _add_files_to_torrent(dao: MediaDAO, torrent: dict[str, Any]) -> None:
-    """Add files to a torrent in the database.
+async def _add_torrents_to_database(
+    dao: MediaDAO,
+    batch: list[_FetchedTorrent],
+) -> None:
+    """Add a batch of torrents and their files to the database.
 
     Args:
         dao: The database DAO for torrents.
-        torrent: The torrent data containing files to add.
+        batch: The torrents with their files data.
     """
-    try:
-        files = _get_files_info(torrent_id=torrent["id"])
-        selected_files = [file for file in files if file["selected"] == 1]
-        file_data = [
-            {"path": file["path"], "bytes": file["bytes"]} for file in selected_files
-        ]
-        for file in file_data:
-            await dao.create_file_model(torrent_id=torrent["id"], file_data=file)
-            logger.debug(
-                f"File from {torrent['filename']} added to database: {file['path']}",
+    result = await dao.create_torrents_with_files(
+        [
+            (
+                {
+                    "hash": torrent.hash,
+                    "id": torrent.id,
+                    "filename": torrent.filename,
+                },
+                files,
             )
-    except Exception as e:
-        logger.error(f"An error occurred while getting files info in RD: {e!s}")
+            for torrent, files in batch
+        ],
+    )
+    failed_ids = {torrent_data["id"] for (torrent_data, _), _ in result.failed}
+    for torrent, files in batch:
+        if torrent.id in failed_ids:
+            logger.error(f"Torrent could not be added to database: {torrent.filename}")
+            continue
+        logger.debug(f"{len(files)} files from {torrent.filename} added to database")
+        logger.info(f"Torrent added to database: {torrent.filename}")
 
 
 async def process_torrents(dao: MediaDAO) -> None:
@@ -0,0 +1,41 @@
+"""Fixtures shared by the tests."""
+from collections.abc import AsyncGenerator
+from typing import Any
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from rd_syncrr.services.media_db.dao import MediaDAO
+from rd_syncrr.services.media_db.meta import meta
+from rd_syncrr.services.media_db.models import load_all_models
+
+
+@pytest.fixture
+async def dao(anyio_backend: Any) -> AsyncGenerator[MediaDAO, None]:
+    """
+    Create a DAO on an empty in-memory database.
+
+    :yield: media DAO.
+    """
+    load_all_models()
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as connection:
+        await connection.run_sync(meta.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with MediaDAO(session=session_factory()) as media_dao:
+        yield media_dao
+    await engine.dispose()
+
+
+def torrent_data(number: int) -> dict[str, Any]:
+    """
+    Get the data of a torrent.
+
+    :param number: number of the torrent, its ID, hash and filename derive from it.
+    :return: torrent data.
+    """
+    return {
+        "id": f"T{number}",
+        "hash": f"{number:040x}",
+        "filename": f"torrent {number}",
+    }
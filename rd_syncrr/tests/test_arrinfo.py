@@ -0,0 +1,108 @@
+"""Tests for the Radarr/Sonarr media info fetching."""
+import threading
+import time
+from typing import Any
+
+import pytest
+
+from rd_syncrr.tasks import arrinfo_api
+from rd_syncrr.tasks.arrinfo_api import ArrInfo
+from rd_syncrr.utils.pyarr.exceptions import PyarrResourceNotFound
+
+
+def test_deleted_items_are_skipped_failed_ones_reported() -> None:
+    """A 404 skips its item, other errors do not lose the rest of the ids."""
+
+    def get(_id: int) -> dict[str, Any]:
+        if _id == 1:
+            raise PyarrResourceNotFound("Resource not found")
+        if _id == 2:
+            raise ConnectionError("Arr unreachable")
+        return {"id": _id}
+
+    failed: set[int] = set()
+    items = ArrInfo()._get_by_ids(get, [1, 2, 3], failed)
+    assert items == [{"id": 3}]  # noqa: S101
+    assert failed == {2}  # noqa: S101
+
+
+def test_series_with_failed_episodes_are_reported(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A series whose episodes fetch fails is reported, not read as empty."""
+    arrinfo = ArrInfo()
+    series = [{"id": _id, "statistics": {"episodeFileCount": 1}} for _id in (1, 2)]
+    episode = {"id": 10, "episodeFileId": 100, "episodeNumber": 1}
+
+    def get_episode_file(_id: int, series: bool) -> list[dict[str, Any]]:
+        if _id == 2:
+            raise ConnectionError("Sonarr unreachable")
+        return [{"id": 100, "path": "/tv/s01e01.mkv"}]
+
+    monkeypatch.setattr(arrinfo.sonarr, "get_series", lambda: series)
+    monkeypatch.setattr(arrinfo.sonarr, "get_episode_file", get_episode_file)
+    monkeypatch.setattr(arrinfo.sonarr, "get_episode", lambda *_, **__: [episode])
+    episodes, failed, _ = arrinfo.get_sonarr_info()
+    assert [item["path"] for item in episodes] == ["/tv/s01e01.mkv"]  # noqa: S101
+    assert failed == {2}  # noqa: S101
+
+
+def test_episodes_files_matched_by_file_id() -> None:
+    """A file gets its first episode, files without an episode are skipped."""
+    episodes_files: list[dict[str, Any]] = [
+        {"id": 100, "path": "/tv/s01e01.mkv"},
+        {"id": 101, "path": "/tv/s01e02-e03.mkv"},
+        {"id": 102, "path": "/tv/s01e09.mkv"},
+        {"path": "/tv/unknown.mkv"},
+    ]
+    episodes_info = [
+        {"id": 13, "episodeFileId": 101, "episodeNumber": 3, "title": "Three"},
+        {"id": 10, "episodeFileId": 100, "episodeNumber": 1, "title": "One"},
+        {"id": 12, "episodeFileId": 101, "episodeNumber": 2, "title": "Two"},
+        {"id": 14, "episodeFileId": 0, "episodeNumber": 4, "title": "Four"},
+    ]
+
+    ArrInfo()._update_episodes_files(episodes_files, episodes_info)
+
+    assert [  # noqa: S101
+        (item.get("episodeId"), item.get("episodeNumber"), item.get("episodeTitle"))
+        for item in episodes_files
+    ] == [(10, 1, "One"), (13, 3, "Three"), (None, None, None), (None, None, None)]
+
+
+def test_series_fetched_at_most_sonarr_concurrency_at_a_time(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """The episodes of the series are fetched by sonarr_concurrency threads."""
+    arrinfo = ArrInfo()
+    series = [
+        {"id": _id, "title": f"Serie {_id}", "statistics": {"episodeFileCount": 1}}
+        for _id in range(1, 7)
+    ]
+    lock = threading.Lock()
+    running = peak = 0
+
+    def get_episode_file(_id: int, series: bool) -> list[dict[str, Any]]:
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+        return [{"id": _id * 100, "path": f"/tv/{_id}/s01e01.mkv"}]
+
+    def get_episode(_id: int, series: bool) -> list[dict[str, Any]]:
+        return [{"id": _id * 10, "episodeFileId": _id * 100, "episodeNumber": 1}]
+
+    monkeypatch.setattr(arrinfo_api.settings, "sonarr_concurrency", 2)
+    monkeypatch.setattr(arrinfo.sonarr, "get_series", lambda: series)
+    monkeypatch.setattr(arrinfo.sonarr, "get_episode_file", get_episode_file)
+    monkeypatch.setattr(arrinfo.sonarr, "get_episode", get_episode)
+    episodes, failed, _ = arrinfo.get_sonarr_info()
+
+    assert peak == 2  # noqa: S101
+    assert failed == set()  # noqa: S101
+    assert [  # noqa: S101
+        (item["serieId"], item["episodefileId"], item["episodeId"]) for item in episodes
+    ] == [(_id, _id * 100, _id * 10) for _id in range(1, 7)]
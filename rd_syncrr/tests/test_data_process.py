@@ -0,0 +1,88 @@
+"""Tests for the JSON export of the torrents."""
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from rd_syncrr.services.media_db.dao import MediaDAO
+from rd_syncrr.tasks import data_process
+from rd_syncrr.tests.conftest import torrent_data
+
+# content of the file written by a previous export
+OLD = '[{"id":"T1"}]'
+
+
+async def _seed(dao: MediaDAO) -> None:
+    await dao.create_torrents_with_files(
+        [
+            (
+                {**torrent_data(n), "added": datetime(2024, 1, day)},
+                [{"id": f"F{n}", "path": f"/e0{n}.mkv", "bytes": n}],
+            )
+            for n, day in ((1, 2), (2, 3), (3, 1))
+        ],
+    )
+
+
+@pytest.mark.anyio
+async def test_torrents_written_as_compact_json_newest_first(
+    dao: MediaDAO,
+    tmp_path: Path,
+) -> None:
+    """The torrents are written newest first, without whitespace."""
+    await _seed(dao)
+    all_torrents_file = tmp_path / "all_torrents.json"
+
+    count = await data_process._list_torrents_to_json(dao, str(all_torrents_file))
+
+    text = all_torrents_file.read_text(encoding="utf-8")
+    torrents = json.loads(text)
+    assert count == 3  # noqa: S101
+    assert text == json.dumps(torrents, separators=(",", ":"))  # noqa: S101
+    assert [torrent["id"] for torrent in torrents] == ["T2", "T1", "T3"]  # noqa: S101
+    assert torrents[0]["files"][0]["path"] == "/e02.mkv"  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_empty_database_leaves_the_file_untouched(
+    dao: MediaDAO,
+    tmp_path: Path,
+) -> None:
+    """Nothing is written when there are no torrents."""
+    all_torrents_file = tmp_path / "all_torrents.json"
+    all_torrents_file.write_text(OLD, encoding="utf-8")
+
+    count = await data_process._list_torrents_to_json(dao, str(all_torrents_file))
+
+    assert count == 0  # noqa: S101
+    assert all_torrents_file.read_text(encoding="utf-8") == OLD  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_failed_write_keeps_the_previous_file(
+    dao: MediaDAO,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """An error mid-write keeps the old file and removes the temporary one."""
+    await _seed(dao)
+    all_torrents_file = tmp_path / "all_torrents.json"
+    all_torrents_file.write_text(OLD, encoding="utf-8")
+    torrent_info = data_process._torrent_info
+
+    def failing_torrent_info(torrent: Any) -> dict[str, Any]:
+        if torrent.id == "T3":
+            raise RuntimeError("failed")
+        return torrent_info(torrent)
+
+    monkeypatch.setattr(data_process, "_torrent_info", failing_torrent_info)
+
+    with pytest.raises(RuntimeError):
+        await data_process._list_torrents_to_json(dao, str(all_torrents_file))
+
+    assert all_torrents_file.read_text(encoding="utf-8") == OLD  # noqa: S101
+    assert [path.name for path in tmp_path.iterdir()] == [  # noqa: S101
+        "all_torrents.json",
+    ]
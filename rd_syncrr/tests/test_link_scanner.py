@@ -0,0 +1,102 @@
+"""Tests for the parallel symlink scanner."""
+import os
+import time
+from contextlib import aclosing
+from pathlib import Path
+
+import pytest
+
+from rd_syncrr.utils.link_scanner import DirectoryIndex, scan_symlinks
+
+
+@pytest.mark.anyio
+async def test_scan_symlinks_in_batches(tmp_path: Path) -> None:
+    """File symlinks of every folder are found, other entries are ignored."""
+    target = tmp_path / "rd" / "movie.mkv"
+    target.parent.mkdir()
+    target.touch()
+    library = tmp_path / "library"
+    expected = set()
+    for folder in ("movies", "shows/show/season 1", "shows/other"):
+        for number in range(3):
+            link = library / folder / f"{number}.mkv"
+            link.parent.mkdir(parents=True, exist_ok=True)
+            link.symlink_to(target)
+            expected.add(str(link))
+    (library / "top.mkv").symlink_to(target)
+    expected.add(str(library / "top.mkv"))
+    (library / "movies" / "file.nfo").touch()
+    (library / "movies" / "dir_link").symlink_to(target.parent)
+
+    batches = [batch async for batch in scan_symlinks(str(library), batch_size=2)]
+
+    assert all(len(batch) <= 2 for batch in batches)  # noqa: S101
+    found = {info["destination"] for batch in batches for info in batch}
+    assert found == expected  # noqa: S101
+    assert {info["target"] for batch in batches for info in batch} == {  # noqa: S101
+        os.path.abspath(target)
+    }
+
+
+@pytest.mark.anyio
+async def test_scan_symlinks_stops_early(tmp_path: Path) -> None:
+    """Leaving the scan early stops the walkers."""
+    for number in range(50):
+        folder = tmp_path / f"folder {number}"
+        folder.mkdir()
+        for file_number in range(20):
+            (folder / f"{file_number}.mkv").symlink_to("/nowhere")
+
+    async with aclosing(scan_symlinks(str(tmp_path), batch_size=1)) as batches:
+        async for batch in batches:
+            assert batch  # noqa: S101
+            break
+
+
+async def _scan(path: Path, index: DirectoryIndex) -> set[str]:
+    return {
+        info["destination"]
+        async for batch in scan_symlinks(str(path), index=index)
+        for info in batch
+    }
+
+
+@pytest.mark.anyio
+async def test_scan_symlinks_skips_unchanged_directories(tmp_path: Path) -> None:
+    """Only directories modified since the previous scan are listed."""
+    past = time.time() - 100
+    for show in ("a", "b"):
+        for season in ("1", "2"):
+            folder = tmp_path / show / season
+            folder.mkdir(parents=True)
+            (folder / "e1.mkv").symlink_to("/rd/e1.mkv")
+    directories = [tmp_path, *(path for path in tmp_path.rglob("*") if path.is_dir())]
+    for directory in directories:
+        os.utime(directory, (past, past))
+
+    first = DirectoryIndex({})
+    assert len(await _scan(tmp_path, first)) == 4  # noqa: S101
+    assert len(first.updates) == len(directories)  # noqa: S101
+
+    second = DirectoryIndex(first.updates)
+    assert await _scan(tmp_path, second) == set()  # noqa: S101
+    assert second.unchanged == len(directories)  # noqa: S101
+
+    (tmp_path / "b" / "2" / "e2.mkv").symlink_to("/rd/e2.mkv")
+    os.utime(tmp_path / "b" / "2", (past + 1, past + 1))
+    third = DirectoryIndex(first.updates)
+    assert await _scan(tmp_path, third) == {  # noqa: S101
+        str(tmp_path / "b" / "2" / "e1.mkv"),
+        str(tmp_path / "b" / "2" / "e2.mkv"),
+    }
+
+    full = DirectoryIndex(first.updates, full=True)
+    assert len(await _scan(tmp_path, full)) == 5  # noqa: S101
+
+    # symlinks not added keep their directory listed until they are
+    full.forget([str(tmp_path / "a" / "1")])
+    assert str(tmp_path / "a" / "1") in full.removed  # noqa: S101
+    fourth = DirectoryIndex(full.updates)
+    assert await _scan(tmp_path, fourth) == {  # noqa: S101
+        str(tmp_path / "a" / "1" / "e1.mkv"),
+    }
@@ -0,0 +1,48 @@
+"""Tests for the inotify symlink watcher."""
+import os
+import sys
+from contextlib import aclosing
+from pathlib import Path
+
+import pytest
+
+from rd_syncrr.utils.link_watcher import LinkWatcher
+
+
+@pytest.mark.anyio
+@pytest.mark.skipif(sys.platform != "linux", reason="inotify is Linux only")
+async def test_watcher_coalesces_changes(tmp_path: Path) -> None:
+    """Created and removed links are reported once, with their last state."""
+    target = tmp_path / "movie.mkv"
+    target.touch()
+    library = tmp_path / "library"
+    (library / "movies").mkdir(parents=True)
+    (library / "movies" / "old.mkv").symlink_to(target)
+    (library / "shows").mkdir()
+    watcher = LinkWatcher(str(library), max_pending=100)
+    await watcher.start()
+
+    try:
+        (library / "movies" / "new.mkv").symlink_to(target)
+        (library / "movies" / "old.mkv").unlink()
+        (library / "movies" / "tmp.mkv").symlink_to(target)
+        (library / "movies" / "tmp.mkv").unlink()
+        season = library / "shows" / "show" / "season 1"
+        season.mkdir(parents=True)
+        (season / "e1.mkv").symlink_to(target)
+        os.rename(library / "movies", tmp_path / "movies")
+        async with aclosing(watcher.changes(delay=0.1)) as batches:
+            changes = await batches.__anext__()
+    finally:
+        watcher.close()
+
+    assert changes.created == [  # noqa: S101
+        str(library / "movies" / "new.mkv"),
+        str(season / "e1.mkv"),
+    ]
+    assert sorted(changes.removed) == [  # noqa: S101
+        str(library / "movies" / "old.mkv"),
+        str(library / "movies" / "tmp.mkv"),
+    ]
+    assert changes.removed_dirs == [str(library / "movies")]  # noqa: S101
+    assert not changes.overflow  # noqa: S101
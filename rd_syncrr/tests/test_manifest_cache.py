@@ -0,0 +1,45 @@
+"""Tests for the torrent file manifest cache."""
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from rd_syncrr.tasks import torrents_process
+from rd_syncrr.utils.manifest_cache import ManifestCache
+from rd_syncrr.utils.rdapi import RDTorrent
+
+
+def test_manifests_outlive_the_cache_instance(tmp_path: Path) -> None:
+    """Manifests are found by hash, whatever its case, once reopened."""
+    path = str(tmp_path / "manifests.db")
+    ManifestCache(path).put_many({"ABC": [("/a.mkv", 1), ("/b.srt", 2)]})
+    manifests = ManifestCache(path).get_many(["abc", "def"])
+    assert manifests == {"abc": [("/a.mkv", 1), ("/b.srt", 2)]}  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_cached_torrents_are_not_fetched(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A torrent with a cached manifest is queued without asking RD."""
+
+    async def get_files_info(**_: Any) -> None:
+        raise AssertionError("RD asked for a cached torrent")
+
+    monkeypatch.setattr(torrents_process, "_get_files_info", get_files_info)
+    torrent = RDTorrent("T1", "torrent", "ABC", "downloaded")
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    fetched: dict[str, Any] = {}
+    await torrents_process._fetch_torrent_files(
+        torrent,
+        asyncio.Semaphore(1),
+        queue,
+        {"abc": [("/a.mkv", 1)]},
+        fetched,
+    )
+    assert queue.get_nowait() == (  # noqa: S101
+        torrent,
+        [{"path": "/a.mkv", "bytes": 1}],
+    )
+    assert fetched == {}  # noqa: S101
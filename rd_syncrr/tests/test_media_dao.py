@@ -0,0 +1,295 @@
+"""Tests for the media database DAO."""
+from collections.abc import Sequence
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.exc import OperationalError
+
+from rd_syncrr.services.media_db.dao import BulkInsertResult, MediaDAO
+from rd_syncrr.services.media_db.models.media_model import (
+    RadarrMovieModel,
+    SymlinkModel,
+    TorrentFileModel,
+    TorrentModel,
+)
+from rd_syncrr.tasks.data_process import process_torrent_changes
+from rd_syncrr.tests.conftest import torrent_data
+
+
+@pytest.mark.anyio
+async def test_bulk_create_torrents_reports_failed_rows(dao: MediaDAO) -> None:
+    """A failing row is reported without aborting the rest of the batch."""
+    await dao.bulk_create_torrent_models([torrent_data(1)])
+
+    result = await dao.bulk_create_torrent_models(
+        [torrent_data(2), torrent_data(1), torrent_data(3), {"id": "T4", "hash": "4"}],
+    )
+
+    assert result.inserted == 2  # noqa: S101
+    assert [row["id"] for row, _ in result.failed] == ["T1", "T4"]  # noqa: S101
+    ids = (await dao.session.scalars(select(TorrentModel.id))).all()
+    assert sorted(ids) == ["T1", "T2", "T3"]  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_bulk_write_fails_batch_on_transaction_error(dao: MediaDAO) -> None:
+    """A locked database fails the batch once instead of splitting it."""
+    calls: list[int] = []
+
+    async def write(chunk: Sequence[int]) -> None:
+        calls.append(len(chunk))
+        raise OperationalError("INSERT", None, Exception("database is locked"))
+
+    result = BulkInsertResult()
+    await dao._bulk_write(list(range(8)), write, result)
+
+    assert calls == [8]  # noqa: S101
+    assert [row for row, _ in result.failed] == list(range(8))  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_bulk_create_files_requires_torrent(dao: MediaDAO) -> None:
+    """Files of an unknown torrent are reported as failed."""
+    await dao.bulk_create_torrent_models([torrent_data(1)])
+
+    result = await dao.bulk_create_file_models(
+        [
+            {"torrent_id": "T1", "path": "/a.mkv", "bytes": 1},
+            {"torrent_id": "T9", "path": "/b.mkv", "bytes": 1},
+        ],
+    )
+
+    assert result.inserted == 1  # noqa: S101
+    assert result.failed[0][1] == "Torrent not found"  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_bulk_create_symlinks_links_files(dao: MediaDAO) -> None:
+    """Symlinks are inserted and linked to their torrent file."""
+    await dao.create_torrents_with_files(
+        [(torrent_data(1), [{"id": "F1", "path": "/a.mkv", "bytes": 1}])],
+    )
+
+    result = await dao.bulk_create_symlink_models(
+        [
+            (
+                {
+                    "target": "/rd/a.mkv",
+                    "target_filename": "a.mkv",
+                    "destination": "/lib/a.mkv",
+                    "destination_filename": "a.mkv",
+                },
+                "F1",
+            ),
+        ],
+    )
+
+    assert result.inserted == 1  # noqa: S101
+    symlink_id = await dao.session.scalar(select(SymlinkModel.id))
+    file_model = await dao.session.get(TorrentFileModel, "F1")
+    assert file_model is not None  # noqa: S101
+    assert file_model.symlink_id == symlink_id  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_torrents_with_media_query_count(dao: MediaDAO) -> None:
+    """A page of torrents with files and media info loads in constant queries."""
+    await dao.create_torrents_with_files(
+        [
+            (
+                torrent_data(number),
+                [{"path": f"/{number}/{i}.mkv", "bytes": i} for i in range(3)],
+            )
+            for number in range(20)
+        ],
+    )
+    statements: list[str] = []
+    assert dao.session.bind is not None  # noqa: S101
+    event.listen(
+        dao.session.bind.sync_engine,
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+
+    torrents = await dao.get_torrents_with_media(limit=50)
+
+    assert len(torrents) == 20  # noqa: S101
+    assert all(len(torrent.files or []) == 3 for torrent in torrents)  # noqa: S101
+    assert len(statements) <= 4  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_keyset_pagination_is_stable(dao: MediaDAO) -> None:
+    """Keyset pages never skip or repeat rows, even with equal added dates."""
+    added = [datetime(2024, 1, 1 + number % 3) for number in range(25)]
+    await dao.bulk_create_torrent_models(
+        {**torrent_data(number), "added": added[number]} for number in range(25)
+    )
+
+    seen: list[str] = []
+    after = None
+    while True:
+        page = await dao.get_all_torrents(limit=10, after=after)
+        if after is None:
+            # rows inserted while paging land before the cursor
+            await dao.bulk_create_torrent_models(
+                [{**torrent_data(99), "added": datetime(2025, 1, 1)}],
+            )
+        seen.extend(torrent.id for torrent in page)
+        if len(page) < 10:
+            break
+        after = (page[-1].added, page[-1].id)
+
+    assert sorted(seen) == sorted(f"T{number}" for number in range(25))  # noqa: S101
+    assert seen[0] in {f"T{number}" for number in range(2, 25, 3)}  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_changes_since_sequence(dao: MediaDAO) -> None:
+    """The change journal reports torrents added or updated after a sequence."""
+    await dao.bulk_create_torrent_models([torrent_data(1), torrent_data(2)])
+    since = await dao.get_change_seq()
+
+    await dao.bulk_create_file_models(
+        [{"torrent_id": "T1", "path": "/a.mkv", "bytes": 1}],
+    )
+    await dao.bulk_create_torrent_models([torrent_data(3)])
+
+    changes = await dao.get_changes_since(since)
+    assert changes.since == since  # noqa: S101
+    assert changes.seq == await dao.get_change_seq()  # noqa: S101
+    assert changes.added == [torrent_data(3)["hash"]]  # noqa: S101
+    assert changes.updated == [torrent_data(1)["hash"]]  # noqa: S101
+    assert changes.removed == []  # noqa: S101
+    assert (await dao.get_changes_since(changes.seq)).added == []  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_torrent_changes_pages(dao: MediaDAO) -> None:
+    """Changes are served page by page up to the latest change sequence."""
+    await dao.create_torrents_with_files(
+        [
+            (torrent_data(number), [{"path": f"/{number}.mkv", "bytes": 1}])
+            for number in range(5)
+        ],
+    )
+    await dao.bulk_create_torrent_models(
+        [torrent_data(number) for number in range(5, 8)]
+    )
+
+    since = 0
+    hashes: list[str] = []
+    while True:
+        page = await process_torrent_changes(dao, since=since, limit=1)
+        hashes.extend(torrent["hash"] for torrent in page["torrents"])
+        since = page["seq"]
+        if since >= page["head"]:
+            break
+
+    expected = sorted(torrent_data(n)["hash"] for n in range(8))
+    assert sorted(hashes) == expected  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_prune_changes_keeps_live_torrents(dao: MediaDAO) -> None:
+    """Compacted changes still list the live torrents from 0."""
+    await dao.bulk_create_torrent_models([torrent_data(number) for number in range(3)])
+    await dao.delete_torrents_by_hash([torrent_data(0)["hash"]])
+    await dao.create_torrents_with_files(
+        [(torrent_data(3), [{"id": "F3", "path": "/3.mkv", "bytes": 1}])],
+    )
+    await dao.create_file_model("T1", {"id": "F1", "path": "/1.mkv", "bytes": 1})
+    head = await dao.get_change_seq()
+
+    assert await dao.prune_changes(head - 1) == 3  # noqa: S101
+    assert await dao.prune_changes(head - 1) == 0  # noqa: S101
+
+    assert await dao.get_changes_floor() == head - 1  # noqa: S101
+    changes = await dao.get_changes_since(0)
+    assert changes.removed == []  # noqa: S101
+    assert sorted(changes.added + changes.updated) == sorted(  # noqa: S101
+        torrent_data(number)["hash"] for number in range(1, 4)
+    )
+
+
+@pytest.mark.anyio
+async def test_delete_torrents_removes_files_and_symlinks(dao: MediaDAO) -> None:
+    """Deleted torrents take their files and symlinks with them."""
+    await dao.create_torrents_with_files(
+        [
+            (torrent_data(1), [{"id": "F1", "path": "/a.mkv", "bytes": 1}]),
+            (torrent_data(2), [{"id": "F2", "path": "/b.mkv", "bytes": 1}]),
+        ],
+    )
+    await dao.bulk_create_symlink_models(
+        [
+            (
+                {
+                    "target": "/rd/a.mkv",
+                    "target_filename": "a.mkv",
+                    "destination": "/lib/a.mkv",
+                    "destination_filename": "a.mkv",
+                },
+                "F1",
+            ),
+        ],
+    )
+    since = await dao.get_change_seq()
+
+    result = await dao.delete_torrents_by_hash([torrent_data(1)["hash"], "unknown"])
+
+    assert (result.deleted, result.files, result.symlinks) == (1, 1, 1)  # noqa: S101
+    remaining = {torrent_data(2)["hash"]}
+    assert await dao.get_all_torrents_hashes() == remaining  # noqa: S101
+    assert await dao.session.scalar(select(SymlinkModel.id)) is None  # noqa: S101
+    changes = await dao.get_changes_since(since)
+    assert changes.removed == [torrent_data(1)["hash"]]  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_link_files_to_media(dao: MediaDAO) -> None:
+    """Files are linked to the media info found at their symlink destination."""
+    await dao.create_torrents_with_files(
+        [
+            (
+                torrent_data(number),
+                [{"id": f"F{number}", "path": f"/{number}.mkv", "bytes": 1}],
+            )
+            for number in range(3)
+        ],
+    )
+    await dao.bulk_create_symlink_models(
+        (
+            {
+                "target": f"/rd/{number}.mkv",
+                "target_filename": f"{number}.mkv",
+                "destination": f"/lib/{number}.mkv",
+                "destination_filename": f"{number}.mkv",
+            },
+            f"F{number}",
+        )
+        for number in range(3)
+    )
+    dao.session.add(
+        RadarrMovieModel(
+            id="M1",
+            mediaType="movie",
+            movieId=1,
+            title="movie",
+            path="/lib/1.mkv",
+            fileId=1,
+        ),
+    )
+    await dao.session.commit()
+    since = await dao.get_change_seq()
+
+    result = await dao.link_files_to_media()
+
+    assert (result.linked, result.radarr, result.unlinked) == (1, 1, 2)  # noqa: S101
+    file_model = await dao.session.get(TorrentFileModel, "F1")
+    assert file_model is not None  # noqa: S101
+    await dao.session.refresh(file_model)
+    assert file_model.radarr_id == "M1"  # noqa: S101
+    changes = await dao.get_changes_since(since)
+    assert changes.updated == [torrent_data(1)["hash"]]  # noqa: S101
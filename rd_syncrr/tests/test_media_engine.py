@@ -0,0 +1,35 @@
+"""Tests for the shared media database engines."""
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from rd_syncrr.services.media_db.engine import create_media_engine
+from rd_syncrr.settings import settings
+
+
+@pytest.mark.anyio
+async def test_reader_engine_pragmas(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Connections use WAL and the reader ones cannot write."""
+    monkeypatch.setattr(settings, "environment", "prod")
+    monkeypatch.setattr(settings, "media_db_location", str(tmp_path))
+    writer = create_media_engine()
+    reader = create_media_engine(readonly=True)
+    try:
+        async with writer.begin() as connection:
+            await connection.execute(text("CREATE TABLE t (id INTEGER)"))
+        async with reader.connect() as connection:
+            journal_mode = await connection.scalar(text("PRAGMA journal_mode"))
+            busy_timeout = await connection.scalar(text("PRAGMA busy_timeout"))
+            with pytest.raises(OperationalError):
+                await connection.execute(text("INSERT INTO t VALUES (1)"))
+    finally:
+        await reader.dispose()
+        await writer.dispose()
+
+    assert journal_mode == "wal"  # noqa: S101
+    assert busy_timeout == settings.media_db_busy_timeout  # noqa: S101
@@ -0,0 +1,59 @@
+"""Tests for the Radarr/Sonarr media info processing."""
+from typing import Any, Optional
+
+import pytest
+
+from rd_syncrr.services.media_db.dao import MediaDAO
+from rd_syncrr.tasks.arrinfo_api import ArrPull
+from rd_syncrr.tasks.mediainfo_process import _get_radarr_new_movies
+
+
+def _movie(movie_id: int, file_id: int, path: str) -> dict[str, Any]:
+    return {
+        "mediaType": "movie",
+        "movieId": movie_id,
+        "title": f"Movie {movie_id}",
+        "relativePath": path.rsplit("/", 1)[-1],
+        "path": path,
+        "fileId": file_id,
+    }
+
+
+async def _seed(dao: MediaDAO) -> None:
+    for movie in (
+        _movie(1, 10, "/movies/one.mkv"),
+        _movie(1, 11, "/movies/one.cd2.mkv"),
+        _movie(2, 20, "/movies/two.mkv"),
+        _movie(3, 30, "/movies/three.mkv"),
+    ):
+        await dao.create_radarr_movie_model(movie)
+
+
+@pytest.mark.parametrize(
+    ("ids", "in_db"),
+    [({1, 3}, {10, 20, 30}), (None, {10, 11, 20, 30})],
+)
+@pytest.mark.anyio
+async def test_pulled_movies_are_renamed_and_removed(
+    dao: MediaDAO,
+    ids: Optional[set[int]],
+    in_db: set[int],
+) -> None:
+    """
+    The files gone from the pulled movies are removed, the renamed moved.
+
+    Movie 3 failed: its files are kept, and a whole catalog with failures
+    removes nothing.
+    """
+    await _seed(dao)
+    renamed = _movie(1, 10, "/movies/one (2001).mkv")
+    added = _movie(1, 12, "/movies/one.cd3.mkv")
+    pull = ArrPull([renamed, added], {3}, ids)
+
+    new_movies = await _get_radarr_new_movies(dao, pull)
+
+    assert new_movies == [added]  # noqa: S101
+    assert await dao.get_radarr_movies_file_id() == in_db  # noqa: S101
+    paths = await dao.get_radarr_movies_file_paths([1, 2])
+    assert paths[10] == "/movies/one (2001).mkv"  # noqa: S101
+    assert paths[20] == "/movies/two.mkv"  # noqa: S101
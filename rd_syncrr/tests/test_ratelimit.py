@@ -0,0 +1,58 @@
+"""Tests for the token bucket rate limiter."""
+import pytest
+
+from rd_syncrr.utils import ratelimit
+from rd_syncrr.utils.ratelimit import TokenBucket
+
+
+class FakeClock:
+    """Monotonic clock driven by the test."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    """
+    Replace the limiter clock with a fake one.
+
+    :param monkeypatch: pytest monkeypatch fixture.
+    :return: fake clock.
+    """
+    fake = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", fake)
+    return fake
+
+
+def test_no_wait_within_burst(clock: FakeClock) -> None:
+    """Requests within the burst size are never delayed."""
+    bucket = TokenBucket(rate_per_minute=60, burst=3)
+    assert [bucket._reserve() for _ in range(3)] == [0.0, 0.0, 0.0]  # noqa: S101
+
+
+def test_wait_when_budget_exhausted(clock: FakeClock) -> None:
+    """Requests over budget wait for the refill, queued in order."""
+    bucket = TokenBucket(rate_per_minute=60, burst=1)
+    assert bucket._reserve() == 0.0  # noqa: S101
+    assert bucket._reserve() == pytest.approx(1.0)  # noqa: S101
+    assert bucket._reserve() == pytest.approx(2.0)  # noqa: S101
+
+
+def test_refill_over_time(clock: FakeClock) -> None:
+    """Idle time refills the bucket up to its capacity."""
+    bucket = TokenBucket(rate_per_minute=60, burst=2)
+    bucket._reserve()
+    bucket._reserve()
+    clock.now += 10
+    assert [bucket._reserve() for _ in range(2)] == [0.0, 0.0]  # noqa: S101
+    assert bucket._reserve() == pytest.approx(1.0)  # noqa: S101
+
+
+def test_disabled_limiter(clock: FakeClock) -> None:
+    """A zero rate disables limiting."""
+    bucket = TokenBucket(rate_per_minute=0)
+    assert all(bucket._reserve() == 0.0 for _ in range(100))  # noqa: S101
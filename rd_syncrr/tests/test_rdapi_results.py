@@ -0,0 +1,29 @@
+"""Tests for the parsed responses of the RD client."""
+import ujson
+
+from rd_syncrr.utils.rdapi import RDResult, RDTorrent, RDTorrentFile
+
+ERROR_CODES = {"8": "Bad token (expired, invalid)"}
+
+
+def test_error_is_mapped_from_the_payload() -> None:
+    """The RD error code of an error response is mapped to its message."""
+    result = RDResult.parse(401, b'{"error_code": 8}', ERROR_CODES)
+    assert not result.ok  # noqa: S101
+    assert result.error_code == 8  # noqa: S101
+    assert result.error == ERROR_CODES["8"]  # noqa: S101
+    assert RDResult.parse(503, b"", ERROR_CODES).error == "HTTP error 503"  # noqa: S101
+
+
+def test_records_of_hot_endpoints() -> None:
+    """Pages and torrent infos are read into records, empty pages included."""
+    page = [{"id": "A", "filename": "a", "hash": "h", "status": "downloaded"}]
+    result = RDResult.parse(200, ujson.dumps(page).encode(), ERROR_CODES)
+    assert RDTorrent.from_page(result.data) == [  # noqa: S101
+        RDTorrent("A", "a", "h", "downloaded"),
+    ]
+    assert RDTorrent.from_page(RDResult.parse(204, b"", {}).data) == []  # noqa: S101
+    info = {"files": [{"path": "/a.mkv", "bytes": 1, "selected": 1}]}
+    assert RDTorrentFile.from_info(info) == [  # noqa: S101
+        RDTorrentFile("/a.mkv", 1, True),
+    ]
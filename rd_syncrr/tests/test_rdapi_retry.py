@@ -0,0 +1,57 @@
+"""Tests for the retries and the circuit breaker of the async RD client."""
+import httpx
+import pytest
+
+from rd_syncrr.settings import settings
+from rd_syncrr.utils.circuit_breaker import CircuitBreaker
+from rd_syncrr.utils.rdapi import AsyncRD, RDAPIError, async_rdapi
+
+
+@pytest.fixture
+def statuses(monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    """
+    Answer the RD requests with the given statuses, in order.
+
+    :param monkeypatch: pytest monkeypatch fixture.
+    :return: statuses of the next responses, then 200.
+    """
+    answers: list[int] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = answers.pop(0) if answers else 200
+        return httpx.Response(status, json=[] if status == 200 else {})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(async_rdapi, "get_http_client", lambda: client)
+    monkeypatch.setattr(async_rdapi, "circuit_breaker", CircuitBreaker(3, 60))
+    monkeypatch.setattr(settings, "rd_backoff_base", 0.0)
+    return answers
+
+
+@pytest.mark.anyio
+async def test_idempotent_calls_are_retried(statuses: list[int]) -> None:
+    """A GET is sent again after 5xx, a POST is not."""
+    rd = AsyncRD()
+    statuses.extend([503, 502])
+    assert (await rd.torrents.get()).data == []  # noqa: S101
+    statuses.append(503)
+    with pytest.raises(RDAPIError) as error:
+        await rd.torrents.add_magnet(magnet="0" * 40)
+    assert error.value.status_code == 503  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_circuit_opens_after_failures(statuses: list[int]) -> None:
+    """Failures in a row pause every call until the recovery time is over."""
+    rd = AsyncRD()
+    statuses.extend([500] * 3)
+    with pytest.raises(RDAPIError):
+        await rd.torrents.add_magnet(magnet="0" * 40)
+    with pytest.raises(RDAPIError):
+        await rd.torrents.add_magnet(magnet="0" * 40)
+    with pytest.raises(RDAPIError):
+        await rd.torrents.add_magnet(magnet="0" * 40)
+    assert async_rdapi.circuit_breaker.state == CircuitBreaker.OPEN  # noqa: S101
+    with pytest.raises(RDAPIError, match="unavailable"):
+        await rd.torrents.get()
+    assert statuses == []  # noqa: S101
@@ -0,0 +1,22 @@
+"""Tests for the set difference stage."""
+from operator import itemgetter
+
+from rd_syncrr.utils.set_diff import diff_by_key
+
+
+def test_diff_reports_added_and_removed() -> None:
+    """Unknown items are added in order and missing keys are removed."""
+    items = [{"id": 3}, {"id": 1}, {"id": 4}, {"id": 3}]
+
+    diff = diff_by_key(items, frozenset({1, 2}), itemgetter("id"))
+
+    assert diff.added == [{"id": 3}, {"id": 4}]  # noqa: S101
+    assert diff.removed == frozenset({2})  # noqa: S101
+
+
+def test_diff_against_empty_store() -> None:
+    """Every item is added when nothing is stored yet."""
+    diff = diff_by_key([{"id": 1}], frozenset(), itemgetter("id"))
+
+    assert diff.added == [{"id": 1}]  # noqa: S101
+    assert not diff.removed  # noqa: S101
@@ -0,0 +1,108 @@
+"""Tests for the symlinks processing."""
+import os
+from pathlib import Path
+
+import pytest
+
+from rd_syncrr.services.media_db.dao import MediaDAO
+from rd_syncrr.services.media_db.models.media_model import TorrentFileModel
+from rd_syncrr.tasks import symlink_process
+from rd_syncrr.tasks.symlink_process import _pick_torrent_file, _update_symlink_db
+from rd_syncrr.tests.conftest import torrent_data
+
+
+@pytest.mark.anyio
+async def test_symlinks_match_torrent_files_by_path(dao: MediaDAO) -> None:
+    """Symlinks are linked to the file at their target path, not its namesake."""
+    await dao.create_torrents_with_files(
+        [
+            (torrent_data(1), [{"id": "F1", "path": "/Season 1/e01.mkv", "bytes": 1}]),
+            (torrent_data(2), [{"id": "F2", "path": "/Season 1/e01.mkv", "bytes": 1}]),
+        ],
+    )
+    assert await dao.index_torrent_file_paths() == 2  # noqa: S101
+
+    added, missed = await _update_symlink_db(
+        dao,
+        [
+            {
+                "target": "/mnt/rd/__all__/torrent 2/Season 1/e01.mkv",
+                "target_filename": "e01.mkv",
+                "destination": "/lib/show/e01.mkv",
+                "destination_filename": "e01.mkv",
+            },
+            {
+                "target": "/mnt/rd/__all__/torrent 3/Season 1/e01.mkv",
+                "target_filename": "e01.mkv",
+                "destination": "/lib/other/e01.mkv",
+                "destination_filename": "e01.mkv",
+            },
+        ],
+    )
+
+    assert added == 1  # noqa: S101
+    assert [link["destination"] for link in missed] == [  # noqa: S101
+        "/lib/other/e01.mkv",
+    ]
+    file_model = await dao.session.get(TorrentFileModel, "F2")
+    assert file_model is not None  # noqa: S101
+    assert file_model.symlink_id is not None  # noqa: S101
+    await dao.delete_torrents_by_hash([torrent_data(2)["hash"]])
+    assert await dao.index_torrent_file_paths() == 1  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_scan_adds_symlinks_sharing_a_filename(
+    dao: MediaDAO,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A scanned link is new unless its full destination path is known."""
+    await dao.create_torrents_with_files(
+        [
+            (torrent_data(n), [{"id": f"F{n}", "path": "/e01.mkv", "bytes": 1}])
+            for n in (1, 2)
+        ],
+    )
+    for n in (1, 2):
+        (tmp_path / f"show {n}").mkdir()
+        os.symlink(
+            f"/mnt/rd/__all__/torrent {n}/e01.mkv",
+            tmp_path / f"show {n}" / "e01.mkv",
+        )
+    monkeypatch.setattr(symlink_process.settings, "symlink_path", str(tmp_path))
+    first = str(tmp_path / "show 1" / "e01.mkv")
+    second = str(tmp_path / "show 2" / "e01.mkv")
+    assert await dao.index_torrent_file_paths() == 2  # noqa: S101
+    added, _ = await _update_symlink_db(
+        dao,
+        [
+            {
+                "target": "/mnt/rd/__all__/torrent 1/e01.mkv",
+                "target_filename": "e01.mkv",
+                "destination": first,
+                "destination_filename": "e01.mkv",
+            },
+        ],
+    )
+    assert added == 1  # noqa: S101
+
+    await symlink_process.process_symlink(dao)
+
+    targets = await dao.get_symlink_targets_by_destination([first, second])
+    assert targets == {  # noqa: S101
+        first: "/mnt/rd/__all__/torrent 1/e01.mkv",
+        second: "/mnt/rd/__all__/torrent 2/e01.mkv",
+    }
+
+
+@pytest.mark.anyio
+async def test_pick_torrent_file_by_target_size(tmp_path: Path) -> None:
+    """Files sharing a path are told apart by the size of the target."""
+    target = tmp_path / "e01.mkv"
+    target.write_bytes(b"12345")
+    files = [("F1", 1), ("F2", 5)]
+
+    assert await _pick_torrent_file(str(target), files) == "F2"  # noqa: S101
+    missing = str(tmp_path / "missing.mkv")
+    assert await _pick_torrent_file(missing, files) == "F1"  # noqa: S101
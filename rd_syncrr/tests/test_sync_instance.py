@@ -0,0 +1,141 @@
+"""Tests for the sync of the torrents of another instance."""
+from typing import Any, Optional
+
+import pytest
+
+from rd_syncrr.tasks import sync_instance
+from rd_syncrr.tasks.torrents_process import TORRENTS_NOT_DOWNLOADED_STATE
+from rd_syncrr.utils.rdapi import RDAPIError, RDResult
+
+
+class FakeDAO:
+    """DAO holding the torrent hashes and the states."""
+
+    def __init__(self, hashes: frozenset[str], states: dict[str, str]) -> None:
+        self.hashes = hashes
+        self.states = states
+
+    async def get_all_torrents_hashes(self) -> frozenset[str]:
+        return self.hashes
+
+    async def get_state(self, key: str) -> Optional[str]:
+        return self.states.get(key)
+
+    async def set_state(self, key: str, value: str) -> None:
+        self.states[key] = value
+
+
+class FakeInstance:
+    """Changes feed of the other instance, two changes per page."""
+
+    def __init__(self, hashes: list[str], floor: int = 0) -> None:
+        self.hashes = hashes
+        self.floor = floor
+        self.calls: list[int] = []
+
+    def changes(self, since: int) -> dict[str, Any]:
+        self.calls.append(since)
+        seqs = [seq for seq in range(1, len(self.hashes) + 1) if seq > since][:2]
+        return {
+            "since": since,
+            "seq": seqs[-1] if seqs else since,
+            "head": len(self.hashes),
+            "floor": self.floor,
+            "torrents": [
+                {"torrent": f"torrent {seq}", "hash": self.hashes[seq - 1]}
+                for seq in seqs
+            ],
+            "removed": [],
+        }
+
+
+class FakeRD:
+    """RD torrents endpoints, failing for some hashes."""
+
+    def __init__(self, errors: dict[str, RDAPIError]) -> None:
+        self.errors = errors
+        self.added: list[str] = []
+
+    async def add_magnet(self, magnet: str) -> RDResult:
+        if magnet in self.errors:
+            raise self.errors[magnet]
+        self.added.append(magnet)
+        return RDResult(201, {"id": f"ID{magnet}"})
+
+    async def select_files(self, id: str, files: str) -> RDResult:  # noqa: A002
+        return RDResult(204, None)
+
+
+def _setup(
+    monkeypatch: pytest.MonkeyPatch,
+    instance: FakeInstance,
+    errors: Optional[dict[str, RDAPIError]] = None,
+) -> FakeRD:
+    rd = FakeRD(errors or {})
+    monkeypatch.setattr(sync_instance.settings, "syncrr_host", "https://other")
+    monkeypatch.setattr(sync_instance, "_get_synced_changes", instance.changes)
+    monkeypatch.setattr(sync_instance.rd_client, "torrents", rd)
+    return rd
+
+
+WATERMARK = sync_instance.SYNC_WATERMARK_STATE.format(host="https://other")
+
+
+@pytest.mark.anyio
+async def test_sync_pages_and_skips_known_torrents(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Changes are read page by page, torrents on the account are not added."""
+    instance = FakeInstance(["a", "b", "c", "d", "e"])
+    rd = _setup(monkeypatch, instance)
+    states = {TORRENTS_NOT_DOWNLOADED_STATE: '["c"]'}
+    dao = FakeDAO(frozenset({"a"}), states)
+
+    await sync_instance.sync_latest_torrents(dao)  # type: ignore[arg-type]
+
+    assert instance.calls == [0, 2, 4]  # noqa: S101
+    assert rd.added == ["b", "d", "e"]  # noqa: S101
+    assert states[WATERMARK] == "5"  # noqa: S101
+    assert states[TORRENTS_NOT_DOWNLOADED_STATE] == '["b","c","d","e"]'  # noqa: S101
+
+
+@pytest.mark.parametrize(("watermark", "floor"), [("9", 0), ("1", 2)])
+@pytest.mark.anyio
+async def test_sync_restarts_after_reset_or_compaction(
+    monkeypatch: pytest.MonkeyPatch,
+    watermark: str,
+    floor: int,
+) -> None:
+    """A reset or compacted feed is synced again from 0."""
+    instance = FakeInstance(["a", "b", "c"], floor=floor)
+    rd = _setup(monkeypatch, instance)
+    dao = FakeDAO(frozenset(), {WATERMARK: watermark})
+
+    await sync_instance.sync_latest_torrents(dao)  # type: ignore[arg-type]
+
+    assert instance.calls == [int(watermark), 0, 2]  # noqa: S101
+    assert rd.added == ["a", "b", "c"]  # noqa: S101
+    assert dao.states[WATERMARK] == "3"  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_sync_skips_refused_torrents_stops_on_errors(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A torrent refused by RD is skipped, RD unavailable stops the sync."""
+    instance = FakeInstance(["a", "b", "c", "d"])
+    rd = _setup(
+        monkeypatch,
+        instance,
+        {
+            "a": RDAPIError("Infringing file", "/torrents/addMagnet", 451, 35),
+            "c": RDAPIError("Service unavailable", "/torrents/addMagnet", 503, 25),
+        },
+    )
+    dao = FakeDAO(frozenset(), {})
+
+    with pytest.raises(RDAPIError):
+        await sync_instance.sync_latest_torrents(dao)  # type: ignore[arg-type]
+
+    assert rd.added == ["b"]  # noqa: S101
+    assert dao.states[WATERMARK] == "2"  # noqa: S101
@@ -0,0 +1,164 @@
+"""Tests for the probed RD torrents listing."""
+from typing import Any, Optional
+
+import anyio
+import pytest
+
+from rd_syncrr.tasks import torrents_process
+from rd_syncrr.utils.rdapi import RDResult, RDTorrent, RDTorrentFile
+
+
+class FakeDAO:
+    """DAO holding the listing head state only."""
+
+    def __init__(self, head: Optional[str]) -> None:
+        self.head = head
+
+    async def get_state(self, key: str) -> Optional[str]:
+        return self.head
+
+
+class FakeListing:
+    """RD listing, newest torrent first, recording the pages read."""
+
+    def __init__(self, count: int) -> None:
+        self.torrents = [
+            {
+                "id": f"T{number}",
+                "filename": f"torrent {number}",
+                "hash": f"{number:040x}",
+                "status": "downloaded",
+            }
+            for number in range(count, 0, -1)
+        ]
+        self.pages: list[tuple[int, int]] = []
+
+    async def get(self, limit: int, page: int, **_: Any) -> RDResult:
+        self.pages.append((limit, page))
+        data = self.torrents[(page - 1) * limit : page * limit]
+        return RDResult(200 if data else 204, data, total_count=len(self.torrents))
+
+
+@pytest.fixture
+def listing(monkeypatch: pytest.MonkeyPatch) -> FakeListing:
+    """
+    Serve the RD listing of 2500 torrents.
+
+    :param monkeypatch: pytest monkeypatch fixture.
+    :return: fake listing.
+    """
+    fake = FakeListing(2500)
+    monkeypatch.setattr(torrents_process.rdapi.torrents, "get", fake.get)
+    return fake
+
+
+@pytest.mark.anyio
+async def test_unchanged_listing_is_skipped(listing: FakeListing) -> None:
+    """A listing with the head of the last run costs a single request."""
+    head, data, _ = await torrents_process._list_torrents(
+        FakeDAO("2500:T2500"),  # type: ignore[arg-type]
+        frozenset(item["hash"] for item in listing.torrents),
+    )
+    assert (head, data) == ("2500:T2500", None)  # noqa: S101
+    assert listing.pages == [(1, 1)]  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_only_new_torrents_are_listed(listing: FakeListing) -> None:
+    """New torrents are read from the first pages, removals need every page."""
+    known = frozenset(item["hash"] for item in listing.torrents[3:])
+    dao = FakeDAO("2497:T2497")
+    _, data, complete = await torrents_process._list_torrents(dao, known)  # type: ignore[arg-type]
+    assert not complete  # noqa: S101
+    assert data == RDTorrent.from_page(listing.torrents[:3])  # noqa: S101
+    assert listing.pages == [(1, 1), (1000, 1)]  # noqa: S101
+
+    del listing.torrents[-1]
+    _, data, complete = await torrents_process._list_torrents(dao, known)  # type: ignore[arg-type]
+    assert complete  # noqa: S101
+    assert len(data or ()) == 2499  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_full_listing_keeps_shifted_torrents_once(
+    listing: FakeListing,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A torrent added while paging shifts the pages, no torrent is lost or doubled."""
+    get = listing.get
+
+    async def get_then_add(limit: int, page: int, **options: Any) -> RDResult:
+        result = await get(limit, page, **options)
+        if page == 1:
+            listing.torrents.insert(0, FakeListing(2501).torrents[0])
+        return result
+
+    monkeypatch.setattr(torrents_process.rdapi.torrents, "get", get_then_add)
+    torrents = await torrents_process._get_all_torrents()
+    assert [item.id for item in torrents] == [  # noqa: S101
+        f"T{number}" for number in range(2500, 0, -1)
+    ]
+    assert sorted(listing.pages) == [(1000, 1), (1000, 2), (1000, 3)]  # noqa: S101
+
+
+@pytest.mark.anyio
+async def test_failing_writer_keeps_draining(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A failing batch write does not leave the fetchers blocked on the queue."""
+    written: list[int] = []
+
+    async def get_files_info(torrent_id: str) -> list[RDTorrentFile]:
+        return [RDTorrentFile(f"/{torrent_id}.mkv", 1, True)]
+
+    async def add_torrents(_: Any, batch: list[Any]) -> None:
+        written.append(len(batch))
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(torrents_process.settings, "media_db_batch_size", 1)
+    monkeypatch.setattr(torrents_process, "get_manifest_cache", lambda: None)
+    monkeypatch.setattr(torrents_process, "_get_files_info", get_files_info)
+    monkeypatch.setattr(torrents_process, "_add_torrents_to_database", add_torrents)
+    torrents = [
+        RDTorrent(f"T{number}", f"torrent {number}", f"{number:040x}", "downloaded")
+        for number in range(5)
+    ]
+    with anyio.fail_after(5):
+        await torrents_process._process_new_torrents(None, torrents)  # type: ignore[arg-type]
+    assert written == [1] * 5  # noqa: S101
+
+
+class StateDAO:
+    """DAO holding the torrent hashes and the states."""
+
+    def __init__(self, hashes: frozenset[str]) -> None:
+        self.hashes = hashes
+        self.states: dict[str, str] = {}
+
+    async def get_all_torrents_hashes(self) -> frozenset[str]:
+        return self.hashes
+
+    async def get_state(self, key: str) -> Optional[str]:
+        return self.states.get(key)
+
+    async def set_state(self, key: str, value: str) -> None:
+        self.states[key] = value
+
+
+@pytest.mark.parametrize(
+    ("status", "head"),
+    [("error", "2500:T2500"), ("dead", "2500:T2500"), ("downloading", "")],
+)
+@pytest.mark.anyio
+async def test_only_pending_torrents_clear_the_head(
+    listing: FakeListing,
+    status: str,
+    head: str,
+) -> None:
+    """A torrent failed for good does not force a whole listing every run."""
+    listing.torrents[0]["status"] = status
+    dao = StateDAO(frozenset(item["hash"] for item in listing.torrents[1:]))
+
+    await torrents_process._update_torrent_db(dao)  # type: ignore[arg-type]
+
+    assert dao.states[torrents_process.TORRENTS_HEAD_STATE] == head  # noqa: S101
+    not_downloaded = await torrents_process.get_not_downloaded_hashes(dao)  # type: ignore[arg-type]
+    assert not_downloaded == {listing.torrents[0]["hash"]}  # noqa: S101
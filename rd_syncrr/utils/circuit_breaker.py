@@ -0,0 +1,107 @@
+"""Circuit breaker pausing the calls to a degraded API."""
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker shared by every caller of an API.
+
+    The circuit opens after ``failure_threshold`` failures in a row and stays
+    open ``recovery_time`` seconds, callers are refused in the meantime. Once
+    that time is over a single probe call goes through, the circuit closes when
+    it succeeds and opens again when it fails. The API may also ask for a pause,
+    with a Retry-After header, which opens the circuit for that long.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, recovery_time: float) -> None:
+        """
+        Create a circuit breaker.
+
+        :param failure_threshold: failures in a row opening the circuit.
+        :param recovery_time: seconds the circuit stays open after failures.
+        """
+        self.failure_threshold = max(failure_threshold, 1)
+        self.recovery_time = recovery_time
+        self._failures = 0
+        self._opened_until = 0.0
+        # a probe not reported back in time is given up
+        self._probing_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state of the circuit."""
+        with self._lock:
+            if time.monotonic() < self._opened_until:
+                return self.OPEN
+            if self._failures >= self.failure_threshold:
+                return self.HALF_OPEN
+            return self.CLOSED
+
+    @property
+    def failing(self) -> bool:
+        """Whether the circuit opened because of failures, not for a pause."""
+        with self._lock:
+            return self._failures >= self.failure_threshold
+
+    def retry_after(self) -> float:
+        """
+        Get the time left before the circuit lets calls through again.
+
+        :return: seconds to wait, 0 when calls may be made.
+        """
+        with self._lock:
+            return max(self._opened_until - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        """
+        Tell whether a call may be made now.
+
+        When the circuit is half open only the first caller is allowed, as the
+        probe, until its outcome is recorded.
+
+        :return: True when the call may be made.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._opened_until:
+                return False
+            if self._failures < self.failure_threshold:
+                return True
+            if now < self._probing_until:
+                return False
+            self._probing_until = now + self.recovery_time
+            return True
+
+    def record_success(self) -> None:
+        """Record a successful call, closing the circuit."""
+        with self._lock:
+            self._failures = 0
+            self._probing_until = 0.0
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit past the threshold."""
+        with self._lock:
+            self._failures += 1
+            self._probing_until = 0.0
+            if self._failures >= self.failure_threshold:
+                self._open(self.recovery_time)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Open the circuit for some time, as asked by the API.
+
+        :param seconds: seconds before calls may be made again.
+        """
+        with self._lock:
+            self._probing_until = 0.0
+            self._open(seconds)
+
+    def _open(self, seconds: float) -> None:
+        """Open the circuit for at least some seconds, the lock being held."""
+        self._opened_until = max(self._opened_until, time.monotonic() + seconds)
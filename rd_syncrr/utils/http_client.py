@@ -0,0 +1,38 @@
+"""Process wide pooled HTTP client."""
+from typing import Optional
+
+import httpx
+
+from rd_syncrr.settings import settings
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared keep-alive HTTP client.
+
+    The client is created on first use so it is bound to the running event loop,
+    and is reused by every async API wrapper for the lifetime of the process.
+
+    :return: pooled async HTTP client.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+            timeout=settings.http_timeout,
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
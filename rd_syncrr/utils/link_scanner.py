@@ -0,0 +1,329 @@
+"""Parallel scanner of the symbolic links of a library."""
+import asyncio
+import os
+import threading
+import time
+from collections.abc import AsyncGenerator, Callable, Iterable, Mapping
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass
+from typing import Optional
+
+from rd_syncrr.logging import logger
+from rd_syncrr.settings import settings
+
+SymlinkInfo = dict[str, str]
+
+
+# directories modified this close to the scan may change again within the
+# same mtime tick, they are listed again next time
+_RACY_MTIME_NS = 2_000_000_000
+
+
+class _ScanStoppedError(Exception):
+    """Raised in the walkers when the consumer stopped reading."""
+
+
+@dataclass(frozen=True)
+class DirectoryState:
+    """State of a directory when it was last listed."""
+
+    mtime_ns: int
+    inode: int
+    # names of the sub directories
+    subdirs: tuple[str, ...]
+
+
+class DirectoryIndex:
+    """
+    Directories of the previous scan, to skip listing unchanged directories.
+
+    The mtime of a directory changes when an entry is added, removed or
+    renamed in it, so a directory with the same mtime and inode as last time
+    holds the same symbolic links. Its sub directories are still visited, from
+    the names recorded last time, as they may have changed on their own.
+    """
+
+    def __init__(self, entries: Mapping[str, DirectoryState], full: bool = False):
+        """
+        Create a directory index.
+
+        :param entries: directories of the previous scan by path.
+        :param full: list every directory, the index is only refreshed.
+        """
+        self.entries = entries
+        self.full = full
+        self.updates: dict[str, DirectoryState] = {}
+        self._seen: set[str] = set()
+        self._unchanged: set[str] = set()
+        self._stats: dict[str, os.stat_result] = {}
+        self._racy_after_ns = time.time_ns() - _RACY_MTIME_NS
+
+    @property
+    def unchanged(self) -> int:
+        """Number of directories skipped as unchanged."""
+        return len(self._unchanged)
+
+    @property
+    def removed(self) -> set[str]:
+        """Directories of the previous scan not found anymore."""
+        return set(self.entries) - self._seen
+
+    def unchanged_subdirs(self, path: str) -> Optional[list[str]]:
+        """
+        Get the sub directories of a directory unchanged since the last scan.
+
+        :param path: directory path.
+        :return: sub directories paths or None if the directory must be listed.
+        """
+        stat = os.stat(path, follow_symlinks=False)
+        self._seen.add(path)
+        state = self.entries.get(path)
+        if (
+            not self.full
+            and state is not None
+            and state.mtime_ns == stat.st_mtime_ns
+            and state.inode == stat.st_ino
+        ):
+            self._unchanged.add(path)
+            return [os.path.join(path, name) for name in state.subdirs]
+        self._stats[path] = stat
+        return None
+
+    def record(self, path: str, subdirs: list[str]) -> None:
+        """
+        Record a listed directory.
+
+        :param path: directory path.
+        :param subdirs: sub directories paths.
+        """
+        stat = self._stats.pop(path, None)
+        if stat is None or stat.st_mtime_ns > self._racy_after_ns:
+            return
+        self.updates[path] = DirectoryState(
+            mtime_ns=stat.st_mtime_ns,
+            inode=stat.st_ino,
+            subdirs=tuple(os.path.basename(subdir) for subdir in subdirs),
+        )
+
+    def forget(self, paths: Iterable[str]) -> None:
+        """
+        Drop directories from the index, to list them again next scan.
+
+        :param paths: directory paths.
+        """
+        for path in paths:
+            self.updates.pop(path, None)
+            # their entry of the previous scan is removed
+            self._seen.discard(path)
+
+
+def read_symlink(link_path: str) -> Optional[SymlinkInfo]:
+    """
+    Get the information of a symbolic link.
+
+    :param link_path: path of the symbolic link.
+    :return: symbolic link information or None if it could not be read.
+    """
+    try:
+        target = os.readlink(link_path)
+    except OSError as e:
+        logger.error(f"Error reading symlink: {link_path} - {e!s}")
+        return None
+    target_path = os.path.abspath(os.path.join(os.path.dirname(link_path), target))
+    return {
+        "target": target_path,
+        "target_filename": os.path.basename(target_path),
+        "destination": link_path,
+        "destination_filename": os.path.basename(link_path),
+    }
+
+
+def _list_directory(directory: str) -> tuple[list[SymlinkInfo], list[str]]:
+    """
+    List the file symbolic links and the sub directories of a directory.
+
+    Entry types come from os.scandir, so only symbolic links cost an extra
+    stat, to skip the ones pointing to a directory.
+
+    :param directory: directory path.
+    :return: symbolic links information and sub directories paths.
+    """
+    symlinks: list[SymlinkInfo] = []
+    subdirs: list[str] = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_symlink():
+                if entry.is_dir():
+                    continue
+                symlink_info = read_symlink(entry.path)
+                if symlink_info is not None:
+                    symlinks.append(symlink_info)
+            elif entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+    return symlinks, subdirs
+
+
+def _scan_directory(
+    directory: str,
+    index: Optional[DirectoryIndex],
+) -> tuple[list[SymlinkInfo], list[str]]:
+    """
+    List a directory, unless the index knows it did not change.
+
+    :param directory: directory path.
+    :param index: index of the previous scan.
+    :return: symbolic links information and sub directories paths.
+    """
+    if index is not None:
+        subdirs = index.unchanged_subdirs(directory)
+        if subdirs is not None:
+            return [], subdirs
+    symlinks, subdirs = _list_directory(directory)
+    if index is not None:
+        index.record(directory, subdirs)
+    return symlinks, subdirs
+
+
+def scan_tree(
+    path: str,
+    emit: Callable[[list[SymlinkInfo]], None],
+    batch_size: int,
+    recursive: bool = True,
+    index: Optional[DirectoryIndex] = None,
+) -> None:
+    """
+    Walk a directory and emit its file symbolic links in batches.
+
+    Directories reached through a symbolic link are not walked.
+
+    :param path: directory to walk.
+    :param emit: callable receiving each batch.
+    :param batch_size: number of symbolic links per batch.
+    :param recursive: walk the sub directories too.
+    :param index: index of the previous scan, unchanged directories are skipped.
+    """
+    batch: list[SymlinkInfo] = []
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            symlinks, subdirs = _scan_directory(directory, index)
+        except OSError as e:
+            logger.error(f"Error scanning directory: {directory} - {e!s}")
+            continue
+        if recursive:
+            stack.extend(subdirs)
+        batch.extend(symlinks)
+        while len(batch) >= batch_size:
+            emit(batch[:batch_size])
+            batch = batch[batch_size:]
+    if batch:
+        emit(batch)
+
+
+class _Walker:
+    """Walk directories on worker threads and hand batches to the event loop."""
+
+    def __init__(
+        self,
+        batch_size: int,
+        queue_size: int,
+        index: Optional[DirectoryIndex],
+    ) -> None:
+        self.batch_size = batch_size
+        self.index = index
+        self.loop = asyncio.get_running_loop()
+        # a None item tells a walk is over
+        self.queue: asyncio.Queue[Optional[list[SymlinkInfo]]] = asyncio.Queue(
+            maxsize=queue_size,
+        )
+        self.stopped = threading.Event()
+
+    def put(self, item: Optional[list[SymlinkInfo]]) -> None:
+        """Wait for room in the queue, unless the consumer is gone."""
+        if self.stopped.is_set():
+            raise _ScanStoppedError
+        try:
+            future = asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop)
+            while True:
+                try:
+                    return future.result(timeout=0.1)
+                except TimeoutError:
+                    if self.stopped.is_set():
+                        if not self.loop.is_closed():
+                            future.cancel()
+                        raise _ScanStoppedError from None
+        except RuntimeError as e:
+            # the event loop was closed
+            raise _ScanStoppedError from e
+
+    def walk(self, folder: str, recursive: bool) -> None:
+        """Walk a folder, then tell the walk is over."""
+        try:
+            scan_tree(
+                folder,
+                self.put,
+                self.batch_size,
+                recursive=recursive,
+                index=self.index,
+            )
+            self.put(None)
+        except _ScanStoppedError:
+            pass
+
+
+async def scan_symlinks(
+    path: str,
+    batch_size: Optional[int] = None,
+    index: Optional[DirectoryIndex] = None,
+) -> AsyncGenerator[list[SymlinkInfo], None]:
+    """
+    Scan a library for symbolic links, walking its top level folders in parallel.
+
+    The walk runs on a pool of symlink_scan_workers threads and the results are
+    streamed back in batches. The queue between the threads and the event loop
+    is bounded, so a slow consumer pauses the walk instead of buffering the
+    whole library.
+
+    :param path: library directory.
+    :param batch_size: number of symbolic links per batch, media_db_batch_size
+        by default.
+    :param index: index of the previous scan, unchanged directories are skipped
+        and the index is updated in place.
+    :return: async iterator of symbolic links batches.
+    """
+    batch_size = max(batch_size or settings.media_db_batch_size, 1)
+    workers = max(settings.symlink_scan_workers, 1)
+    try:
+        with os.scandir(path) as entries:
+            folders = [
+                entry.path for entry in entries if entry.is_dir(follow_symlinks=False)
+            ]
+    except OSError as e:
+        logger.error(f"Error scanning directory: {path} - {e!s}")
+        return
+
+    walker = _Walker(batch_size, queue_size=workers * 2, index=index)
+    # symbolic links at the top level are scanned along the folders
+    jobs = [(path, False)] + [(folder, True) for folder in folders]
+    executor = ThreadPoolExecutor(
+        max_workers=workers,
+        thread_name_prefix="link_scanner",
+    )
+    try:
+        for job in jobs:
+            executor.submit(walker.walk, *job)
+        pending = len(jobs)
+        while pending:
+            batch = await walker.queue.get()
+            if batch is None:
+                pending -= 1
+                continue
+            yield batch
+            await asyncio.sleep(0)
+    finally:
+        walker.stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        # release the walkers waiting for room in the queue
+        while not walker.queue.empty():
+            walker.queue.get_nowait()
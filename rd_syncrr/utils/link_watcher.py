@@ -0,0 +1,278 @@
+"""Watcher of the symbolic links of a library, based on Linux inotify."""
+import asyncio
+import contextlib
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass, field
+from typing import Optional
+
+from rd_syncrr.logging import logger
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_WATCH_MASK = (
+    IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ONLYDIR | IN_DONT_FOLLOW
+)
+# wd, mask, cookie and length of the name following the header
+_EVENT = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+@dataclass
+class LinkChanges:
+    """Entries of a library changed since the last batch of changes."""
+
+    # paths of the entries created or moved in
+    created: list[str] = field(default_factory=list)
+    # paths of the entries deleted or moved out
+    removed: list[str] = field(default_factory=list)
+    # directories moved out, with everything below them
+    removed_dirs: list[str] = field(default_factory=list)
+    # events were lost, the library must be scanned
+    overflow: bool = False
+
+
+def _load_libc() -> Optional[ctypes.CDLL]:
+    """
+    Load the C library exposing the inotify functions.
+
+    :return: C library or None if inotify is not available.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class LinkWatcher:
+    """
+    Watch a library for created and removed entries.
+
+    Every directory of the library is watched. Events are coalesced per path,
+    the last event of a path wins, until the consumer takes them. The pending
+    paths are bounded, past max_pending they are dropped and the batch only
+    tells that the library must be scanned.
+    """
+
+    def __init__(self, path: str, max_pending: int) -> None:
+        """
+        Create a library watcher.
+
+        :param path: library directory.
+        :param max_pending: largest number of paths waiting for the consumer.
+        """
+        self.path = path
+        self.max_pending = max(max_pending, 1)
+        self._libc = _load_libc()
+        self._fd = -1
+        self._paths: dict[int, str] = {}
+        # True for a path created, False for a path removed
+        self._pending: dict[str, bool] = {}
+        self._removed_dirs: set[str] = set()
+        self._overflow = False
+        self._ready = asyncio.Event()
+
+    async def start(self) -> None:
+        """
+        Start watching the library.
+
+        The directories are added on a worker thread, events happening in the
+        meantime are queued by the kernel.
+
+        :raises OSError: when inotify is not available or the library cannot be
+            watched.
+        """
+        if self._libc is None or not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._fd = fd
+        try:
+            await asyncio.to_thread(self._watch_tree, self.path, False)
+        except OSError:
+            self.close()
+            raise
+        if not self._paths:
+            self.close()
+            raise OSError(errno.ENOENT, "Library cannot be watched", self.path)
+        asyncio.get_running_loop().add_reader(self._fd, self._read_events)
+        logger.info(f"Watching {len(self._paths)} directories of {self.path}")
+
+    def close(self) -> None:
+        """Stop watching the library."""
+        if self._fd < 0:
+            return
+        with contextlib.suppress(RuntimeError):
+            asyncio.get_running_loop().remove_reader(self._fd)
+        os.close(self._fd)
+        self._fd = -1
+        self._paths.clear()
+
+    async def changes(self, delay: float) -> AsyncGenerator[LinkChanges, None]:
+        """
+        Get the changes of the library, batch by batch.
+
+        :param delay: seconds to wait after a first event, so the events of a
+            whole import land in the same batch.
+        :return: async generator of changes.
+        """
+        while self._fd >= 0:
+            await self._ready.wait()
+            await asyncio.sleep(delay)
+            self._ready.clear()
+            changes = LinkChanges(
+                created=[path for path, exists in self._pending.items() if exists],
+                removed=[path for path, exists in self._pending.items() if not exists],
+                removed_dirs=sorted(self._removed_dirs),
+                overflow=self._overflow,
+            )
+            self._pending.clear()
+            self._removed_dirs.clear()
+            self._overflow = False
+            yield changes
+
+    def _add_watch(self, directory: str) -> None:
+        """
+        Watch a directory.
+
+        :param directory: directory path.
+        :raises OSError: when the directory cannot be watched.
+        """
+        assert self._libc is not None  # noqa: S101
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), directory)
+        self._paths[wd] = directory
+
+    def _watch_tree(self, path: str, created: bool) -> None:
+        """
+        Watch a directory and all its sub directories.
+
+        :param path: directory path.
+        :param created: record the entries found as created.
+        :raises OSError: when the inotify watches limit is reached.
+        """
+        stack = [path]
+        while stack:
+            directory = stack.pop()
+            try:
+                self._add_watch(directory)
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif created:
+                            self._record(entry.path, True)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    # raise fs.inotify.max_user_watches to watch a bigger library
+                    raise
+                logger.error(f"Error watching directory: {directory} - {e!s}")
+
+    def _unwatch_tree(self, path: str) -> None:
+        """
+        Forget the watches of a directory moved away and of its sub directories.
+
+        :param path: former directory path.
+        """
+        prefix = f"{path}{os.sep}"
+        for wd, directory in list(self._paths.items()):
+            if directory == path or directory.startswith(prefix):
+                del self._paths[wd]
+                assert self._libc is not None  # noqa: S101
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _record(self, path: str, exists: bool) -> None:
+        """
+        Record the last known state of a path.
+
+        :param path: entry path.
+        :param exists: whether the entry was created or removed.
+        """
+        if self._overflow:
+            return
+        if path not in self._pending and len(self._pending) >= self.max_pending:
+            logger.warning(
+                f"More than {self.max_pending} symlinks changes pending, dropping them",
+            )
+            self._overflow = True
+            self._pending.clear()
+            self._removed_dirs.clear()
+            return
+        self._pending[path] = exists
+        self._ready.set()
+
+    def _read_events(self) -> None:
+        """Read the pending inotify events."""
+        while self._fd >= 0:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                self._handle_event(wd, mask, name)
+
+    def _handle_event(self, wd: int, mask: int, name: str) -> None:
+        """
+        Handle an inotify event.
+
+        :param wd: watch descriptor of the directory.
+        :param mask: event mask.
+        :param name: name of the entry in the directory.
+        """
+        if mask & IN_Q_OVERFLOW:
+            logger.warning("Symlinks events lost by the kernel")
+            self._overflow = True
+            self._ready.set()
+            return
+        if mask & IN_IGNORED:
+            self._paths.pop(wd, None)
+            return
+        directory = self._paths.get(wd)
+        if directory is None:
+            return
+        path = os.path.join(directory, name)
+        if not mask & IN_ISDIR:
+            self._record(path, bool(mask & (IN_CREATE | IN_MOVED_TO)))
+        elif mask & (IN_CREATE | IN_MOVED_TO):
+            try:
+                self._watch_tree(path, True)
+            except OSError as e:
+                logger.error(f"Error watching directory: {path} - {e!s}")
+                self._overflow = True
+                self._ready.set()
+        elif mask & IN_MOVED_FROM:
+            self._unwatch_tree(path)
+            if not self._overflow:
+                self._removed_dirs.add(path)
+                self._ready.set()
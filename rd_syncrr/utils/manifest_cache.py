@@ -0,0 +1,113 @@
+"""On-disk cache of the torrent file manifests, keyed by info hash."""
+import os
+import sqlite3
+import threading
+from collections.abc import Iterable, Mapping
+from contextlib import closing
+from typing import Optional
+
+import ujson
+
+from rd_syncrr.settings import settings
+
+# selected files of a torrent, as (path, bytes)
+Manifest = list[tuple[str, int]]
+
+# hashes looked up per query, under the SQLite variables limit
+_CHUNK_SIZE = 500
+
+_cache: Optional["ManifestCache"] = None
+
+
+class ManifestCache:
+    """
+    Selected files of the torrents, by info hash.
+
+    The files of a torrent never change for a given hash, the cache lives in
+    its own SQLite file so it outlives the media database and the torrents
+    removed and added again to Real-Debrid. The methods block, they are meant
+    to be run in a thread.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open the cache, creating its file if needed.
+
+        :param path: path of the cache file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                (
+                    "CREATE TABLE IF NOT EXISTS manifests"
+                    " (hash TEXT PRIMARY KEY, files TEXT NOT NULL) WITHOUT ROWID"
+                ),
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection to the cache file."""
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def get_many(self, hashes: Iterable[str]) -> dict[str, Manifest]:
+        """
+        Get the cached manifests of torrents.
+
+        :param hashes: info hashes of the torrents.
+        :return: manifests by hash, only for the cached torrents.
+        """
+        keys = list({torrent_hash.lower() for torrent_hash in hashes})
+        manifests: dict[str, Manifest] = {}
+        with closing(self._connect()) as connection:
+            for start in range(0, len(keys), _CHUNK_SIZE):
+                chunk = keys[start : start + _CHUNK_SIZE]
+                # only placeholders are formatted into the query
+                rows = connection.execute(
+                    (
+                        "SELECT hash, files FROM manifests WHERE hash IN"  # noqa: S608
+                        f" ({', '.join('?' * len(chunk))})"
+                    ),
+                    chunk,
+                )
+                for torrent_hash, files in rows:
+                    manifests[torrent_hash] = [
+                        (path, int(size)) for path, size in ujson.loads(files)
+                    ]
+        return manifests
+
+    def put_many(self, manifests: Mapping[str, Manifest]) -> None:
+        """
+        Cache the manifests of torrents.
+
+        :param manifests: manifests by info hash.
+        """
+        if not manifests:
+            return
+        with self._lock, closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO manifests (hash, files) VALUES (?, ?)",
+                (
+                    (torrent_hash.lower(), ujson.dumps(files))
+                    for torrent_hash, files in manifests.items()
+                ),
+            )
+
+
+def get_manifest_cache() -> Optional[ManifestCache]:
+    """
+    Get the shared manifest cache.
+
+    :return: manifest cache, None when disabled by an empty
+        RD_SYNCRR_RD_MANIFEST_CACHE.
+    """
+    global _cache
+    if _cache is None and settings.rd_manifest_cache:
+        if settings.environment == "dev":
+            path = "rd_syncrr_manifests_dev.db"
+        else:
+            path = settings.rd_manifest_cache
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _cache = ManifestCache(path)
+    return _cache
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, Optional, Union
 
 from requests import Response
@@ -259,6 +259,29 @@ class BaseArrAPI(RequestHandler):
 
         return self._get("history", self.ver_uri, params)
 
+    # GET /history/since
+    def get_history_since(
+        self,
+        date: datetime,
+        event_type: Optional[str] = None,
+    ) -> JsonArray:
+        """Gets history since a date (grabs/failures/imports/deletes/renames)
+
+        Args:
+            date (datetime): Date to return items after, naive dates are UTC.
+            event_type (Optional[str], optional): Filter to an event type. Defaults to None.
+
+        Returns:
+            JsonArray: List of dictionaries with items
+        """
+        if date.tzinfo is not None:
+            date = date.astimezone(timezone.utc)
+        params: dict[str, Any] = {"date": date.strftime("%Y-%m-%dT%H:%M:%SZ")}
+        if event_type:
+            params["eventType"] = event_type
+
+        return self._get("history/since", self.ver_uri, params)
+
     # BLOCKLIST
 
     # GET /blocklist
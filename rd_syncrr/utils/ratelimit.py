@@ -0,0 +1,59 @@
+"""Token bucket rate limiter shared by sync and async API wrappers."""
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket limiting requests to a per minute budget.
+
+    The bucket holds up to ``burst`` tokens and refills continuously at
+    ``rate_per_minute / 60`` tokens per second. Each request takes one token;
+    callers only wait when the bucket is empty. A token is reserved before
+    waiting, so concurrent callers queue up in order instead of racing for the
+    next refill.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int = 1) -> None:
+        """
+        Create a token bucket.
+
+        :param rate_per_minute: sustained requests per minute, 0 disables limiting.
+        :param burst: maximum number of requests sent back to back.
+        """
+        self.rate = rate_per_minute / 60
+        self.capacity = float(max(burst, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """
+        Take a token from the bucket.
+
+        :return: seconds to wait before the reserved token is available.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self) -> None:
+        """Wait for a token without blocking the event loop."""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_blocking(self) -> None:
+        """Wait for a token, blocking the calling thread."""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
@@ -1,4 +1,14 @@
 """RD API wrapper for Real-Debrid API v1.0"""
-from rd_syncrr.utils.rdapi.rdapi import RD
+from rd_syncrr.utils.rdapi.async_rdapi import AsyncRD
+from rd_syncrr.utils.rdapi.rdapi import RD, RDAPIError, circuit_breaker
+from rd_syncrr.utils.rdapi.results import RDResult, RDTorrent, RDTorrentFile
 
-__all__ = ["RD"]
+__all__ = [
+    "RD",
+    "AsyncRD",
+    "RDAPIError",
+    "RDResult",
+    "RDTorrent",
+    "RDTorrentFile",
+    "circuit_breaker",
+]
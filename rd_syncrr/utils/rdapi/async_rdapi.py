@@ -0,0 +1,295 @@
+""" Async Real-Debrid API wrapper """
+import asyncio
+import json
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+from httpx import Response
+
+from rd_syncrr.logging import logger
+from rd_syncrr.settings import settings
+from rd_syncrr.utils.http_client import get_http_client
+from rd_syncrr.utils.rdapi.rdapi import RDAPIError, circuit_breaker, rate_limiter
+from rd_syncrr.utils.rdapi.results import RDResult
+
+# statuses of a request RD could not serve, worth sending again
+RETRY_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+
+class AsyncRD:
+    def __init__(self) -> None:
+        self.rd_apitoken = settings.rd_token
+        self.base_url = "https://api.real-debrid.com/rest/1.0"
+        self.header = {"Authorization": "Bearer " + str(self.rd_apitoken)}
+        self.error_codes = json.load(
+            open(  # noqa: SIM115
+                os.path.join(Path(__file__).parent.absolute(), "error_codes.json"),
+            ),
+        )
+        self.rate_limiter = rate_limiter
+
+        # Check the API token
+        self.check_token()
+
+        self.user = self.User(self)
+        self.downloads = self.Downloads(self)
+        self.torrents = self.Torrents(self)
+
+    async def get(self, path: str, **options: Any) -> RDResult:
+        return await self._request(
+            "GET",
+            path,
+            idempotent=True,
+            params=self._clean(options),
+        )
+
+    async def post(self, path: str, **payload: Any) -> RDResult:
+        return await self._request("POST", path, data=self._clean(payload))
+
+    async def put(self, path: str, filepath: str, **payload: Any) -> RDResult:
+        with open(filepath, "rb") as file:
+            content = file.read()
+        return await self._request(
+            "PUT",
+            path,
+            content=content,
+            params=self._clean(payload),
+        )
+
+    async def delete(self, path: str) -> RDResult:
+        return await self._request("DELETE", path, idempotent=True)
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        idempotent: bool = False,
+        **kwargs: Any,
+    ) -> RDResult:
+        """
+        Send a request to RD, retrying it while RD is unavailable.
+
+        Every call goes through the circuit breaker shared by the tasks: after
+        rd_circuit_failures failures in a row the calls are refused for
+        rd_circuit_recovery seconds, then a single probe call decides whether
+        RD is back. A 429 is retried after its Retry-After, or the backoff, and
+        pauses every call meanwhile. Network errors and 5xx are only retried
+        for the idempotent calls, non idempotent ones could have been applied.
+
+        :param method: HTTP method.
+        :param path: path of the API endpoint.
+        :param idempotent: whether the request may be sent again.
+        :param kwargs: arguments of the httpx request.
+        :raises RDAPIError: when RD is unavailable or returns an error.
+        :return: parsed response of RD.
+        """
+        attempt = 0
+        while True:
+            await self._wait_circuit(path)
+            await self.rate_limiter.acquire()
+            try:
+                response = await get_http_client().request(
+                    method,
+                    self.base_url + path,
+                    headers=self.header,
+                    **kwargs,
+                )
+            except httpx.TransportError as e:
+                circuit_breaker.record_failure()
+                if not idempotent or attempt >= settings.rd_max_retries:
+                    raise RDAPIError(f"{type(e).__name__}: {e!s}", path) from e
+                delay = self._backoff(attempt)
+                logger.warning(
+                    f"RD request failed at {path}: {e!s}, retry in {delay:.1f}s"
+                )
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    circuit_breaker.record_success()
+                    return self.handler(response, self.error_codes, path)
+                retry_after = self._retry_after(response)
+                if response.status_code == 429:
+                    # the request was refused, it can be sent again
+                    circuit_breaker.pause(retry_after or self._backoff(attempt))
+                else:
+                    circuit_breaker.record_failure()
+                    if retry_after:
+                        circuit_breaker.pause(retry_after)
+                    if not idempotent:
+                        return self.handler(response, self.error_codes, path)
+                if attempt >= settings.rd_max_retries:
+                    return self.handler(response, self.error_codes, path)
+                delay = retry_after or self._backoff(attempt)
+                logger.warning(
+                    (
+                        f"RD returned {response.status_code} at {path}, retry in"
+                        f" {delay:.1f}s"
+                    ),
+                )
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    async def _wait_circuit(path: str) -> None:
+        """
+        Wait for the circuit breaker to let a call through.
+
+        A pause asked by RD shorter than rd_backoff_max is waited, calls are
+        refused while the circuit is open because of failures.
+
+        :param path: path of the API endpoint.
+        :raises RDAPIError: when the circuit is open.
+        """
+        while not circuit_breaker.allow():
+            retry_after = circuit_breaker.retry_after()
+            if circuit_breaker.failing or retry_after > settings.rd_backoff_max:
+                raise RDAPIError(
+                    f"RD is unavailable, calls paused for {retry_after:.0f}s",
+                    path,
+                )
+            await asyncio.sleep(retry_after)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """
+        Get the jittered exponential delay before a retry.
+
+        :param attempt: number of the failed attempt, from 0.
+        :return: seconds to wait.
+        """
+        delay = min(settings.rd_backoff_max, settings.rd_backoff_base * 2**attempt)
+        return delay * random.uniform(0.5, 1)  # noqa: S311
+
+    @staticmethod
+    def _retry_after(response: Response) -> float:
+        """
+        Get the delay asked by the Retry-After header of a response.
+
+        :param response: response of RD.
+        :return: seconds to wait, 0 when the header is missing or invalid.
+        """
+        value = response.headers.get("Retry-After")
+        if not value:
+            return 0.0
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return 0.0
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+    @staticmethod
+    def _clean(params: dict[str, Any]) -> dict[str, Any]:
+        """Drop unset parameters, httpx would send them as empty strings."""
+        return {key: value for key, value in params.items() if value is not None}
+
+    def handler(
+        self,
+        request: Response,
+        error_codes: dict[str, str],
+        path: str,
+    ) -> RDResult:
+        result = RDResult.parse(
+            request.status_code,
+            request.content,
+            error_codes,
+            request.headers.get("X-Total-Count"),
+        )
+        if result.ok:
+            return result
+        message = result.error or f"HTTP error {result.status_code}"
+        logger.error(f"RD returned {result.status_code} {message} at {path}")
+        raise RDAPIError(message, path, result.status_code, result.error_code)
+
+    def check_token(self) -> None:
+        if self.rd_apitoken is None or self.rd_apitoken == "your_token_here":
+            logger.warning("RD_SYNCRR_RD_TOKEN is not set. Please set it in the .env.")
+
+    class User:
+        def __init__(self, rd_instance: "AsyncRD") -> None:
+            self.rd = rd_instance
+
+        async def get(self) -> RDResult:
+            return await self.rd.get("/user")
+
+    class Downloads:
+        def __init__(self, rd_instance: "AsyncRD") -> None:
+            self.rd = rd_instance
+
+        async def get(
+            self,
+            offset: Optional[int] = None,
+            page: Optional[int] = None,
+            limit: Optional[int] = None,
+        ) -> RDResult:
+            return await self.rd.get(
+                "/downloads",
+                offset=offset,
+                page=page,
+                limit=limit,
+            )
+
+        async def delete(self, id: str) -> RDResult:  # noqa: A002
+            return await self.rd.delete("/downloads/delete/" + str(id))
+
+    class Torrents:
+        def __init__(self, rd_instance: "AsyncRD") -> None:
+            self.rd = rd_instance
+
+        async def get(
+            self,
+            offset: Optional[int] = None,
+            page: Optional[int] = None,
+            limit: Optional[int] = None,
+            filter: Optional[str] = None,  # noqa: A002
+        ) -> RDResult:
+            return await self.rd.get(
+                "/torrents",
+                offset=offset,
+                page=page,
+                limit=limit,
+                filter=filter,
+            )
+
+        async def info(self, id: str) -> RDResult:  # noqa: A002
+            return await self.rd.get("/torrents/info/" + str(id))
+
+        async def instant_availability(self, hash: str) -> RDResult:  # noqa: A002
+            return await self.rd.get("/torrents/instantAvailability/" + str(hash))
+
+        async def active_count(self) -> RDResult:
+            return await self.rd.get("/torrents/activeCount")
+
+        async def available_hosts(self) -> RDResult:
+            return await self.rd.get("/torrents/availableHosts")
+
+        async def add_file(self, filepath: str, host: Optional[str] = None) -> RDResult:
+            return await self.rd.put(
+                "/torrents/addTorrent",
+                filepath=filepath,
+                host=host,
+            )
+
+        async def add_magnet(self, magnet: str, host: Optional[str] = None) -> RDResult:
+            magnet_link = "magnet:?xt=urn:btih:" + str(magnet)
+            return await self.rd.post(
+                "/torrents/addMagnet",
+                magnet=magnet_link,
+                host=host,
+            )
+
+        async def select_files(self, id: str, files: str) -> RDResult:  # noqa: A002
+            return await self.rd.post(
+                "/torrents/selectFiles/" + str(id),
+                files=str(files),
+            )
+
+        async def delete(self, id: str) -> RDResult:  # noqa: A002
+            return await self.rd.delete("/torrents/delete/" + str(id))
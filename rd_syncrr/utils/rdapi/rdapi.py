@@ -1,8 +1,6 @@
 """ Real-Debrid API wrapper """
-import itertools
 import json
 import os
-import time
 from pathlib import Path
 from typing import Any, Optional
 
@@ -11,6 +9,40 @@ from requests import Response
 
 from rd_syncrr.logging import logger
 from rd_syncrr.settings import settings
+from rd_syncrr.utils.circuit_breaker import CircuitBreaker
+from rd_syncrr.utils.ratelimit import TokenBucket
+from rd_syncrr.utils.rdapi.results import RDResult
+
+# Shared by every RD client of the process, sync and async alike.
+rate_limiter = TokenBucket(settings.rd_rate_limit, settings.rd_rate_burst)
+circuit_breaker = CircuitBreaker(
+    settings.rd_circuit_failures,
+    settings.rd_circuit_recovery,
+)
+
+
+class RDAPIError(Exception):
+    """Error returned by the Real-Debrid API or raised reaching it."""
+
+    def __init__(
+        self,
+        message: str,
+        path: str,
+        status_code: Optional[int] = None,
+        error_code: Optional[int] = None,
+    ) -> None:
+        """
+        Create a Real-Debrid API error.
+
+        :param message: error message.
+        :param path: path of the API endpoint.
+        :param status_code: HTTP status of the response, if any.
+        :param error_code: Real-Debrid error code of the response, if any.
+        """
+        super().__init__(f"{message} at {path}")
+        self.path = path
+        self.status_code = status_code
+        self.error_code = error_code
 
 
 class RD:
@@ -23,10 +55,7 @@ class RD:
                 os.path.join(Path(__file__).parent.absolute(), "error_codes.json"),
             ),
         )
-        self.sleep = settings.rd_sleep
-        self.long_sleep = settings.rd_long_sleep
-        self.count_obj = itertools.cycle(range(0, 501))
-        self.count = next(self.count_obj)
+        self.rate_limiter = rate_limiter
 
         # Check the API token
         self.check_token()
@@ -41,7 +70,8 @@ class RD:
         self.hosts = self.Hosts(self)
         self.settings = self.Settings(self)
 
-    def get(self, path: str, **options: Any) -> Response:
+    def get(self, path: str, **options: Any) -> RDResult:
+        self.rate_limiter.acquire_blocking()
         request = requests.get(  # noqa: S113
             self.base_url + path,
             headers=self.header,
@@ -49,7 +79,8 @@ class RD:
         )
         return self.handler(request, self.error_codes, path)
 
-    def post(self, path: str, **payload: Any) -> Response:
+    def post(self, path: str, **payload: Any) -> RDResult:
+        self.rate_limiter.acquire_blocking()
         request = requests.post(  # noqa: S113
             self.base_url + path,
             headers=self.header,
@@ -57,7 +88,8 @@ class RD:
         )
         return self.handler(request, self.error_codes, path)
 
-    def put(self, path: str, filepath: str, **payload: Any) -> Response:
+    def put(self, path: str, filepath: str, **payload: Any) -> RDResult:
+        self.rate_limiter.acquire_blocking()
         with open(filepath, "rb") as file:
             request = requests.put(  # noqa: S113
                 self.base_url + path,
@@ -67,7 +99,8 @@ class RD:
             )
         return self.handler(request, self.error_codes, path)
 
-    def delete(self, path: str) -> Response:
+    def delete(self, path: str) -> RDResult:
+        self.rate_limiter.acquire_blocking()
         request = requests.delete(  # noqa: S113
             self.base_url + path,
             headers=self.header,
@@ -79,65 +112,46 @@ class RD:
         request: Response,
         error_codes: dict[str, str],
         path: str,
-    ) -> Response:
-        try:
-            request.raise_for_status()
-        except requests.exceptions.HTTPError as errh:
-            logger.error("%s at %s", errh, path)
-        except requests.exceptions.ConnectionError as errc:
-            logger.error("%s at %s", errc, path)
-        except requests.exceptions.Timeout as errt:
-            logger.error("%s at %s", errt, path)
-        except requests.exceptions.RequestException as err:
-            logger.error("%s at %s", err, path)
-        try:
-            if "error_code" in request.json():
-                code = request.json()["error_code"]
-                message = error_codes.get(str(code), "Unknown error")
-                logger.warning("%s: %s at %s", code, message, path)
-        except:  # noqa: E722, S110
-            pass
-        self.handle_sleep()
-        return request
+    ) -> RDResult:
+        result = RDResult.parse(
+            request.status_code,
+            request.content,
+            error_codes,
+            request.headers.get("X-Total-Count"),
+        )
+        if not result.ok:
+            logger.error(f"RD returned {result.status_code} {result.error} at {path}")
+        return result
 
     def check_token(self) -> None:
         if self.rd_apitoken is None or self.rd_apitoken == "your_token_here":
             logger.warning("RD_SYNCRR_RD_TOKEN is not set. Please set it in the .env.")
 
-    def handle_sleep(self) -> None:
-        if self.count < 500:
-            logger.debug("Sleeping %sms", self.sleep)
-            time.sleep(self.sleep / 1000)
-        elif self.count == 500:
-            logger.debug("Sleeping %sms", self.long_sleep)
-            time.sleep(self.long_sleep / 1000)
-            self.count = 0
-
     class System:
         def __init__(self, rd_instance: "RD") -> None:
             self.rd = rd_instance
 
-        def disable_token(self) -> Response:
+        def disable_token(self) -> RDResult:
             return self.rd.get("/disable_access_token")
 
-        def time(self) -> Response:
+        def time(self) -> RDResult:
             return self.rd.get("/time")
 
-        def iso_time(self) -> Response:
+        def iso_time(self) -> RDResult:
             return self.rd.get("/time/iso")
 
     class User:
         def __init__(self, rd_instance: "RD") -> None:
             self.rd = rd_instance
 
-        def get(self) -> Response:
+        def get(self) -> RDResult:
             return self.rd.get("/user")
 
     class Unrestrict:
         def __init__(self, rd_instance: "RD") -> None:
             self.rd = rd_instance
 
-        def check(self, link: str, password: Optional[str] = None) -> Response:
+        def check(self, link: str, password: Optional[str] = None) -> RDResult:
             return self.rd.post("/unrestrict/check", link=link, password=password)
 
         def link(
@@ -145,7 +159,7 @@ class RD:
             link: str,
             password: Optional[str] = None,
             remote: Optional[str] = None,
-        ) -> Response:
+        ) -> RDResult:
             return self.rd.post(
                 "/unrestrict/link",
                 link=link,
@@ -153,37 +167,37 @@ class RD:
                 remote=remote,
             )
 
-        def folder(self, link: str) -> Response:
+        def folder(self, link: str) -> RDResult:
             return self.rd.post("/unrestrict/folder", link=link)
 
-        def container_file(self, filepath: str) -> Response:
+        def container_file(self, filepath: str) -> RDResult:
             return self.rd.put("/unrestrict/containerFile", filepath=filepath)
 
-        def container_link(self, link: str) -> Response:
+        def container_link(self, link: str) -> RDResult:
             return self.rd.post("/unrestrict/containerLink", link=link)
 
     class Traffic:
         def __init__(self, rd_instance: "RD") -> None:
             self.rd = rd_instance
 
-        def get(self) -> Response:
+        def get(self) -> RDResult:
             return self.rd.get("/traffic")
 
         def details(
             self,
             start: Optional[str] = None,
             end: Optional[str] = None,
-        ) -> Response:
+        ) -> RDResult:
             return self.rd.get("/traffic/details", start=start, end=end)
 
     class Streaming:
         def __init__(self, rd_instance: "RD") -> None:
             self.rd = rd_instance
 
-        def transcode(self, id: str) -> Response:  # noqa: A002
+        def transcode(self, id: str) -> RDResult:  # noqa: A002
             return self.rd.get("/streaming/transcode/" + str(id))
 
-        def media_info(self, id: str) -> Response:  # noqa: A002
+        def media_info(self, id: str) -> RDResult:  # noqa: A002
             return self.rd.get("/streaming/mediaInfos/" + str(id))
 
     class Downloads:
@@ -195,10 +209,10 @@ class RD:
             offset: Optional[int] = None,
             page: Optional[int] = None,
             limit: Optional[int] = None,
-        ) -> Response:
+        ) -> RDResult:
             return self.rd.get("/downloads", offset=offset, page=page, limit=limit)
 
-        def delete(self, id: str) -> Response:  # noqa: A002
+        def delete(self, id: str) -> RDResult:  # noqa: A002
             return self.rd.delete("/downloads/delete/" + str(id))
 
     class Torrents:
@@ -211,7 +225,7 @@ class RD:
             page: Optional[int] = None,
             limit: Optional[int] = None,
             filter: Optional[str] = None,  # noqa: A002
-        ) -> Response:
+        ) -> RDResult:
             return self.rd.get(
                 "/torrents",
                 offset=offset,
@@ -220,72 +234,72 @@ class RD:
                 filter=filter,
             )
 
-        def info(self, id: str) -> Response:  # noqa: A002
+        def info(self, id: str) -> RDResult:  # noqa: A002
             return self.rd.get("/torrents/info/" + str(id))
 
-        def instant_availability(self, hash: str) -> Response:  # noqa: A002
+        def instant_availability(self, hash: str) -> RDResult:  # noqa: A002
             return self.rd.get("/torrents/instantAvailability/" + str(hash))
 
-        def active_count(self) -> Response:
+        def active_count(self) -> RDResult:
             return self.rd.get("/torrents/activeCount")
 
-        def available_hosts(self) -> Response:
+        def available_hosts(self) -> RDResult:
             return self.rd.get("/torrents/availableHosts")
 
-        def add_file(self, filepath: str, host: Optional[str] = None) -> Response:
+        def add_file(self, filepath: str, host: Optional[str] = None) -> RDResult:
             return self.rd.put("/torrents/addTorrent", filepath=filepath, host=host)
 
-        def add_magnet(self, magnet: str, host: Optional[str] = None) -> Response:
+        def add_magnet(self, magnet: str, host: Optional[str] = None) -> RDResult:
             magnet_link = "magnet:?xt=urn:btih:" + str(magnet)
             return self.rd.post("/torrents/addMagnet", magnet=magnet_link, host=host)
 
-        def select_files(self, id: str, files: str) -> Response:  # noqa: A002
+        def select_files(self, id: str, files: str) -> RDResult:  # noqa: A002
             return self.rd.post("/torrents/selectFiles/" + str(id), files=str(files))
 
-        def delete(self, id: str) -> Response:  # noqa: A002
+        def delete(self, id: str) -> RDResult:  # noqa: A002
             return self.rd.delete("/torrents/delete/" + str(id))
 
     class Hosts:
         def __init__(self, rd_instance: "RD") -> None:
             self.rd = rd_instance
 
-        def get(self) -> Response:
+        def get(self) -> RDResult:
             return self.rd.get("/hosts")
 
-        def status(self) -> Response:
+        def status(self) -> RDResult:
             return self.rd.get("/hosts/status")
 
-        def regex(self) -> Response:
+        def regex(self) -> RDResult:
             return self.rd.get("/hosts/regex")
 
-        def regex_folder(self) -> Response:
+        def regex_folder(self) -> RDResult:
             return self.rd.get("/hosts/regexFolder")
 
-        def domains(self) -> Response:
+        def domains(self) -> RDResult:
             return self.rd.get("/hosts/domains")
 
     class Settings:
         def __init__(self, rd_instance: "RD") -> None:
             self.rd = rd_instance
 
-        def get(self) -> Response:
+        def get(self) -> RDResult:
             return self.rd.get("/settings")
 
-        def update(self, setting_name: str, setting_value: str) -> Response:
+        def update(self, setting_name: str, setting_value: str) -> RDResult:
             return self.rd.post(
                 "/settings/update",
                 setting_name=setting_name,
                 setting_value=setting_value,
             )
 
-        def convert_points(self) -> Response:
+        def convert_points(self) -> RDResult:
             return self.rd.post("/settings/convertPoints")
 
-        def change_password(self) -> Response:
+        def change_password(self) -> RDResult:
             return self.rd.post("/settings/changePassword")
 
-        def avatar_file(self, filepath: str) -> Response:
+        def avatar_file(self, filepath: str) -> RDResult:
             return self.rd.put("/settings/avatarFile", filepath=filepath)
 
-        def avatar_delete(self) -> Response:
+        def avatar_delete(self) -> RDResult:
             return self.rd.delete("/settings/avatarDelete")
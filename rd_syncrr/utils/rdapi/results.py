@@ -0,0 +1,120 @@
+"""Parsed responses and typed records of the Real-Debrid API."""
+from typing import Any, NamedTuple, Optional
+
+import ujson
+
+
+class RDResult:
+    """
+    Response of the Real-Debrid API, decoded once.
+
+    The payload is decoded when the response is received, the RD error of an
+    error response is read from the same payload.
+    """
+
+    __slots__ = ("status_code", "data", "error_code", "error", "total_count")
+
+    def __init__(
+        self,
+        status_code: int,
+        data: Any,
+        error_code: Optional[int] = None,
+        error: Optional[str] = None,
+        total_count: Optional[int] = None,
+    ) -> None:
+        """
+        Create a result.
+
+        :param status_code: HTTP status of the response.
+        :param data: decoded payload, None when the response has no content.
+        :param error_code: Real-Debrid error code of an error response.
+        :param error: error message of an error response.
+        :param total_count: total count of the items of a listing, if sent.
+        """
+        self.status_code = status_code
+        self.data = data
+        self.error_code = error_code
+        self.error = error
+        self.total_count = total_count
+
+    @classmethod
+    def parse(
+        cls,
+        status_code: int,
+        content: bytes,
+        error_codes: dict[str, str],
+        total_count: Optional[str] = None,
+    ) -> "RDResult":
+        """
+        Decode the content of a response.
+
+        :param status_code: HTTP status of the response.
+        :param content: raw content of the response.
+        :param error_codes: messages of the Real-Debrid error codes.
+        :param total_count: X-Total-Count header of a listing.
+        :return: parsed result.
+        """
+        try:
+            data = ujson.loads(content) if content else None
+        except ValueError:
+            data = None
+        if 200 <= status_code < 300:
+            count = int(total_count) if total_count and total_count.isdigit() else None
+            return cls(status_code, data, total_count=count)
+        error_code = data.get("error_code") if isinstance(data, dict) else None
+        if error_code is None:
+            return cls(status_code, data, None, f"HTTP error {status_code}")
+        return cls(
+            status_code,
+            data,
+            error_code,
+            error_codes.get(str(error_code), "Unknown error"),
+        )
+
+    @property
+    def ok(self) -> bool:
+        """Whether the request succeeded."""
+        return self.error is None
+
+
+class RDTorrent(NamedTuple):
+    """Torrent of a /torrents page."""
+
+    id: str  # noqa: A003
+    filename: str
+    hash: str  # noqa: A003
+    status: str
+
+    @classmethod
+    def from_page(cls, data: Optional[list[dict[str, Any]]]) -> list["RDTorrent"]:
+        """
+        Get the torrents of a /torrents page.
+
+        :param data: decoded page, None for an empty page.
+        :return: torrents of the page.
+        """
+        return [
+            cls(item["id"], item["filename"], item["hash"], item["status"])
+            for item in data or ()
+        ]
+
+
+class RDTorrentFile(NamedTuple):
+    """File of a torrent, from /torrents/info."""
+
+    path: str
+    bytes: int  # noqa: A003
+    selected: bool
+
+    @classmethod
+    def from_info(cls, data: dict[str, Any]) -> list["RDTorrentFile"]:
+        """
+        Get the files of a /torrents/info payload.
+
+        :param data: decoded torrent info.
+        :return: files of the torrent.
+        """
+        return [
+            cls(file["path"], file["bytes"], file["selected"] == 1)
+            for file in data["files"]
+        ]
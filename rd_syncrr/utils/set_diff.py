@@ -0,0 +1,58 @@
+"""Set difference between incoming items and the keys already stored."""
+from collections.abc import Callable, Hashable, Iterable, Set
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+_Item = TypeVar("_Item")
+_Key = TypeVar("_Key", bound=Hashable)
+
+
+@dataclass(frozen=True)
+class SetDiff(Generic[_Item, _Key]):
+    """Items to add and keys to remove to sync a store with a source."""
+
+    added: list[_Item]
+    removed: frozenset[_Key]
+
+
+def diff_by_key(
+    items: Iterable[_Item],
+    known: Set[_Key],
+    key: Callable[[_Item], _Key],
+) -> SetDiff[_Item, _Key]:
+    """
+    Compare incoming items with the keys already stored.
+
+    Membership is tested against sets, so the diff is linear in the number of
+    items and keys. Items sharing a key are added once, first one wins.
+
+    :param items: items from the source, in the order they should be added.
+    :param known: keys already stored.
+    :param key: function returning the key of an item.
+    :return: items with an unknown key and known keys missing from the source.
+    """
+    added: list[_Item] = []
+    seen: set[_Key] = set()
+    for item in items:
+        item_key = key(item)
+        if item_key in seen:
+            continue
+        seen.add(item_key)
+        if item_key not in known:
+            added.append(item)
+    return SetDiff(added=added, removed=frozenset(known - seen))
+
+
+def is_mass_removal(removed: Set[_Key], known: Set[_Key], ratio: float) -> bool:
+    """
+    Tell whether more than a share of the stored keys would be removed.
+
+    A source failing half way through a listing looks like a mass removal,
+    callers should not delete anything then.
+
+    :param removed: keys to remove.
+    :param known: keys already stored.
+    :param ratio: largest share of the keys that may be removed.
+    :return: True when too many keys would be removed.
+    """
+    return bool(known) and len(removed) > ratio * len(known)
@@ -1,8 +1,5 @@
 #!/usr/bin/env python3
 
-import itertools
-import os
-import time
 from typing import Any
 
 import requests
@@ -10,6 +7,9 @@ from requests import Response
 
 from rd_syncrr.logging import logger
 from rd_syncrr.settings import settings
+from rd_syncrr.utils.ratelimit import TokenBucket
+
+rate_limiter = TokenBucket(settings.syncrr_rate_limit, settings.syncrr_rate_burst)
 
 
 class RDSyncrrApi:
@@ -17,10 +17,7 @@ class RDSyncrrApi:
         self.apikey = settings.syncrr_api_key
         self.base_url = settings.syncrr_host if settings.syncrr_host else ""
         self.header = {"api-key": str(self.apikey)}
-        self.sleep = int(os.getenv("SLEEP", 100))
-        self.long_sleep = int(os.getenv("LONG_SLEEP", 500))
-        self.count_obj = itertools.cycle(range(0, 501))
-        self.count = next(self.count_obj)
+        self.rate_limiter = rate_limiter
 
         # Check the API token
         self.check_token()
@@ -28,6 +25,7 @@ class RDSyncrrApi:
         self.torrents = self.Torrents(self)
 
     def get(self, path: str, **options: Any) -> Response:
+        self.rate_limiter.acquire_blocking()
         request = requests.get(  # noqa: S113
             self.base_url + path,
             headers=self.header,
@@ -36,6 +34,7 @@ class RDSyncrrApi:
         return self.handler(request, path)
 
     def post(self, path: str, **payload: Any) -> Response:
+        self.rate_limiter.acquire_blocking()
         request = requests.post(  # noqa: S113
             self.base_url + path,
             headers=self.header,
@@ -44,6 +43,7 @@ class RDSyncrrApi:
         return self.handler(request, path)
 
     def put(self, path: str, filepath: str, **payload: Any) -> Response:
+        self.rate_limiter.acquire_blocking()
         with open(filepath, "rb") as file:
             request = requests.put(  # noqa: S113
                 self.base_url + path,
@@ -54,6 +54,7 @@ class RDSyncrrApi:
         return self.handler(request, path)
 
     def delete(self, path: str) -> Response:
+        self.rate_limiter.acquire_blocking()
         request = requests.delete(  # noqa: S113
             self.base_url + path,
             headers=self.header,
@@ -71,22 +72,12 @@ class RDSyncrrApi:
             logger.error("%s at %s", errt, path)
         except requests.exceptions.RequestException as err:
             logger.error("%s at %s", err, path)
-        self.handle_sleep()
         return request
 
     def check_token(self) -> None:
         if self.apikey is None or self.apikey == "your_token_here":
             logger.warning("Add apikey to .env")
 
-    def handle_sleep(self) -> None:
-        if self.count < 500:
-            logger.debug("Sleeping %sms", self.sleep)
-            time.sleep(self.sleep / 1000)
-        elif self.count == 500:
-            logger.debug("Sleeping %sms", self.long_sleep)
-            time.sleep(self.long_sleep / 1000)
-            self.count = 0
-
     class Torrents:
         def __init__(self, rd_syncrr_instance: "RDSyncrrApi") -> None:
             self.rd = rd_syncrr_instance
@@ -94,5 +85,5 @@ class RDSyncrrApi:
         def all(self) -> Response:  # noqa: A003
             return self.rd.get("/sync/fetchAll")
 
-        def latest(self) -> Response:
-            return self.rd.get("/sync/fetchLatest")
+        def changes(self, since: int = 0, limit: int = 1000) -> Response:
+            return self.rd.get("/sync/changes", since=since, limit=limit)
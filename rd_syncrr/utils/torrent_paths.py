@@ -0,0 +1,43 @@
+"""Paths of the torrent files as seen under the Real-Debrid mount."""
+import posixpath
+import unicodedata
+
+
+def normalize_path(path: str) -> str:
+    """
+    Normalize a relative path, so equal paths compare equal.
+
+    :param path: path, with or without leading and trailing slashes.
+    :return: NFC normalized path without leading or trailing slash.
+    """
+    path = posixpath.normpath(f"/{path}").lstrip("/")
+    return unicodedata.normalize("NFC", path)
+
+
+def torrent_file_path(torrent_filename: str, file_path: str) -> str:
+    """
+    Get the path of a torrent file relative to the Real-Debrid mount.
+
+    Mounts show every torrent as a folder named after the torrent, holding the
+    files at their path in the torrent.
+
+    :param torrent_filename: filename of the torrent.
+    :param file_path: path of the file in the torrent.
+    :return: normalized relative path of the file.
+    """
+    return normalize_path(f"{torrent_filename}/{file_path}")
+
+
+def target_path_candidates(target: str) -> list[str]:
+    """
+    Get the relative paths a symbolic link target may have under the mount.
+
+    The mount point and the folders in front of the torrents differ between
+    mounts, so every trailing part of the target of at least a torrent folder
+    and a file is a candidate, longest first.
+
+    :param target: absolute path of the symbolic link target.
+    :return: normalized candidate paths.
+    """
+    parts = normalize_path(target).split("/")
+    return ["/".join(parts[start:]) for start in range(len(parts) - 1)]
@@ -51,3 +51,14 @@ class TorrentModelDTO(BaseModel):
     hash: str  # noqa: A003
     added: datetime
     files: List[TorrentFileModelDTO]
+
+
+class TorrentChangesDTO(BaseModel):
+    """Torrents changed since a change sequence."""
+
+    since: int
+    seq: int
+    head: int
+    floor: int
+    torrents: List[TorrentModelDTO]
+    removed: List[str]
@@ -1,26 +1,54 @@
-from typing import List  # noqa: UP035
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Optional  # noqa: UP035
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 
 from rd_syncrr.services.media_db.dao import MediaDAO
-from rd_syncrr.tasks import process_torrents_data
+from rd_syncrr.tasks import process_torrent_changes, process_torrents_data
 from rd_syncrr.utils.security import api_key_security
-from rd_syncrr.web.api.sync.schema import TorrentModelDTO
+from rd_syncrr.web.api.sync.schema import TorrentChangesDTO, TorrentModelDTO
 
 router = APIRouter()
 
 
+def _encode_cursor(added: datetime, id: str) -> str:  # noqa: A002
+    """Encode the position of a torrent as an opaque cursor."""
+    raw = json.dumps([added.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Decode a cursor to the (added, id) position of a torrent."""
+    try:
+        added, torrent_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(added), str(torrent_id)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+
 @router.get(
     "/torrents",
     dependencies=[Depends(api_key_security)],
     response_model=List[TorrentModelDTO],
 )
 async def torrents(
+    response: Response,
     dao: MediaDAO = Depends(),  # noqa: B008
+    cursor: Optional[str] = Query(
+        None,
+        alias="cursor",
+        description=(
+            "the cursor of the next page, as returned in the X-Next-Cursor header"
+        ),
+    ),
     offset: int = Query(
         0,
         alias="offset",
-        description="the offset to start from",
+        description="the offset to start from, prefer cursor",
+        deprecated=True,
     ),
     limit: int = Query(
         50,
@@ -28,8 +56,55 @@ async def torrents(
         description="the number of torrents to return",
     ),
 ) -> List[TorrentModelDTO]:  # type: ignore
+    after = _decode_cursor(cursor) if cursor else None
+    try:
+        async with dao:
+            data = await process_torrents_data(
+                dao,
+                limit=limit,
+                offset=0 if after else offset,
+                after=after,
+            )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+    if len(data) == limit:
+        last = data[-1]
+        response.headers["X-Next-Cursor"] = _encode_cursor(last["added"], last["id"])
+    return data  # type: ignore
+
+
+@router.get(
+    "/changes",
+    dependencies=[Depends(api_key_security)],
+    response_model=TorrentChangesDTO,
+)
+async def changes(
+    dao: MediaDAO = Depends(),  # noqa: B008
+    since: int = Query(
+        0,
+        alias="since",
+        ge=0,
+        description="the change sequence already synced, as returned in seq",
+    ),
+    limit: int = Query(
+        1000,
+        alias="limit",
+        ge=1,
+        le=5000,
+        description="the maximum number of changes to return",
+    ),
+) -> TorrentChangesDTO:  # type: ignore
+    """
+    Get the torrents changed since a change sequence.
+
+    Call again with since=seq while seq is lower than head.
+    A head lower than since means the database was reset, sync again from 0.
+    A since lower than floor, other than 0, misses the changes compacted
+    since, sync again from 0.
+    """
     try:
         async with dao:
-            return await process_torrents_data(dao, limit=limit, offset=offset)  # type: ignore
+            data = await process_torrent_changes(dao, since=since, limit=limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
+    return data  # type: ignore
@@ -1,58 +1,46 @@
-import os
+import asyncio
+import contextlib
 from collections.abc import Awaitable
 from typing import Callable
 
 from fastapi import FastAPI
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from rd_syncrr.scheduler import init_jobs, init_scheduler
+from rd_syncrr.services.media_db.engine import (
+    dispose_media_engines,
+    get_media_engine,
+    get_session_factory,
+)
 from rd_syncrr.services.media_db.meta import meta
+from rd_syncrr.services.media_db.migrations import upgrade_schema
 from rd_syncrr.services.media_db.models import load_all_models
 from rd_syncrr.settings import settings
+from rd_syncrr.tasks import watch_symlink
+from rd_syncrr.utils.http_client import close_http_client
 
 scheduler = init_scheduler()
 
 
-def _set_media_db_path() -> str:
-    """Set the path to the database."""
-    if settings.environment == "dev":
-        db_path = "rd_syncrr_media_dev.db"
-    else:
-        db_path = os.path.join(settings.media_db_location, "rd_syncrr_media.db")
-
-    db_path = f"sqlite+aiosqlite:///{db_path}"
-    return db_path
-
-
-db_path: str = _set_media_db_path()
-
-
 def _setup_db(app: FastAPI) -> None:  # pragma: no cover
     """
     Creates connection to the database.
 
-    This function creates SQLAlchemy engine instance,
-    session_factory for creating sessions
-    and stores them in the application's state property.
+    The API reads through the shared pool of read only connections, so its
+    requests do not wait for the scheduler writes. The engine and the
+    session_factory are stored in the application's state property.
 
     :param app: fastAPI application.
     """
-    engine = create_async_engine(db_path, echo=settings.media_db_echo)
-    session_factory = async_sessionmaker(
-        engine,
-        expire_on_commit=False,
-    )
-    app.state.db_engine = engine
-    app.state.db_session_factory = session_factory
+    app.state.db_engine = get_media_engine(readonly=True)
+    app.state.db_session_factory = get_session_factory(readonly=True)
 
 
 async def _create_tables() -> None:  # pragma: no cover
     """Populates tables in the database."""
     load_all_models()
-    engine = create_async_engine(db_path)
-    async with engine.begin() as connection:
+    async with get_media_engine().begin() as connection:
         await connection.run_sync(meta.create_all)
-    await engine.dispose()
+        await connection.run_sync(upgrade_schema)
 
 
 def register_startup_event(
@@ -75,6 +63,9 @@ def register_startup_event(
         await _create_tables()
         scheduler.start()
         await init_jobs(scheduler)
+        app.state.symlink_watcher = None
+        if settings.symlink_watch:
+            app.state.symlink_watcher = asyncio.create_task(watch_symlink())
         app.middleware_stack = app.build_middleware_stack()
         pass
 
@@ -94,7 +85,12 @@ def register_shutdown_event(
     @app.on_event("shutdown")
     async def _shutdown() -> None:
         scheduler.shutdown()
-        await app.state.db_engine.dispose()
+        if app.state.symlink_watcher is not None:
+            app.state.symlink_watcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await app.state.symlink_watcher
+        await dispose_media_engines()
+        await close_http_client()
         pass
 
     return _shutdown